@@ -1,3 +1,7 @@
+# Started first so the startup breakdown covers imports
+from utils.services import ServiceRegistry, StartupTimer, SERVICE_WARMUP
+startup = StartupTimer("ai_server")
+
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os, json, time, hashlib, requests
@@ -24,27 +28,44 @@ from utils.chat.bs_action_handler import bs_background_handle_action, bs_handle_
 from utils.chat.dt_action_handler import dt_background_handle_action, dt_handle_action
 
 from utils.feedback.feedback_action_handler import handle_feedback_action
+from utils.feedback import chunked
 
 from utils.chat.chat_utils import (
     MAX_DEPTH, KEEP_LAST_N, PROFILE_MANAGER_URL, DEEPSEEK_URL, 
     DEEPSEEK_API_KEY, LEONARDO_API_KEY, parse_markdown, 
-    parse_deepseek_json, normalize_deepseek_response
+    parse_deepseek_json, normalize_deepseek_response, entity_index
 )
 
 from utils.recommendations.theme_extractor import ThemeExtractor
-from utils.recommendations.book_sources import BookSourceManager
+from utils.recommendations.book_sources import BookSourceManager, GOOGLE_BOOKS_URL
 from utils.recommendations.ranker import BookRanker
 from utils.recommendations.StoryElementExtractor import StoryElementExtractor
 from utils.recommendations.book_explanation import BookExplanationGenerator
 
 from utils.feedback.utils import _validate_feedback, _build_context_summary, _validate_feedback_structure
+from utils.prompt_cache import PromptLayout, ModelCallError, cached_completion, get_prompt_cache_stats
+from utils.turn_executor import TurnExecutor
+from utils.background import background, install_sigterm_drain
+from utils.serving import track_in_flight, tracker as serving_tracker, LOAD_TEST_PROBES
+from utils.metrics import instrument, observe_phase
+from utils.profiling import install_profiling
+from utils import log_pipeline
+from utils.auto_title import (
+    AutoTitler, needs_auto_title, load_conversation_text,
+    generate_title, save_title, claim_and_save_title
+)
+from utils import session_index
+from utils import story_map_analysis
+from utils import timeline_checks
+from utils import mentor_text_store
+from utils.cache import make_cache
 
 from prompts.bs_system_prompt import BS_SYSTEM_PROMPT
 from prompts.dt_system_prompt import DT_SYSTEM_PROMPT
 from prompts.mapping_system_prompt import MAPPING_SYSTEM_PROMPT
 from prompts.world_system_prompt import WORLD_SYSTEM_PROMPT
-from prompts.element_extraction_prompt import STORY_EXTRACTION_PROMPT
-from prompts.feedback_system_prompt import FEEDBACK_SYSTEM_PROMPT
+from prompts.element_extraction_prompt import STORY_EXTRACTION_SYSTEM_PROMPT, build_story_extraction_user_prompt
+from prompts.feedback_system_prompt import FEEDBACK_SYSTEM_PROMPT, FEEDBACK_CHUNK_PROMPT
 from prompts.timeline_reflection_prompt import TIMELINE_REFLECTION_PROMPT, TIMELINE_COHERENCE_PROMPT
 from prompts.story_map_analysis_prompt import STORY_MAP_ANALYSIS_PROMPT
 from prompts.mentor_analysis_prompt import MENTOR_TEXT_ANALYSIS_SYSTEM_PROMPT, build_mentor_analysis_user_prompt, validate_analysis_output
@@ -90,6 +111,8 @@ from utils.analytics.timeline_logger import (
     log_timeline_mode_used,
     log_timeline_coherence_check,
 )
+startup.mark("imports")
+
 app = Flask(__name__)
 
 CORS(
@@ -100,6 +123,9 @@ CORS(
         "http://localhost:3000"
     ]
 )
+track_in_flight(app)
+instrument(app)
+install_profiling(app)
 
 # ============================================
 # LOGGING SETUP
@@ -130,29 +156,47 @@ for logger_instance in [bs_logger, dt_logger, world_logger, char_logger]:
     logger_instance.addHandler(handler)
     logger_instance.setLevel(logging.DEBUG)
 
+# Every module has attached its handlers by now: move them to the async writer
+log_pipeline.install()
+log_pipeline.install_request_flag(app)
+
+services = ServiceRegistry(bs_logger)
+startup.mark("logging")
+
 # ============================================
 # FIREBASE INIT
 # ============================================
-try:
-    firebase_json = os.environ.get("FIREBASE_SERVICE_ACCOUNT_KEY")
+def _init_firebase():
+    try:
+        firebase_json = os.environ.get("FIREBASE_SERVICE_ACCOUNT_KEY")
 
-    if not firebase_json:
-        raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
-    
-    # Parse the JSON string into a dict
-    cred = credentials.Certificate(json.loads(firebase_json))
+        if not firebase_json:
+            raise ValueError("FIREBASE_SERVICE_ACCOUNT_KEY environment variable not set")
+        
+        # Parse the JSON string into a dict
+        cred = credentials.Certificate(json.loads(firebase_json))
 
-    # cred = credentials.Certificate("../Firebase/structuredcreativeplanning-fdea4acca240.json")
-    
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': "https://structuredcreativeplanning-default-rtdb.firebaseio.com/"
-    })
-    print(f"[DEBUG] Credentials loaded successfully")
+        # cred = credentials.Certificate("../Firebase/structuredcreativeplanning-fdea4acca240.json")
+        
+        firebase_app = firebase_admin.initialize_app(cred, {
+            'databaseURL': "https://structuredcreativeplanning-default-rtdb.firebaseio.com/"
+        })
+        print(f"[DEBUG] Credentials loaded successfully")
+
+        bs_logger.info("Firebase initialized successfully")
+        return firebase_app
+    except Exception as e:
+        bs_logger.error(f"Firebase initialization failed: {e}")
+        raise
+
+services.register("firebase", _init_firebase, required=True)
 
-    bs_logger.info("Firebase initialized successfully")
-except Exception as e:
-    bs_logger.error(f"Firebase initialization failed: {e}")
-    raise
+
+@app.before_request
+def ensure_firebase():
+    """Every route may touch the Realtime Database; /health reports instead of waiting."""
+    if request.path != '/health':
+        services.get("firebase")
 
 # ============================================
 # API KEYS VALIDATION
@@ -168,18 +212,36 @@ if not GOOGLE_BOOKS_API_KEY:
 
 client = openai.OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_URL)
 
-theme_extractor = ThemeExtractor(client)
-book_source_manager = BookSourceManager()
-book_ranker = BookRanker()
-story_extractor = StoryElementExtractor()
-explanation_generator = BookExplanationGenerator(client)
+# Deep-thinking question flow. "single": pre-selected bank candidates are
+# injected into the first call so the model picks and rewords in one shot.
+# "two_call": the model requests a question from the CFM and a second call
+# rewords it. Can be overridden per request with "questionMode".
+DT_QUESTION_MODES = ("single", "two_call")
+DT_QUESTION_MODE = os.environ.get("DT_QUESTION_MODE", "single")
+
+SESSION_API_URL = os.environ.get("SESSION_API_URL", "https://guidedcreativeplanning-session.onrender.com")
+
+auto_titler = AutoTitler(client, bs_logger)
+startup.mark("clients")
+
+# Recommendation pipeline: built on first use or by the background warm-up
+book_source_manager = services.register("book_sources", BookSourceManager)
+theme_extractor = services.register("theme_extractor", lambda: ThemeExtractor(client))
+book_ranker = services.register("book_ranker", BookRanker)
+story_extractor = services.register("story_extractor", StoryElementExtractor)
+explanation_generator = services.register("explanation_generator", lambda: BookExplanationGenerator(client))
+
 # ============================================
 # ROUTE: HEALTH CHECK
 # ============================================
 @app.route('/health', methods=['GET'])
 def health_check():
+    overall, subsystems = services.status()
     return jsonify({
-        'status': 'ok',
+        'status': 'ok' if overall != 'degraded' else 'degraded',
+        'readiness': overall,
+        'subsystems': subsystems,
+        'startup': startup.as_dict(),
         'services': {
             'brainstorming': 'running',
             'deepthinking': 'running',
@@ -187,51 +249,18 @@ def health_check():
             'character_extraction': 'running',
             'image_generation': 'running' if LEONARDO_API_KEY else 'disabled'
         }
-    })
+    }), 503 if overall == 'degraded' else 200
 
 def trigger_auto_title_if_needed(user_id, session_id, message_count):
     """
-    Trigger auto-title generation ONCE after 5 messages.
-    Only runs if title is still "New Chat" or "Untitled Chat".
-    Runs in background thread to not block chat response.
+    Queue auto-title generation ONCE after 5 messages.
+    Only titles sessions whose title is still the default and never set
+    (checked by the job); runs in-process on the background titling queue.
     """
     # Only auto-title at message 5 (gives enough context)
     if message_count != 5:
         return
-    
-    def generate_title():
-        try:
-            # Check current title before generating
-            metadata_ref = db.reference(f"chatSessions/{user_id}/{session_id}/metadata")
-            metadata = metadata_ref.get()
-            
-            if not metadata:
-                return
-            
-            current_title = metadata.get('title', '')
-            title_source = metadata.get('titleSource')
-            
-            # Only auto-generate if:
-            # 1. Title is still default ("New Chat" or "Untitled Chat")
-            # 2. No titleSource exists (never been titled)
-            # 3. titleSource is NOT 'manual' or 'ai' (user hasn't set a title)
-            if current_title in ['New Chat', 'Untitled Chat'] and title_source is None:
-                requests.post(
-                    f"http://localhost:{os.environ.get('PORT', 5000)}/sessions/auto-title",
-                    json={
-                        'userId': user_id,
-                        'sessionId': session_id
-                    },
-                    timeout=10
-                )
-                bs_logger.info(f"[AUTO_TITLE] Triggered for session {session_id}")
-            else:
-                bs_logger.debug(f"[AUTO_TITLE] Skipped for session {session_id} (title: {current_title}, source: {title_source})")
-                
-        except Exception as e:
-            bs_logger.warning(f"[AUTO_TITLE] Failed for session {session_id}: {e}")
-    
-    threading.Thread(target=generate_title, daemon=True).start()
+    auto_titler.request(user_id, session_id)
 
 @app.route('/api/guidance/chat', methods=['POST'])
 def guidance_chat():
@@ -249,7 +278,8 @@ def guidance_chat():
         for m in messages:
             deepseek_messages.append({"role": m["role"], "content": m["content"]})
 
-        response = client.chat.completions.create(
+        response = cached_completion(
+            client, "guidance",
             model="deepseek-chat",
             messages=deepseek_messages,
             max_tokens=300,
@@ -718,36 +748,46 @@ def brainstorming_chat():
         session_init_time = time.time() - session_init_start
         bs_logger.info(f"[BS] Session init: {session_init_time:.3f}s")
 
-        # Save user message FIRST
+        turn = TurnExecutor("BS", bs_logger)
+        turn.record("session_init", session_init_time)
+
+        # Independent pre-LLM reads run concurrently
+        turn.submit("stage", cfm_session.get_stage)
+        turn.submit("recent", cfm_session.get_recent_messages, limit=10)
+        turn.submit("snapshot", cfm_session.get_session_snapshot)
+
+        user_stage = turn.result("stage")
+
+        # Save user message FIRST (async write)
         cfm_session.save_message("user", user_message, 
-                                stage=cfm_session.get_stage(), visible=True)
+                                stage=user_stage, visible=True)
+        turn.defer("log_user_message", log_chat_message,
+                   user_id, 'brainstorming', 'user', len(user_message), user_stage)
 
-        try:
-            log_chat_message(user_id, 'brainstorming', 'user', len(user_message), cfm_session.get_stage())
-        except Exception as e:
-            bs_logger.warning(f"[BS] log_chat_message failed: {e}")
         # Build prompt
-        recent = cfm_session.get_recent_messages(limit=10)
-        session_snapshot = cfm_session.get_session_snapshot()
-        
-        deepseek_messages = [
-            {"role": "system", "content": BS_SYSTEM_PROMPT},
-            {"role": "system", "content": f"Session Context:\n{json.dumps(session_snapshot, indent=2)}"}
-        ]
-        
-        for m in recent["unsummarised"]:
-            deepseek_messages.append({"role": m["role"], "content": m["content"]})
-        deepseek_messages.append({"role": "user", "content": user_message})
+        recent = turn.result("recent")
+        session_snapshot = turn.result("snapshot")
+        
+        # Static system prompt and append-only history first so DeepSeek can
+        # serve them from its prefix cache; the per-turn snapshot goes last.
+        deepseek_messages = (
+            PromptLayout("brainstorming")
+            .static(BS_SYSTEM_PROMPT)
+            .history(recent["unsummarised"])
+            .volatile(f"Session Context:\n{json.dumps(session_snapshot, indent=2)}")
+            .user(user_message)
+            .build()
+        )
 
         # Call DeepSeek
-        llm_start = time.time()
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=deepseek_messages,
-            stream=False
-        )
-        llm_time = time.time() - llm_start
-        bs_logger.info(f"[BS] DeepSeek: {llm_time:.2f}s")
+        with turn.phase("llm"):
+            response = cached_completion(
+                client, "brainstorming",
+                model="deepseek-chat",
+                messages=deepseek_messages,
+                stream=False
+            )
+        bs_logger.info(f"[BS] DeepSeek: {turn.timings()['llm']:.2f}s")
 
         bot_reply_raw = response.choices[0].message.content.strip()
         
@@ -780,56 +820,59 @@ def brainstorming_chat():
                     main_thread_actions.append(obj)
         
         parse_time = time.time() - parse_start
+        turn.record("parse", parse_time)
         bs_logger.info(f"[BS] Parsed: {len(respond_actions)} respond, "
                       f"{len(main_thread_actions)} main, {len(background_actions)} background")
 
         # Process ALL main thread actions (CRITICAL FIX!)
+        # These stay on the request path so the next turn sees their writes.
         if main_thread_actions:
-            immediate_start = time.time()
-            try:
-                bs_handle_action(main_thread_actions, user_id, deepseek_messages, 
-                               cfm_session, depth=0)
-                immediate_time = time.time() - immediate_start
-                bs_logger.info(f"[BS] Main thread actions: {immediate_time:.3f}s")
-            except Exception as e:
-                bs_logger.error(f"[BS] Main thread actions failed: {e}")
+            with turn.phase("actions"):
+                try:
+                    bs_handle_action(main_thread_actions, user_id, deepseek_messages, 
+                                   cfm_session, depth=0)
+                except Exception as e:
+                    bs_logger.error(f"[BS] Main thread actions failed: {e}")
 
-        # FORCE cache refresh IMMEDIATELY after session modifications
-        try:
-            cfm_session._refresh_metadata_cache()
-            cfm_session._refresh_ideas_cache()
-        except Exception as e:
-            bs_logger.error(f"[BS] Cache refresh failed: {e}")
+        # FORCE cache refresh IMMEDIATELY after session modifications, so the
+        # auto-advance check below and a quick next turn read fresh stage/ideas
+        if main_thread_actions:
+            with turn.phase("refresh_caches"):
+                try:
+                    cfm_session._refresh_metadata_cache()
+                    cfm_session._refresh_ideas_cache()
+                except Exception as e:
+                    bs_logger.error(f"[BS] Cache refresh failed: {e}")
 
         # NOW check auto-advance (CRITICAL FIX: moved AFTER processing)
-        try:
-            current_stage = cfm_session.get_stage()
-            bs_meta = cfm_session.get_metadata().get("brainstorming", {})
+        with turn.phase("auto_advance"):
+            try:
+                current_stage = cfm_session.get_stage()
+                bs_meta = cfm_session.get_metadata().get("brainstorming", {})
             
-            hmw_count = len(bs_meta.get("hmwQuestions", {}))
-            ideas_meta = cfm_session.get_all_ideas()
-            idea_count = len(ideas_meta)
+                hmw_count = len(bs_meta.get("hmwQuestions", {}))
+                ideas_meta = cfm_session.get_all_ideas()
+                idea_count = len(ideas_meta)
             
-            categories = set()
-            for idea in ideas_meta.values():
-                cat = idea.get("evaluations", {}).get("flexibilityCategory")
-                if cat:
-                    categories.add(cat)
-            category_count = len(categories)
+                categories = set()
+                for idea in ideas_meta.values():
+                    cat = idea.get("evaluations", {}).get("flexibilityCategory")
+                    if cat:
+                        categories.add(cat)
+                category_count = len(categories)
             
-            bs_logger.debug(f"[BS] Auto-advance check: stage={current_stage}, "
-                          f"hmws={hmw_count}, ideas={idea_count}, cats={category_count}")
+                bs_logger.debug(f"[BS] Auto-advance check: stage={current_stage}, "
+                              f"hmws={hmw_count}, ideas={idea_count}, cats={category_count}")
             
-            # Auto-advance logic
-            if current_stage == "Clarify" and hmw_count >= 3:
-                cfm_session.switch_stage("Ideate", reasoning=f"Auto: {hmw_count} HMWs")
-                bs_logger.info(f"[BS] Auto-advanced Clarify -> Ideate")
-            elif current_stage == "Ideate" and idea_count >= 5 and category_count >= 2:
-                cfm_session.switch_stage("Develop", 
-                                        reasoning=f"Auto: {idea_count} ideas, {category_count} cats")
-                bs_logger.info(f"[BS] Auto-advanced Ideate -> Develop")
-        except Exception as e:
-            bs_logger.error(f"[BS] Auto-advance check failed: {e}")
+                if current_stage == "Clarify" and hmw_count >= 3:
+                    cfm_session.switch_stage("Ideate", reasoning=f"Auto: {hmw_count} HMWs")
+                    bs_logger.info(f"[BS] Auto-advanced Clarify -> Ideate")
+                elif current_stage == "Ideate" and idea_count >= 5 and category_count >= 2:
+                    cfm_session.switch_stage("Develop", 
+                                            reasoning=f"Auto: {idea_count} ideas, {category_count} cats")
+                    bs_logger.info(f"[BS] Auto-advanced Ideate -> Develop")
+            except Exception as e:
+                bs_logger.error(f"[BS] Auto-advance check failed: {e}")
 
         # Extract respond message
         chat_message = None
@@ -845,36 +888,34 @@ def brainstorming_chat():
             if not (stripped.startswith("{") or stripped.startswith("[")):
                 chat_message = parse_markdown(bot_reply_raw, "html")
 
-        # Save assistant message
+        # Save assistant message (async write) with the stage it was generated in
         if chat_message:
             cfm_session.save_message("assistant", chat_message, 
-                                    stage=cfm_session.get_stage(), visible=True)
-            try:
-                log_chat_message(user_id, 'brainstorming', 'assistant', len(chat_message), cfm_session.get_stage())
-            except Exception as e:
-                bs_logger.warning(f"[BS] log_chat_message failed: {e}")
+                                    stage=user_stage, visible=True)
 
-            try:
-                messages_ref = db.reference(f"chatSessions/{user_id}/{session_id}/messages")
-                all_messages = messages_ref.get() or {}
-                user_message_count = sum(1 for m in all_messages.values() 
-                                        if isinstance(m, dict) and m.get('role') == 'user')
-                
-                trigger_auto_title_if_needed(user_id, session_id, user_message_count)
-            except Exception as e:
-                bs_logger.warning(f"[BS] Auto-title trigger failed: {e}")
+        # Logging and titling run after the response is returned
+        def count_messages_for_title():
+            messages_ref = db.reference(f"chatSessions/{user_id}/{session_id}/messages")
+            all_messages = messages_ref.get() or {}
+            user_message_count = sum(1 for m in all_messages.values() 
+                                    if isinstance(m, dict) and m.get('role') == 'user')
+            trigger_auto_title_if_needed(user_id, session_id, user_message_count)
+
+        if chat_message:
+            turn.defer("log_assistant_message", log_chat_message,
+                       user_id, 'brainstorming', 'assistant', len(chat_message), user_stage)
+            turn.defer("auto_title", count_messages_for_title)
 
         # Start background thread ONLY for pure data fetches
         if background_actions:
-            bs_logger.info(f"[BS] Starting background thread for {len(background_actions)} data fetches")
-            threading.Thread(
-                target=bs_background_handle_action,
-                args=(background_actions, user_id, deepseek_messages, cfm_session),
-                daemon=True
-            ).start()
+            bs_logger.info(f"[BS] Queueing {len(background_actions)} data fetches in the background")
+            background.submit(
+                "interactive", bs_background_handle_action,
+                background_actions, user_id, deepseek_messages, cfm_session
+            )
 
-        total_time = time.time() - request_start
-        bs_logger.info(f"[BS] Total: {total_time:.2f}s")
+        turn.run_deferred()
+        turn.log_timings()
 
         return jsonify({
             "chat_message": chat_message,
@@ -899,6 +940,9 @@ def deepthinking_chat():
     user_message = data.get("message")
     user_id = data.get("user_id")
     session_id = data.get("session_id")
+    question_mode = data.get("questionMode") or DT_QUESTION_MODE
+    if question_mode not in DT_QUESTION_MODES:
+        question_mode = "single"
 
     if not user_message or not user_id:
         return jsonify({"error": "message and user_id required"}), 400
@@ -924,6 +968,7 @@ def deepthinking_chat():
             session_id = cfm_session.session_id
         
         session_init_time = time.time() - session_init_start
+        observe_phase("session_init", session_init_time)
         dt_logger.info(f"[DT] Session init: {session_init_time:.3f}s")
 
         # Save user message
@@ -937,19 +982,43 @@ def deepthinking_chat():
         # Build prompt
         recent = cfm_session.get_recent_messages(limit=10)
         
-        deepseek_messages = [{"role": "system", "content": DT_SYSTEM_PROMPT}]
-        for m in recent["unsummarised"]:
-            deepseek_messages.append({"role": m.get("role", "assistant"), "content": m.get("content")})
-        deepseek_messages.append({"role": "user", "content": user_message})
+        layout = (
+            PromptLayout("deepthinking")
+            .static(DT_SYSTEM_PROMPT)
+            .history([{"role": m.get("role", "assistant"), "content": m.get("content")}
+                      for m in recent["unsummarised"]])
+            .user(user_message)
+        )
+
+        if question_mode == "single":
+            try:
+                candidates = cfm_session.get_question_candidates()
+            except Exception as e:
+                dt_logger.warning(f"[DT] Candidate selection failed, using two-call path: {e}")
+                candidates = []
+                question_mode = "two_call"
+            if candidates:
+                layout.volatile(
+                    "Question Candidates (pre-selected from the question bank for this turn):\n"
+                    f"{json.dumps(candidates, separators=(',', ':'))}\n\n"
+                    "If your next move is a guiding question, pick ONE candidate and reword it "
+                    "conversationally yourself (scaffolding first, question last) in a single "
+                    "respond action that includes its id: "
+                    '{"action": "respond", "data": {"message": "...", "question_id": "<id>"}}. '
+                    "Do not emit get_primary_question or get_follow_up when a listed candidate fits."
+                )
+        deepseek_messages = layout.build()
 
         # Call DeepSeek
         llm_start = time.time()
-        response = client.chat.completions.create(
+        response = cached_completion(
+            client, "deepthinking",
             model="deepseek-chat",
             messages=deepseek_messages,
             stream=False
         )
         llm_time = time.time() - llm_start
+        observe_phase("llm", llm_time)
         dt_logger.info(f"[DT] DeepSeek: {llm_time:.2f}s")
 
         bot_reply_raw = response.choices[0].message.content.strip()
@@ -978,6 +1047,7 @@ def deepthinking_chat():
                     background_actions.append(obj)
         
         parse_time = time.time() - parse_start
+        observe_phase("parse", parse_time)
         dt_logger.info(f"[DT] Parsed: {len(respond_actions)} respond, "
                       f"{len(cfm_question_actions)} CFM, {len(immediate_actions)} immediate, "
                       f"{len(background_actions)} background")
@@ -985,11 +1055,18 @@ def deepthinking_chat():
         # Generate immediate response
         chat_message = None
         
-        # Priority 1: Explicit respond
+        # Priority 1: Explicit respond (in single mode this may carry the
+        # id of the candidate question the model picked and reworded)
         for obj in respond_actions:
             msg = obj.get("data", {}).get("message", "")
             if msg:
                 chat_message = parse_markdown(msg, "html")
+                question_id = obj.get("data", {}).get("question_id")
+                if question_id:
+                    try:
+                        cfm_session.record_asked_question(question_id)
+                    except Exception as e:
+                        dt_logger.warning(f"[DT] Question tracking failed: {e}")
                 break
         
         # Priority 2: Process immediate actions (get_info/query)
@@ -1011,13 +1088,17 @@ def deepthinking_chat():
                     dt_logger.debug(f"[DT] Got response from immediate actions")
                 
                 immediate_time = time.time() - immediate_start
+                observe_phase("actions", immediate_time)
                 dt_logger.info(f"[DT] Immediate actions: {immediate_time:.3f}s")
             except Exception as e:
                 dt_logger.error(f"[DT] Immediate actions failed: {e}")
                 chat_message = "I tried to retrieve that information but encountered an issue. Could you rephrase your question?"
         
-        # Priority 3: Process CFM questions
+        # Priority 3: Process CFM questions (two-call path; also the fallback
+        # when the model requests a question instead of using a candidate)
         if not chat_message and cfm_question_actions:
+            if question_mode == "single":
+                dt_logger.info("[DT] Model requested a CFM question; falling back to two-call rewording")
             for cfm_action in cfm_question_actions:
                 try:
                     action_type = cfm_action.get("action")
@@ -1064,42 +1145,19 @@ def deepthinking_chat():
                     
                     # Track question
                     try:
-                        metadata = cfm_session.get_metadata()
-                        asked = metadata.get("asked", [])
-                        
-                        if cfm_result.get("type") == "primary":
-                            asked.append({
-                                "id": cfm_result.get("question_id"),
-                                "action": "new_category",
-                                "category": cfm_result.get("category"),
-                                "angle": cfm_result.get("angle")
-                            })
-                            cfm_session.update_metadata({
-                                "asked": asked,
-                                "depth": metadata.get("depth", 0) + 1,
-                                "followUpCount": 0,
-                                "currentCategory": cfm_result.get("category"),
-                                "currentAngle": cfm_result.get("angle")
-                            })
-                        elif cfm_result.get("type") == "follow_up" and selected:
-                            asked.append({"id": selected.get("id"), "action": "follow_up"})
-                            cfm_session.update_metadata({
-                                "asked": asked,
-                                "followUpCount": metadata.get("followUpCount", 0) + 1
-                            })
+                        if question_context.get("question_id"):
+                            cfm_session.record_asked_question(question_context["question_id"])
                     except Exception as e:
                         dt_logger.warning(f"[DT] Question tracking failed: {e}")
                     
-                    # Reword question
-                    recent_context = [{"role": m.get("role"), "content": m.get("content")[:150]} 
-                                     for m in deepseek_messages[-5:] if m.get("role") in ["user", "assistant"]]
-                    
+                    # Reword question. Reuse the first call's messages verbatim as
+                    # the prefix (system prompt + history + user turn) so it is
+                    # served from DeepSeek's cache; only the instruction is new.
                     reword_prompt = f"""Reword this question conversationally:
 "{raw_question}"
 
 Context: {json.dumps(question_context, indent=2)}
 Reasoning: {reasoning}
-Recent: {json.dumps(recent_context, indent=2)}
 
 Instructions:
 1. Include scaffolding before the question
@@ -1107,11 +1165,11 @@ Instructions:
 3. Sound warm and natural
 4. Respond with ONLY the text (no JSON)"""
 
-                    reword_resp = client.chat.completions.create(
+                    reword_resp = cached_completion(
+                        client, "deepthinking.reword",
                         model="deepseek-chat",
-                        messages=[
-                            {"role": "system", "content": DT_SYSTEM_PROMPT},
-                            {"role": "user", "content": reword_prompt}
+                        messages=deepseek_messages + [
+                            {"role": "system", "content": reword_prompt}
                         ],
                         stream=False,
                         temperature=0.7
@@ -1171,12 +1229,11 @@ Instructions:
 
         # Start background thread for remaining actions
         if background_actions:
-            dt_logger.info(f"[DT] Starting background thread for {len(background_actions)} actions")
-            threading.Thread(
-                target=dt_background_handle_action,
-                args=(background_actions, user_id, deepseek_messages, cfm_session),
-                daemon=True
-            ).start()
+            dt_logger.info(f"[DT] Queueing {len(background_actions)} actions in the background")
+            background.submit(
+                "interactive", dt_background_handle_action,
+                background_actions, user_id, deepseek_messages, cfm_session
+            )
 
         total_time = time.time() - request_start
         dt_logger.info(f"[DT] Total: {total_time:.2f}s")
@@ -1185,6 +1242,7 @@ Instructions:
             "chat_message": chat_message,
             "session_id": session_id,
             "mode": "deepthinking",
+            "question_mode": question_mode,
             "background_processing": len(background_actions) > 0
         }), 200
 
@@ -1353,56 +1411,47 @@ def log_chat_stage_transition():
 
 @app.route('/sessions/list', methods=['POST'])
 def list_sessions():
-    """Get all chat sessions for a user."""
+    """
+    Get chat sessions for a user, newest first, from the compact sessionIndex.
+    Optional pagination: "limit" plus the "before" cursor returned as nextCursor.
+    """
     try:
         data = request.json
         user_id = data.get('userId')
+        limit = data.get('limit')
+        before = data.get('before')
         
         if not user_id:
             return jsonify({'error': 'userId required'}), 400
         
-        # Get all sessions for user
-        sessions_ref = db.reference(f"chatSessions/{user_id}")
-        sessions_data = sessions_ref.get() or {}
+        try:
+            entries, next_cursor = session_index.list_entries(
+                user_id, limit=session_index.parse_limit(limit), before=before
+            )
+        except ValueError as e:
+            # Malformed "before" cursor (InvalidCursorError) or a bad "limit"
+            return jsonify({'error': 'Invalid pagination parameters', 'details': str(e)}), 400
         
-        # Build session list with metadata
         sessions = []
-        for session_id, session_data in sessions_data.items():
-            if not isinstance(session_data, dict):
-                continue
-            
-            metadata = session_data.get('metadata', {})
-            messages = session_data.get('messages', {})
-            
-            # Count messages
-            message_count = len([m for m in messages.values() if isinstance(m, dict)])
-            
-            # Get last message timestamp
-            last_message_time = 0
-            for msg in messages.values():
-                if isinstance(msg, dict):
-                    timestamp = msg.get('timestamp', 0)
-                    if timestamp > last_message_time:
-                        last_message_time = timestamp
-            
+        for entry in entries:
+            mode = entry.get('mode', 'brainstorming')
             sessions.append({
-                'sessionId': session_id,
-                'title': metadata.get('title', 'Untitled Chat'),
-                'mode': metadata.get('mode', 'brainstorming'),
-                'createdAt': metadata.get('createdAt', 0),
-                'updatedAt': last_message_time or metadata.get('updatedAt', 0),
-                'messageCount': message_count,
-                'stage': metadata.get('brainstorming', {}).get('stage', 'Clarify') if metadata.get('mode') == 'brainstorming' else None
+                'sessionId': entry['sessionId'],
+                'title': entry.get('title') or 'Untitled Chat',
+                'mode': mode,
+                'createdAt': entry.get('createdAt', 0),
+                'updatedAt': entry.get('updatedAt', 0),
+                'messageCount': entry.get('messageCount', 0),
+                'lastMessagePreview': entry.get('lastMessagePreview', ''),
+                'stage': (entry.get('stage') or 'Clarify') if mode == 'brainstorming' else None
             })
         
-        # Sort by most recent first
-        sessions.sort(key=lambda x: x['updatedAt'], reverse=True)
-        
         bs_logger.info(f"[SESSIONS] Listed {len(sessions)} sessions for user {user_id}")
         
         return jsonify({
             'sessions': sessions,
-            'count': len(sessions)
+            'count': len(sessions),
+            'nextCursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -1437,6 +1486,8 @@ def rename_session():
             'titleSource': 'manual',
             'updatedAt': int(time.time() * 1000)
         })
+        session_index.safe(session_index.update_entry, user_id, session_id,
+                           title=new_title, titleSource='manual')
         
         bs_logger.info(f"[SESSIONS] Renamed session {session_id} to: {new_title}")
         
@@ -1462,13 +1513,14 @@ def delete_session():
         if not user_id or not session_id:
             return jsonify({'error': 'userId and sessionId required'}), 400
         
-        # Check if session exists
+        # Check if session exists (metadata only, not every message)
         session_ref = db.reference(f"chatSessions/{user_id}/{session_id}")
-        if not session_ref.get():
+        if not session_ref.child("metadata").get():
             return jsonify({'error': 'Session not found'}), 404
         
         # Delete session
         session_ref.delete()
+        session_index.safe(session_index.remove_entry, user_id, session_id)
         
         bs_logger.info(f"[SESSIONS] Deleted session {session_id}")
         
@@ -1493,73 +1545,16 @@ def generate_session_title():
         if not user_id or not session_id:
             return jsonify({'error': 'userId and sessionId required'}), 400
         
-        # Get session messages
-        messages_ref = db.reference(f"chatSessions/{user_id}/{session_id}/messages")
-        messages_data = messages_ref.get() or {}
+        conversation_text, message_count = load_conversation_text(user_id, session_id)
         
-        if not messages_data:
+        if message_count == 0:
             return jsonify({'error': 'No messages in session'}), 400
         
-        # Get first 5-10 user messages for context
-        user_messages = []
-        for msg_id, msg in messages_data.items():
-            if isinstance(msg, dict) and msg.get('role') == 'user':
-                user_messages.append({
-                    'content': msg.get('content', ''),
-                    'timestamp': msg.get('timestamp', 0)
-                })
-        
-        user_messages.sort(key=lambda x: x['timestamp'])
-        context_messages = user_messages[:10]
-        
-        if len(context_messages) < 2:
+        if message_count < 2:
             return jsonify({'error': 'Not enough messages to generate title'}), 400
         
-        # Build prompt for title generation
-        conversation_text = "\n".join([f"User: {m['content']}" for m in context_messages])
-        
-        title_prompt = f"""Based on this conversation, generate a concise, descriptive title (max 6 words).
-The title should capture the main topic or focus of the discussion.
-
-Conversation:
-{conversation_text}
-
-Requirements:
-- Maximum 6 words
-- Descriptive and specific
-- No quotes or special characters
-- Capitalized like a title
-
-Respond with ONLY the title, nothing else."""
-
-        # Call DeepSeek
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that creates concise titles."},
-                {"role": "user", "content": title_prompt}
-            ],
-            stream=False,
-            temperature=0.7,
-            max_tokens=50
-        )
-        
-        generated_title = response.choices[0].message.content.strip()
-        
-        # Clean up title
-        generated_title = generated_title.strip('"').strip("'").strip()
-        
-        # Truncate if too long
-        if len(generated_title) > 60:
-            generated_title = generated_title[:57] + "..."
-        
-        # Update session metadata
-        metadata_ref = db.reference(f"chatSessions/{user_id}/{session_id}/metadata")
-        metadata_ref.update({
-            'title': generated_title,
-            'titleSource': 'ai',
-            'updatedAt': int(time.time() * 1000)
-        })
+        generated_title = generate_title(client, conversation_text)
+        save_title(user_id, session_id, generated_title, 'ai')
         
         bs_logger.info(f"[SESSIONS] Generated title for {session_id}: {generated_title}")
         
@@ -1576,7 +1571,7 @@ Respond with ONLY the title, nothing else."""
 
 @app.route('/sessions/auto-title', methods=['POST'])
 def auto_title_session():
-    """Auto-generate title when session reaches threshold (called internally)."""
+    """Auto-generate title for a session (chat turns use the in-process auto_titler instead)."""
     try:
         data = request.json
         user_id = data.get('userId')
@@ -1585,84 +1580,35 @@ def auto_title_session():
         if not user_id or not session_id:
             return jsonify({'error': 'userId and sessionId required'}), 400
         
-        # Check if already has any title set
-        metadata_ref = db.reference(f"chatSessions/{user_id}/{session_id}/metadata")
-        metadata = metadata_ref.get() or {}
+        metadata = db.reference(f"chatSessions/{user_id}/{session_id}/metadata").get() or {}
         
         # STRICT CHECK: Only generate if title is still default AND no titleSource exists
         # This ensures auto-title only happens ONCE
-        current_title = metadata.get('title', '')
-        title_source = metadata.get('titleSource')
-        
-        if title_source is not None:
-            # Title has been set before (either manual, ai, or ai_auto)
+        if not needs_auto_title(metadata):
             return jsonify({
                 'success': True,
                 'skipped': True,
-                'reason': f'Title already generated (source: {title_source})'
+                'reason': f"Title already set (source: {metadata.get('titleSource')})"
             }), 200
         
-        if current_title not in ['New Chat', 'Untitled Chat', None, '']:
-            # Title has been changed from default
+        conversation_text, message_count = load_conversation_text(user_id, session_id)
+        
+        if message_count < 3:
             return jsonify({
                 'success': True,
                 'skipped': True,
-                'reason': 'Title already customized'
+                'reason': 'Not enough messages'
             }), 200
         
-        # Generate title (reuse logic from generate-title)
-        messages_ref = db.reference(f"chatSessions/{user_id}/{session_id}/messages")
-        messages_data = messages_ref.get() or {}
-        
-        user_messages = []
-        for msg_id, msg in messages_data.items():
-            if isinstance(msg, dict) and msg.get('role') == 'user':
-                user_messages.append({
-                    'content': msg.get('content', ''),
-                    'timestamp': msg.get('timestamp', 0)
-                })
-        
-        user_messages.sort(key=lambda x: x['timestamp'])
-        context_messages = user_messages[:10]
+        generated_title = generate_title(client, conversation_text, route="sessions.auto_title")
         
-        if len(context_messages) < 3:
+        if not claim_and_save_title(user_id, session_id, generated_title):
             return jsonify({
                 'success': True,
                 'skipped': True,
-                'reason': 'Not enough messages'
+                'reason': 'Title set by another request'
             }), 200
         
-        conversation_text = "\n".join([f"User: {m['content']}" for m in context_messages])
-        
-        title_prompt = f"""Based on this conversation, generate a concise, descriptive title (max 6 words).
-
-Conversation:
-{conversation_text}
-
-Respond with ONLY the title."""
-
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You create concise, descriptive titles."},
-                {"role": "user", "content": title_prompt}
-            ],
-            stream=False,
-            temperature=0.7,
-            max_tokens=50
-        )
-        
-        generated_title = response.choices[0].message.content.strip().strip('"').strip("'")
-        
-        if len(generated_title) > 60:
-            generated_title = generated_title[:57] + "..."
-        
-        metadata_ref.update({
-            'title': generated_title,
-            'titleSource': 'ai_auto',
-            'updatedAt': int(time.time() * 1000)
-        })
-        
         bs_logger.info(f"[SESSIONS] Auto-titled {session_id}: {generated_title}")
         
         return jsonify({
@@ -1718,7 +1664,8 @@ def suggest_world_template():
     user_prompt = "\n".join(context_parts)
 
     try:
-        response = client.chat.completions.create(
+        response = cached_completion(
+            client, "world.suggest_template",
             model="deepseek-chat",
             messages=[
                 {"role": "system", "content": WORLD_SYSTEM_PROMPT},
@@ -1834,7 +1781,8 @@ def extract_characters():
                 char_logger.info(f"[CHAR] Processing chunk {i+1}/{len(chunks)}")
                 
                 try:
-                    response = client.chat.completions.create(
+                    response = cached_completion(
+                        client, "characters.extract",
                         model="deepseek-chat",
                         messages=[
                             {"role": "system", "content": MAPPING_SYSTEM_PROMPT},
@@ -1899,7 +1847,8 @@ def extract_characters():
             char_logger.info(f"Relationships: {result['relationships']}")
         else:
             # Single extraction for normal-sized text
-            response = client.chat.completions.create(
+            response = cached_completion(
+                client, "characters.extract",
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": MAPPING_SYSTEM_PROMPT},
@@ -2029,7 +1978,7 @@ def get_book_recommendations():
         
         # Fetch conversation from Session API
         try:
-            session_api_url = "https://guidedcreativeplanning-session.onrender.com"
+            session_api_url = SESSION_API_URL
             
             messages_response = requests.post(
                 f"{session_api_url}/session/get_messages",
@@ -2093,13 +2042,14 @@ def get_book_recommendations():
             conversation_text = story_extractor.format_conversation(conversation_history)
             
             # Build prompt
-            prompt = STORY_EXTRACTION_PROMPT.format(conversation_text=conversation_text)
+            prompt = build_story_extraction_user_prompt(conversation_text)
             
             # Call DeepSeek
-            response = client.chat.completions.create(
+            response = cached_completion(
+                client, "recommendations.extract",
                 model="deepseek-chat",
                 messages=[
-                    {"role": "system", "content": "You are an expert at analyzing creative writing conversations."},
+                    {"role": "system", "content": STORY_EXTRACTION_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 response_format={'type': 'json_object'},
@@ -2117,6 +2067,7 @@ def get_book_recommendations():
                 story_elements = story_extractor.keyword_extraction_fallback(conversation_history)
             
             extraction_time = time.time() - extraction_start
+            observe_phase("extraction", extraction_time)
             rec_logger.info(f"[REC] Story extraction: {extraction_time:.3f}s")
             
         except Exception as e:
@@ -2154,6 +2105,7 @@ def get_book_recommendations():
             
             books = book_source_manager.get_books_from_sources(compat_themes, filters, limit * 2)
             source_time = time.time() - source_start
+            observe_phase("sources", source_time)
             rec_logger.info(f"[REC] Book sources: {source_time:.3f}s, found {len(books)} books")
             
         except Exception as e:
@@ -2178,6 +2130,7 @@ def get_book_recommendations():
         try:
             ranked_books = book_ranker.rank_and_deduplicate_books(books, compat_themes, limit)
             rank_time = time.time() - rank_start
+            observe_phase("rank", rank_time)
             rec_logger.info(f"[REC] Ranking: {rank_time:.3f}s, selected {len(ranked_books)} books")
             
             # Log ranking summary
@@ -2214,6 +2167,7 @@ def get_book_recommendations():
                 )
                 
                 explain_time = time.time() - explain_start
+                observe_phase("explain", explain_time)
                 rec_logger.info(f"[REC] Explanations: {explain_time:.3f}s")
                 
             except Exception as e:
@@ -2317,7 +2271,7 @@ def get_book_recommendations():
             except Exception as log_err:
                 rec_logger.warning(f"[REC] Analytics logging failed: {log_err}")
         
-        threading.Thread(target=log_metrics, daemon=True).start()
+        background.submit("logging", log_metrics, task_name="rec_log_metrics")
         
         total_time = time.time() - request_start
         rec_logger.info(f"[REC] Total: {total_time:.2f}s, returned {len(explained_books)} books with explanations")
@@ -2926,7 +2880,7 @@ def browse_books_by_genre():
         }
         
         response = requests.get(
-            'https://www.googleapis.com/books/v1/volumes',
+            GOOGLE_BOOKS_URL,
             params=params,
             timeout=10
         )
@@ -3064,18 +3018,17 @@ def browse_books_smart():
         
         try:
             # Use the same extraction prompt as recommendations
-            from prompts.element_extraction_prompt import STORY_EXTRACTION_PROMPT
-            
             # Format the query as a simple conversation
             conversation_text = f"Student: {query}"
             
-            prompt = STORY_EXTRACTION_PROMPT.format(conversation_text=conversation_text)
+            prompt = build_story_extraction_user_prompt(conversation_text)
             
             # Call DeepSeek
-            response = client.chat.completions.create(
+            response = cached_completion(
+                client, "browse_books.extract",
                 model="deepseek-chat",
                 messages=[
-                    {"role": "system", "content": "You are an expert at analyzing creative writing conversations."},
+                    {"role": "system", "content": STORY_EXTRACTION_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 response_format={'type': 'json_object'},
@@ -3095,6 +3048,7 @@ def browse_books_smart():
                 ])
             
             extraction_time = time.time() - extraction_start
+            observe_phase("extraction", extraction_time)
             rec_logger.info(f"[BROWSE_SMART] Extraction: {extraction_time:.3f}s")
             
         except Exception as e:
@@ -3136,6 +3090,7 @@ def browse_books_smart():
             
             books = book_source_manager.get_books_from_sources(compat_themes, {}, limit * 2)
             source_time = time.time() - source_start
+            observe_phase("sources", source_time)
             rec_logger.info(f"[BROWSE_SMART] Sources: {source_time:.3f}s, found {len(books)} books")
             
         except Exception as e:
@@ -3161,6 +3116,7 @@ def browse_books_smart():
         try:
             ranked_books = book_ranker.rank_and_deduplicate_books(books, compat_themes, limit)
             rank_time = time.time() - rank_start
+            observe_phase("rank", rank_time)
             rec_logger.info(f"[BROWSE_SMART] Ranking: {rank_time:.3f}s, selected {len(ranked_books)} books")
             
         except Exception as e:
@@ -3180,6 +3136,7 @@ def browse_books_smart():
                 )
                 
                 explain_time = time.time() - explain_start
+                observe_phase("explain", explain_time)
                 rec_logger.info(f"[BROWSE_SMART] Explanations: {explain_time:.3f}s")
                 
             except Exception as e:
@@ -3261,7 +3218,7 @@ def extract_story_elements():
             }), 400
         
         # Fetch conversation from Session API
-        session_api_url = "https://guidedcreativeplanning-session.onrender.com"
+        session_api_url = SESSION_API_URL
         
         messages_response = requests.post(
             f"{session_api_url}/session/get_messages",
@@ -3311,7 +3268,7 @@ def extract_story_elements():
         conversation_text = story_extractor.format_conversation(conversation_history)
         
         # Build prompt
-        prompt = STORY_EXTRACTION_PROMPT.format(conversation_text=conversation_text)
+        prompt = build_story_extraction_user_prompt(conversation_text)
         
         # AI CALL HAPPENS HERE (like chat endpoints)
         extraction_start = time.time()
@@ -3322,12 +3279,13 @@ def extract_story_elements():
         
         for attempt in range(max_retries):
             try:
-                response = client.chat.completions.create(
+                response = cached_completion(
+                    client, "story_elements.extract",
                     model="deepseek-chat",
                     messages=[
                         {
                             "role": "system",
-                            "content": "You are an expert at analyzing creative writing conversations."
+                            "content": STORY_EXTRACTION_SYSTEM_PROMPT
                         },
                         {
                             "role": "user",
@@ -3347,6 +3305,7 @@ def extract_story_elements():
                 # Validate using utility
                 if story_extractor.validate_extraction(elements):
                     extraction_time = time.time() - extraction_start
+                    observe_phase("extraction", extraction_time)
                     rec_logger.info(
                         f"[STORY_EXTRACT] Success in {extraction_time:.2f}s "
                         f"(confidence: {elements.get('overallConfidence', 0):.2f})"
@@ -3400,11 +3359,276 @@ def extract_story_elements():
             'details': str(e)
         }), 500
 
+# ============================================
+# STORY MAP ANALYSIS
+# ============================================
+
+STORY_MAP_PARTITION_NODES = story_map_analysis.STORY_MAP_PARTITION_NODES
+
+
+def _story_map_user_message(nodes, links, pre_analysis, genre, context, boundary_text=None):
+    """User prompt for one analysis call over nodes/links (the whole map or one section)."""
+    # Empty optional fields are dropped to keep the prompt small
+    analysis_context = {
+        'nodes': [
+            {
+                k: v for k, v in (
+                    ('id', node.get('id')),
+                    ('label', node.get('label')),
+                    ('group', node.get('group')),
+                    ('aliases', node.get('aliases')),
+                    ('level', node.get('level')),
+                    ('note', node.get('note')),
+                ) if v not in (None, '')
+            }
+            for node in nodes
+        ],
+        'links': [
+            {
+                k: v for k, v in (
+                    ('source', story_map_analysis.link_endpoint(link.get('source'))),
+                    ('target', story_map_analysis.link_endpoint(link.get('target'))),
+                    ('type', link.get('type')),
+                    ('context', link.get('context')),
+                ) if v not in (None, '')
+            }
+            for link in links
+        ],
+        'user_genre': genre,
+        'user_context': context
+    }
+    section_note = f"\nSECTION:\n{boundary_text}\n" if boundary_text else ""
+
+    return f"""Analyze this story map structure.
+{section_note}
+PRE-COMPUTED FACTS (exact; do not recount):
+{story_map_analysis.format_facts(pre_analysis, nodes)}
+
+GRAPH DATA:
+{json.dumps(analysis_context, separators=(',', ':'))}
+
+Provide comprehensive analysis including:
+1. DUPLICATE DETECTION: review the candidate sets above and report only those that really are the same entity. Add a set only if notes or relationships show a duplicate that name matching missed.
+2. Structural coherence (use the component, isolated-node and degree facts)
+3. Genre pattern analysis (if genre provided)
+4. Narrative consistency
+5. Relationship diversity
+6. Character centrality
+
+IMPORTANT: Return ONLY valid JSON. Ensure all strings are properly escaped and quoted.
+Return analysis in the specified JSON format."""
+
+
+def _request_story_map_analysis(user_message):
+    """Call DeepSeek and parse the analysis; raises ModelCallError on failure."""
+    rec_logger.info("[STORY_MAP] Calling DeepSeek")
+    
+    # Call DeepSeek with increased max_tokens to prevent truncation
+    try:
+        response = cached_completion(
+            client, "story_map.analyze",
+            model="deepseek-chat",
+            messages=[
+                {"role": "system", "content": STORY_MAP_ANALYSIS_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            response_format={'type': 'json_object'},
+            stream=False,
+            timeout=90,
+            temperature=0.3,  # Lower temperature for more consistent analysis
+            max_tokens=8000  # Increased to handle large story maps
+        )
+        
+        rec_logger.info("[STORY_MAP] DeepSeek response received")
+        
+    except openai.APITimeoutError:
+        rec_logger.error("[STORY_MAP] DeepSeek timeout")
+        raise ModelCallError(
+            504, 'Analysis timeout',
+            'Analysis took too long. Try analyzing a smaller section of your map.'
+        )
+    
+    except Exception as api_err:
+        rec_logger.error(f"[STORY_MAP] DeepSeek API error: {api_err}")
+        raise ModelCallError(500, 'AI service error', str(api_err))
+    
+    # Parse response
+    try:
+        result_text = response.choices[0].message.content.strip()
+        
+        # Log the raw response for debugging
+        rec_logger.debug(f"[STORY_MAP] Raw AI response length: {len(result_text)} chars")
+        
+        # Check if response was truncated
+        if response.choices[0].finish_reason == 'length':
+            rec_logger.error("[STORY_MAP] Response truncated - max_tokens too small")
+            raise ModelCallError(
+                413, 'Analysis incomplete',
+                'Story map too large for analysis. Try analyzing a smaller section.',
+                truncated=True
+            )
+        
+        # Clean markdown code blocks if present
+        if result_text.startswith('```'):
+            result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
+            if result_text.endswith('```'):
+                result_text = result_text[:-3].strip()
+        
+        # Try to parse JSON
+        analysis = json.loads(result_text)
+        rec_logger.info("[STORY_MAP] Response parsed successfully")
+        
+        # Validate response structure
+        required_fields = ['overall_health', 'overall_score', 'summary', 'issues']
+        if not all(field in analysis for field in required_fields):
+            rec_logger.error(f"[STORY_MAP] Missing required fields in AI response")
+            raise ModelCallError(
+                500, 'Invalid AI response', 'AI response missing required fields'
+            )
+        
+    except json.JSONDecodeError as parse_err:
+        rec_logger.error(f"[STORY_MAP] JSON parse error: {parse_err}")
+        rec_logger.error(f"[STORY_MAP] Problematic response (first 500 chars): {result_text[:500]}")
+        rec_logger.error(f"[STORY_MAP] Problematic response (last 500 chars): {result_text[-500:]}")
+        
+        # Try to salvage partial response by fixing common issues
+        try:
+            # Remove any trailing incomplete content
+            last_brace = result_text.rfind('}')
+            if last_brace > 0:
+                truncated = result_text[:last_brace + 1]
+                analysis = json.loads(truncated)
+                rec_logger.info("[STORY_MAP] Recovered partial response")
+            else:
+                raise parse_err
+        except:
+            raise ModelCallError(
+                500, 'Failed to parse AI response', f'AI returned invalid JSON: {str(parse_err)}'
+            )
+
+    return analysis
+
+
+def _analyze_story_map_sections(nodes, links, pre_analysis, sections, genre, context):
+    """Analyze each section concurrently and merge the results into one analysis."""
+    rec_logger.info(f"[STORY_MAP] Partitioned into {len(sections)} sections: {[len(s) for s in sections]}")
+    turn = TurnExecutor("STORY_MAP", rec_logger, model_calls=True)
+    for i, section in enumerate(sections):
+        sub_nodes, sub_links, boundary = story_map_analysis.section_graph(section, nodes, links)
+        user_message = _story_map_user_message(
+            sub_nodes, sub_links,
+            story_map_analysis.analyze(sub_nodes, sub_links),
+            genre, context,
+            boundary_text=story_map_analysis.format_boundary(
+                boundary, f"This is one of {len(sections)} sections of a larger map."
+            )
+        )
+        turn.submit(f"section_{i}", _request_story_map_analysis, user_message)
+
+    results, errors = [], []
+    for i in range(len(sections)):
+        try:
+            results.append(turn.result(f"section_{i}"))
+        except ModelCallError as err:
+            rec_logger.warning(f"[STORY_MAP] Section {i} failed: {err.details}")
+            errors.append(err)
+    turn.log_timings()
+
+    if not results:
+        raise errors[0]
+    analysis = story_map_analysis.merge_analyses(results, pre_analysis, sections)
+    if errors:
+        analysis['failed_partitions'] = len(errors)
+        analysis['summary'] += f" {len(errors)} of {len(sections)} sections could not be analyzed."
+    return analysis
+
+
+def _load_story_map_analysis(user_id):
+    """Last stored analysis for the user as {'fingerprint', 'analysis'}, or None."""
+    try:
+        stored = db.reference(f"storyMapAnalyses/{user_id}/latest").get()
+        if not stored:
+            return None
+        # Stored as JSON strings: RTDB drops empty lists and rejects some key characters
+        return {
+            'fingerprint': json.loads(stored['fingerprint']),
+            'analysis': json.loads(stored['analysis']),
+        }
+    except Exception as load_err:
+        rec_logger.warning(f"[STORY_MAP] Failed to load previous analysis: {load_err}")
+        return None
+
+
+def _save_story_map_analysis(user_id, fingerprint, analysis):
+    def save():
+        try:
+            db.reference(f"storyMapAnalyses/{user_id}/latest").set({
+                'graphHash': fingerprint['graph'],
+                'fingerprint': json.dumps(fingerprint),
+                'analysis': json.dumps(analysis),
+                'updatedAt': int(time.time() * 1000),
+            })
+        except Exception as save_err:
+            rec_logger.warning(f"[STORY_MAP] Failed to store analysis: {save_err}")
+
+    background.submit("bookkeeping", save, task_name="story_map_analysis_save")
+
+
+def _log_story_map_run(user_id, analysis, nodes, links, processing_time_ms, cached=False):
+    try:
+        from utils.analytics.story_map_logger import log_story_map_analysis as _log_sm_analysis
+        _log_sm_analysis(
+            user_id=user_id,
+            overall_score=analysis.get('overall_score', 0),
+            overall_health=analysis.get('overall_health', 'unknown'),
+            node_count=len(nodes),
+            link_count=len(links),
+            issues_found=analysis.get('issues', []),
+            genre_inferred=analysis.get('genre_insights', {}).get('detected_genre') if isinstance(analysis.get('genre_insights'), dict) else None,
+            processing_time_ms=processing_time_ms,
+            cached=cached
+        )
+        rec_logger.info("[STORY_MAP] Analysis metrics logged")
+    except Exception as log_err:
+        rec_logger.warning(f"[STORY_MAP] Failed to log analysis metrics: {log_err}")
+
+
+def _reanalyze_story_map(nodes, links, pre_analysis, previous, affected, removed, genre, context):
+    """Re-run the model on the affected neighbourhood only and fold it into the previous result."""
+    update = {'issues': []}
+    if affected:
+        section = [n.get('id') for n in nodes if n.get('id') in affected]
+        sub_nodes, sub_links, boundary = story_map_analysis.section_graph(section, nodes, links)
+        user_message = _story_map_user_message(
+            sub_nodes, sub_links,
+            story_map_analysis.analyze(sub_nodes, sub_links),
+            genre, context,
+            boundary_text="\n\n".join(filter(None, (
+                story_map_analysis.format_boundary(
+                    boundary,
+                    "This is the part of the map around the user's latest edits; "
+                    "the rest was analyzed before and has not changed."
+                ),
+                story_map_analysis.format_map_wide(previous.get('issues')),
+            )))
+        )
+        update = _request_story_map_analysis(user_message)
+    return story_map_analysis.apply_update(previous, update, affected, removed, pre_analysis)
+
+
 @app.route('/api/story-map/analyze', methods=['POST'])
 def analyze_story_map():
     """
     Analyze story map structure for duplicates, coherence, and genre patterns.
     AI acts as Deconstructor (genre patterns) and Reflective Guide (structural questions).
+
+    Maps larger than STORY_MAP_PARTITION_NODES (or with "partition": true) are
+    analyzed in concurrent sections and merged; a single call that runs out of
+    output tokens is retried the same way.
+
+    The last result is stored with the graph's content hashes: an unchanged
+    graph returns it directly, and a small edit re-analyzes only the changed
+    neighbourhood. "force": true skips both.
     """
     request_start = time.time()
     rec_logger.info("[STORY_MAP] Incoming analysis request")
@@ -3431,149 +3655,94 @@ def analyze_story_map():
             }), 400
         
         rec_logger.info(f"[STORY_MAP] Analyzing {len(nodes)} nodes, {len(links)} links")
-        
-        # Prepare data for AI
-        analysis_context = {
-            'node_count': len(nodes),
-            'link_count': len(links),
-            'nodes': [
-                {
-                    'id': node.get('id'),
-                    'label': node.get('label'),
-                    'group': node.get('group'),
-                    'aliases': node.get('aliases', ''),
-                    'level': node.get('level', 1),
-                    'note': node.get('note', '')
-                }
-                for node in nodes
-            ],
-            'links': [
-                {
-                    'source': link.get('source'),
-                    'target': link.get('target'),
-                    'type': link.get('type'),
-                    'context': link.get('context', '')
-                }
-                for link in links
-            ],
-            'user_genre': genre,
-            'user_context': context
-        }
-        
-        # Build prompt
-        user_message = f"""Analyze this story map structure.
 
-GRAPH DATA:
-{json.dumps(analysis_context, indent=2)}
+        fingerprint = story_map_analysis.fingerprint(nodes, links, genre, context)
+        previous = None if data.get('force') else _load_story_map_analysis(user_id)
+        if previous and previous['fingerprint'].get('graph') == fingerprint['graph']:
+            analysis = previous['analysis']
+            analysis['cached'] = True
+            analysis['processing_time_ms'] = int((time.time() - request_start) * 1000)
+            rec_logger.info(f"[STORY_MAP] Graph unchanged ({fingerprint['graph'][:12]}), returning stored analysis")
+            _log_story_map_run(user_id, analysis, nodes, links, analysis['processing_time_ms'], cached=True)
+            return jsonify(analysis), 200
+
+        # Deterministic checks run locally; the model gets the results as facts
+        pre_start = time.time()
+        pre_analysis = story_map_analysis.analyze(nodes, links)
+        observe_phase("story_map.preanalysis", time.time() - pre_start)
+        rec_logger.info(
+            f"[STORY_MAP] Pre-analysis: {len(pre_analysis['duplicates'])} duplicate sets, "
+            f"{len(pre_analysis['components'])} components, {len(pre_analysis['isolated'])} isolated "
+            f"in {time.time() - pre_start:.3f}s"
+        )
 
-Provide comprehensive analysis including:
-1. DUPLICATE DETECTION (highest priority)
-2. Structural coherence
-3. Genre pattern analysis (if genre provided)
-4. Narrative consistency
-5. Relationship diversity
-6. Character centrality
+        # Small edits since the last analysis: only the changed neighbourhood goes to the model
+        affected = None
+        if previous:
+            delta = story_map_analysis.diff(previous['fingerprint'], fingerprint)
+            if not delta['settings_changed']:
+                affected = story_map_analysis.neighbourhood(delta, nodes, links, pre_analysis)
+                rec_logger.info(
+                    f"[STORY_MAP] Diff: +{len(delta['added'])} -{len(delta['removed'])} "
+                    f"~{len(delta['changed'])} nodes, {delta['links_changed']} links; "
+                    f"{len(affected)} nodes affected"
+                )
+                if (len(affected) > STORY_MAP_PARTITION_NODES
+                        or len(affected) > len(nodes) * story_map_analysis.STORY_MAP_INCREMENTAL_MAX_SHARE):
+                    affected = None
+
+        sections = None
+        if affected is None and (len(nodes) > STORY_MAP_PARTITION_NODES or data.get('partition')):
+            sections = story_map_analysis.partition(nodes, links, pre_analysis)
 
-IMPORTANT: Return ONLY valid JSON. Ensure all strings are properly escaped and quoted.
-Return analysis in the specified JSON format."""
-        
-        rec_logger.info("[STORY_MAP] Calling DeepSeek")
-        
-        # Call DeepSeek with increased max_tokens to prevent truncation
         try:
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": STORY_MAP_ANALYSIS_PROMPT},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format={'type': 'json_object'},
-                stream=False,
-                timeout=90,
-                temperature=0.3,  # Lower temperature for more consistent analysis
-                max_tokens=8000  # Increased to handle large story maps
-            )
-            
-            rec_logger.info("[STORY_MAP] DeepSeek response received")
-            
-        except openai.APITimeoutError:
-            rec_logger.error("[STORY_MAP] DeepSeek timeout")
-            return jsonify({
-                'error': 'Analysis timeout',
-                'details': 'Analysis took too long. Try analyzing a smaller section of your map.'
-            }), 504
-        
-        except Exception as api_err:
-            rec_logger.error(f"[STORY_MAP] DeepSeek API error: {api_err}")
-            return jsonify({
-                'error': 'AI service error',
-                'details': str(api_err)
-            }), 500
-        
-        # Parse response
-        try:
-            result_text = response.choices[0].message.content.strip()
-            
-            # Log the raw response for debugging
-            rec_logger.debug(f"[STORY_MAP] Raw AI response length: {len(result_text)} chars")
-            
-            # Check if response was truncated
-            if response.choices[0].finish_reason == 'length':
-                rec_logger.error("[STORY_MAP] Response truncated - max_tokens too small")
-                return jsonify({
-                    'error': 'Analysis incomplete',
-                    'details': 'Story map too large for analysis. Try analyzing a smaller section.'
-                }), 413
-            
-            # Clean markdown code blocks if present
-            if result_text.startswith('```'):
-                result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
-                if result_text.endswith('```'):
-                    result_text = result_text[:-3].strip()
-            
-            # Try to parse JSON
-            analysis = json.loads(result_text)
-            rec_logger.info("[STORY_MAP] Response parsed successfully")
-            
-            # Validate response structure
-            required_fields = ['overall_health', 'overall_score', 'summary', 'issues']
-            if not all(field in analysis for field in required_fields):
-                rec_logger.error(f"[STORY_MAP] Missing required fields in AI response")
-                return jsonify({
-                    'error': 'Invalid AI response',
-                    'details': 'AI response missing required fields'
-                }), 500
-            
-        except json.JSONDecodeError as parse_err:
-            rec_logger.error(f"[STORY_MAP] JSON parse error: {parse_err}")
-            rec_logger.error(f"[STORY_MAP] Problematic response (first 500 chars): {result_text[:500]}")
-            rec_logger.error(f"[STORY_MAP] Problematic response (last 500 chars): {result_text[-500:]}")
-            
-            # Try to salvage partial response by fixing common issues
-            try:
-                # Remove any trailing incomplete content
-                last_brace = result_text.rfind('}')
-                if last_brace > 0:
-                    truncated = result_text[:last_brace + 1]
-                    analysis = json.loads(truncated)
-                    rec_logger.info("[STORY_MAP] Recovered partial response")
-                else:
-                    raise parse_err
-            except:
-                return jsonify({
-                    'error': 'Failed to parse AI response',
-                    'details': f'AI returned invalid JSON: {str(parse_err)}'
-                }), 500
-        
+            if affected is not None:
+                analysis = _reanalyze_story_map(
+                    nodes, links, pre_analysis, previous['analysis'], affected, delta['removed'], genre, context
+                )
+                analysis['incremental'] = {
+                    'reanalyzed_nodes': len(affected),
+                    'removed_nodes': len(delta['removed']),
+                }
+            elif sections and len(sections) > 1:
+                analysis = _analyze_story_map_sections(nodes, links, pre_analysis, sections, genre, context)
+            else:
+                user_message = _story_map_user_message(nodes, links, pre_analysis, genre, context)
+                try:
+                    analysis = _request_story_map_analysis(user_message)
+                except ModelCallError as err:
+                    if not err.truncated:
+                        raise
+                    # Too much output for one call: retry in halves rather than failing
+                    rec_logger.warning("[STORY_MAP] Response truncated, retrying as partitioned analysis")
+                    sections = story_map_analysis.partition(
+                        nodes, links, pre_analysis,
+                        max_nodes=max(2, min(STORY_MAP_PARTITION_NODES, (len(nodes) + 1) // 2))
+                    )
+                    if len(sections) < 2:
+                        raise
+                    analysis = _analyze_story_map_sections(nodes, links, pre_analysis, sections, genre, context)
+        except ModelCallError as err:
+            return jsonify({'error': err.error, 'details': err.details}), err.status
+
         # Enrich issues with full node data for frontend
+        nodes_by_id = {n.get('id'): n for n in nodes}
         for issue in analysis.get('issues', []):
             if 'affected_entities' in issue:
                 issue['affected_nodes'] = [
-                    next((n for n in nodes if n['id'] == entity_id), None)
+                    nodes_by_id[entity_id]
                     for entity_id in issue['affected_entities']
+                    if entity_id in nodes_by_id
                 ]
-                # Filter out None values
-                issue['affected_nodes'] = [n for n in issue['affected_nodes'] if n is not None]
+
+        analysis['graph_metrics'] = {
+            'components': len(pre_analysis['components']),
+            'largest_component': len(pre_analysis['components'][0]) if pre_analysis['components'] else 0,
+            'isolated_nodes': pre_analysis['isolated'],
+            'degree': pre_analysis['degree'],
+            'hubs': pre_analysis['hubs'],
+            'duplicate_candidates': pre_analysis['duplicates'],
+        }
         
         # Add metadata
         analysis['timestamp'] = int(time.time() * 1000)
@@ -3604,24 +3773,16 @@ Return analysis in the specified JSON format."""
             f"L:{analysis['severity_counts']['low']})"
         )
 
+        # A result with failed sections is partial: don't replay it for this graph
+        if analysis.get('failed_partitions'):
+            rec_logger.warning("[STORY_MAP] Partial analysis not stored")
+        else:
+            _save_story_map_analysis(user_id, fingerprint, analysis)
+
         # ============================================
         # ANALYTICS LOGGING
         # ============================================
-        try:
-            from utils.analytics.story_map_logger import log_story_map_analysis as _log_sm_analysis
-            _log_sm_analysis(
-                user_id=user_id,
-                overall_score=analysis.get('overall_score', 0),
-                overall_health=analysis.get('overall_health', 'unknown'),
-                node_count=len(nodes),
-                link_count=len(links),
-                issues_found=analysis.get('issues', []),
-                genre_inferred=analysis.get('genre_insights', {}).get('detected_genre') if isinstance(analysis.get('genre_insights'), dict) else None,
-                processing_time_ms=int((time.time() - request_start) * 1000)
-            )
-            rec_logger.info("[STORY_MAP] Analysis metrics logged")
-        except Exception as log_err:
-            rec_logger.warning(f"[STORY_MAP] Failed to log analysis metrics: {log_err}")
+        _log_story_map_run(user_id, analysis, nodes, links, int((time.time() - request_start) * 1000))
 
         # Store longitudinal score for improvement tracking (same pattern as timeline coherence)
         try:
@@ -3656,10 +3817,120 @@ Return analysis in the specified JSON format."""
         }), 500
     
 
+# ============================================
+# TIMELINE COHERENCE
+# ============================================
+
+timeline_results_cache = make_cache("timeline", 500, timeline_checks.TIMELINE_CACHE_TTL)
+# Per-check fields, set on each response but never stored in the cache
+_TIMELINE_CHECK_FIELDS = ('scoreChange', 'checkNumber', 'previousScore', 'cached')
+
+
+def _record_timeline_check(user_id, result, event_count):
+    """Log a coherence check and add its score-change fields to the response."""
+    try:
+        check_stats = log_timeline_coherence_check(
+            user_id=user_id,
+            overall_score=result.get('overallScore', 0),
+            event_count=event_count,
+            issues_found=result.get('issues', []),
+            genre_used=result.get('genreInferred'),
+        )
+        # Surface score-change delta to the frontend
+        result['scoreChange']   = check_stats.get('scoreChange')
+        result['checkNumber']   = check_stats.get('checkNumber')
+        result['previousScore'] = check_stats.get('previousScore')
+    except Exception as log_err:
+        rec_logger.warning(f"[TIMELINE_COHERENCE] Analytics log failed: {log_err}")
+
+
+def _timeline_story_nodes(user_id, data):
+    """Story-map nodes for the character checks: from the request, else the user's entity index."""
+    if data.get('nodes') is not None:
+        return data.get('nodes') or []
+    try:
+        return list(entity_index.for_user(user_id).all("nodes").values())
+    except Exception as index_err:
+        rec_logger.warning(f"[TIMELINE_COHERENCE] Story map nodes unavailable: {index_err}")
+        return []
+
+
+def _request_timeline_coherence(user_message):
+    """Call DeepSeek for one coherence review; raises ModelCallError on failure."""
+    rec_logger.info("[TIMELINE_COHERENCE] Calling DeepSeek")
+
+    # Call DeepSeek (static system prompt, dynamic data in user message)
+    try:
+        response = cached_completion(
+            client, "timeline.coherence",
+            model="deepseek-chat",
+            messages=[
+                {"role": "system", "content": TIMELINE_COHERENCE_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            response_format={'type': 'json_object'},
+            stream=False,
+            timeout=60,
+            temperature=0.5
+        )
+
+        rec_logger.info("[TIMELINE_COHERENCE] DeepSeek response received")
+
+    except openai.APITimeoutError:
+        rec_logger.error("[TIMELINE_COHERENCE] DeepSeek timeout")
+        raise ModelCallError(504, 'Analysis timeout', 'Timeline analysis took too long')
+
+    except Exception as api_err:
+        rec_logger.error(f"[TIMELINE_COHERENCE] DeepSeek API error: {api_err}")
+        raise ModelCallError(500, 'AI service error', str(api_err))
+
+    # Parse response
+    try:
+        result_text = response.choices[0].message.content.strip()
+
+        # Clean markdown code blocks if present
+        if result_text.startswith('```'):
+            result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
+
+        result = json.loads(result_text)
+        rec_logger.info("[TIMELINE_COHERENCE] Response parsed successfully")
+        return result
+
+    except json.JSONDecodeError as parse_err:
+        rec_logger.error(f"[TIMELINE_COHERENCE] JSON parse error: {parse_err}")
+        raise ModelCallError(
+            500, 'Failed to parse AI response', 'AI returned invalid JSON format'
+        )
+
+
+def _timeline_coherence_message(summaries, findings, total_events, window=None):
+    scope = ""
+    if window:
+        start, end = window
+        scope = (
+            f"\nThis is events {start + 1}-{end} of {total_events}; the rest of the timeline is reviewed "
+            f"separately. Report only issues visible in these events.\n"
+        )
+    return f"""Analyze this story timeline for coherence.
+{scope}
+RULE-BASED FINDINGS (already verified; confirm, explain and prioritise them, don't re-derive them):
+{timeline_checks.format_findings(findings)}
+
+EVENTS ({total_events} total; id | position | stage | [MAIN |] [date |] title: description):
+{summaries}
+
+Provide feedback in the specified JSON format. Refer to events by the ids above."""
+
+
 @app.route('/api/timeline/coherence', methods=['POST'])
 def timeline_coherence():
     """
     AI as Feedback Assistant: Check entire timeline for coherence issues.
+
+    Rule-based checks (utils/timeline_checks.py) run first and their
+    findings go to the model with compact event summaries. Results are
+    cached by timeline content ("force": true bypasses the cache); long
+    timelines are reviewed in overlapping windows concurrently.
     """
     request_start = time.time()
     rec_logger.info("[TIMELINE_COHERENCE] Incoming request")
@@ -3682,106 +3953,57 @@ def timeline_coherence():
             }), 400
         
         rec_logger.info(f"[TIMELINE_COHERENCE] Analyzing {len(timeline)} events")
-        
-        # Prepare timeline data as separate context
-        timeline_data = {
-            'total_events': len(timeline),
-            'events': [
-                {
-                    'order': i + 1,
-                    'title': e.get('title', 'Untitled'),
-                    'description': e.get('description', '')[:200],
-                    'stage': e.get('stage', 'unknown'),
-                    'isMainEvent': e.get('isMainEvent', False),
-                    'date': e.get('date', '')
-                }
-                for i, e in enumerate(timeline)
-            ]
-        }
-        
-        # Build user message with timeline data (like other endpoints)
-        user_message = f"""Analyze this story timeline for coherence.
 
-TIMELINE DATA:
-{json.dumps(timeline_data, indent=2)}
-
-Provide feedback in the specified JSON format."""
-        
-        rec_logger.info("[TIMELINE_COHERENCE] Calling DeepSeek")
-        
-        # Call DeepSeek (static system prompt, dynamic data in user message)
-        try:
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": TIMELINE_COHERENCE_PROMPT},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format={'type': 'json_object'},
-                stream=False,
-                timeout=60,
-                temperature=0.5
-            )
-            
-            rec_logger.info("[TIMELINE_COHERENCE] DeepSeek response received")
-            
-        except openai.APITimeoutError:
-            rec_logger.error("[TIMELINE_COHERENCE] DeepSeek timeout")
-            return jsonify({
-                'error': 'Analysis timeout',
-                'details': 'Timeline analysis took too long'
-            }), 504
-        
-        except Exception as api_err:
-            rec_logger.error(f"[TIMELINE_COHERENCE] DeepSeek API error: {api_err}")
-            return jsonify({
-                'error': 'AI service error',
-                'details': str(api_err)
-            }), 500
-        
-        # Parse response
+        # Rule-based checks run first; the model gets their findings and one-line event summaries
+        checks_start = time.time()
+        nodes = _timeline_story_nodes(user_id, data)
+        cache_key = timeline_checks.content_hash(
+            user_id, timeline, sorted(timeline_checks.character_names(nodes)), data.get('genre')
+        )
+        cached = None if data.get('force') else timeline_results_cache.get(cache_key)
+        if cached:
+            rec_logger.info(f"[TIMELINE_COHERENCE] Timeline unchanged ({cache_key[:12]}), returning cached result")
+            result = dict(cached, cached=True)
+            _record_timeline_check(user_id, result, len(timeline))
+            return jsonify(result), 200
+
+        findings = timeline_checks.check(timeline, nodes)
+        observe_phase("timeline.rule_checks", time.time() - checks_start)
+        rec_logger.info(f"[TIMELINE_COHERENCE] {len(findings)} rule-based findings in {time.time() - checks_start:.3f}s")
+
+        ranges = timeline_checks.windows(timeline)
         try:
-            result_text = response.choices[0].message.content.strip()
-            
-            # Clean markdown code blocks if present
-            if result_text.startswith('```'):
-                result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
-            
-            result = json.loads(result_text)
-            rec_logger.info("[TIMELINE_COHERENCE] Response parsed successfully")
-            
-        except json.JSONDecodeError as parse_err:
-            rec_logger.error(f"[TIMELINE_COHERENCE] JSON parse error: {parse_err}")
-            return jsonify({
-                'error': 'Failed to parse AI response',
-                'details': 'AI returned invalid JSON format'
-            }), 500
-        
+            if len(ranges) == 1:
+                result = _request_timeline_coherence(_timeline_coherence_message(
+                    timeline_checks.summarize_events(timeline), findings, len(timeline)
+                ))
+            else:
+                # Long timelines: overlapping windows reviewed concurrently
+                rec_logger.info(f"[TIMELINE_COHERENCE] Reviewing {len(ranges)} windows: {ranges}")
+                turn = TurnExecutor("TIMELINE_COHERENCE", rec_logger, model_calls=True)
+                for i, (start, end) in enumerate(ranges):
+                    window_ids = {timeline_checks.event_id(e, start + k) for k, e in enumerate(timeline[start:end])}
+                    window_findings = [f for f in findings if not f['events'] or window_ids & set(f['events'])]
+                    turn.submit(f"window_{i}", _request_timeline_coherence, _timeline_coherence_message(
+                        timeline_checks.summarize_events(timeline[start:end], start=start),
+                        window_findings, len(timeline), window=(start, end)
+                    ))
+                results = [turn.result(f"window_{i}") for i in range(len(ranges))]
+                turn.log_timings()
+                result = timeline_checks.merge_windows(results, ranges)
+        except ModelCallError as err:
+            return jsonify({'error': err.error, 'details': err.details}), err.status
+
+        result['issues'] = timeline_checks.merge_issues(result.get('issues') or [], findings)
+        result['ruleFindings'] = len(findings)
+
         # Add metadata
         result['eventCount'] = len(timeline)
         result['timestamp'] = int(time.time() * 1000)
         
-        # Add stage distribution
-        stage_distribution = {}
-        for event in timeline:
-            stage = event.get('stage', 'unknown')
-            stage_distribution[stage] = stage_distribution.get(stage, 0) + 1
-        result['stageDistribution'] = stage_distribution
+        result['stageDistribution'] = timeline_checks.stage_distribution(timeline)
 
-        try:
-            check_stats = log_timeline_coherence_check(
-                user_id=user_id,
-                overall_score=result.get('overallScore', 0),
-                event_count=len(timeline),
-                issues_found=result.get('issues', []),
-                genre_used=result.get('genreInferred'),
-            )
-            # Surface score-change delta to the frontend
-            result['scoreChange']   = check_stats.get('scoreChange')
-            result['checkNumber']   = check_stats.get('checkNumber')
-            result['previousScore'] = check_stats.get('previousScore')
-        except Exception as log_err:
-            rec_logger.warning(f"[TIMELINE_COHERENCE] Analytics log failed: {log_err}")
+        _record_timeline_check(user_id, result, len(timeline))
 
         
         total_time = time.time() - request_start
@@ -3801,6 +4023,9 @@ Provide feedback in the specified JSON format."""
         except Exception as log_err:
             rec_logger.warning(f"[TIMELINE_COHERENCE] Analytics logging failed: {log_err}")
 
+        timeline_results_cache[cache_key] = {
+            k: v for k, v in result.items() if k not in _TIMELINE_CHECK_FIELDS
+        }
         return jsonify(result), 200
         
     except Exception as e:
@@ -3815,6 +4040,8 @@ Provide feedback in the specified JSON format."""
 def timeline_reflect():
     """
     AI as Reflective Guide: Generate reflective questions about a timeline event.
+    Rule-based findings that involve the event are passed along, and the
+    result is cached by the event's context.
     """
     request_start = time.time()
     rec_logger.info("[TIMELINE_REFLECT] Incoming request")
@@ -3873,6 +4100,22 @@ def timeline_reflect():
             } if next_event else None,
             'stage_event_count': sum(1 for e in timeline if e['stage'] == event['stage'])
         }
+
+        # Rule-based findings that involve this event give the questions something concrete to target
+        event_key = str(event.get('id'))
+        event_findings = [
+            f['description'] for f in timeline_checks.check(timeline)
+            if event_key in f['events']
+        ]
+        if event_findings:
+            reflection_context['timeline_checks'] = event_findings
+
+        # Same event, neighbours and findings as a previous click: reuse that reflection
+        cache_key = "reflect:" + timeline_checks.content_hash(user_id, reflection_context)
+        cached = timeline_results_cache.get(cache_key)
+        if cached:
+            rec_logger.info("[TIMELINE_REFLECT] Context unchanged, returning cached reflection")
+            return jsonify(dict(cached, cached=True)), 200
         
         # Build user message (like other endpoints)
         user_message = f"""The writer just {reflection_context['action']} an event in their timeline.
@@ -3886,7 +4129,8 @@ Generate reflective questions and suggestions in the specified JSON format."""
         
         # Call DeepSeek
         try:
-            response = client.chat.completions.create(
+            response = cached_completion(
+                client, "timeline.reflect",
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": TIMELINE_REFLECTION_PROMPT},
@@ -3939,6 +4183,8 @@ Generate reflective questions and suggestions in the specified JSON format."""
         result['context'] = context
         result['timestamp'] = int(time.time() * 1000)
         
+        timeline_results_cache[cache_key] = result
+
         total_time = time.time() - request_start
         rec_logger.info(f"[TIMELINE_REFLECT] Completed in {total_time:.2f}s")
         
@@ -3967,6 +4213,145 @@ Generate reflective questions and suggestions in the specified JSON format."""
             'details': str(e)
         }), 500
     
+# ============================================
+# DRAFT FEEDBACK
+# ============================================
+
+draft_chunk_cache = make_cache("draft_chunks", 5000, chunked.DRAFT_CHUNK_CACHE_TTL)
+
+
+def _draft_story_context(user_id):
+    """Compact story-profile summary for the section reviews, from the user's entity index."""
+    try:
+        index = entity_index.for_user(user_id)
+        nodes = list(index.all("nodes").values())
+        events = list(index.all("events").values())
+    except Exception as index_err:
+        rec_logger.warning(f"[FEEDBACK] Story profile unavailable: {index_err}")
+        nodes, events = [], []
+    return chunked.context_summary(nodes, events)
+
+
+def _review_draft_section(section, total, context):
+    """Review one draft section; raises ValueError if the reply isn't a usable review."""
+    response = cached_completion(
+        client, "draft_feedback.section",
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": FEEDBACK_CHUNK_PROMPT},
+            {"role": "user", "content": chunked.section_message(section, total, context)}
+        ],
+        response_format={'type': 'json_object'},
+        stream=False,
+        timeout=60,
+        temperature=0.5
+    )
+    review = chunked.parse_review(response.choices[0].message.content)
+    if review is None:
+        raise ValueError(f"unusable review for section {section['index'] + 1}")
+    return review
+
+
+def _synthesize_draft_feedback(story_id, reviews, sections, context_used):
+    """Final feedback from the section reviews; None if the reply doesn't validate."""
+    response = cached_completion(
+        client, "draft_feedback.synthesis",
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": FEEDBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": chunked.synthesis_message(story_id, reviews, sections, context_used)}
+        ],
+        response_format={'type': 'json_object'},
+        stream=False,
+        timeout=60,
+        temperature=0.7
+    )
+    try:
+        feedback = json.loads(response.choices[0].message.content)
+    except json.JSONDecodeError:
+        return None
+    # The system prompt describes a respond action; accept either shape
+    if isinstance(feedback, dict) and 'overallScore' not in feedback and isinstance(feedback.get('data'), dict):
+        feedback = feedback['data']
+    if isinstance(feedback, dict) and _validate_feedback_structure(feedback):
+        return feedback
+    return None
+
+
+def _chunked_draft_feedback(user_id, story_id, draft_text, force=False):
+    """
+    Feedback for a long draft: sections whose text hasn't changed since the
+    last request (against the same story profile) reuse their cached reviews,
+    the rest are reviewed concurrently, and one more call combines the reviews.
+
+    Returns (feedback, section summaries, DeepSeek calls made).
+    """
+    sections = chunked.split_draft(draft_text)
+    context = _draft_story_context(user_id)
+    keys = [chunked.cache_key(user_id, story_id, section, context) for section in sections]
+    reviews = [None if force else draft_chunk_cache.get(key) for key in keys]
+    stale = [i for i, review in enumerate(reviews) if review is None]
+    rec_logger.info(f"[FEEDBACK] Chunked: {len(sections)} sections, {len(stale)} to review")
+
+    calls = 0
+    if stale:
+        turn = TurnExecutor("FEEDBACK", rec_logger, model_calls=True)
+        for i in stale:
+            turn.submit(f"section_{i}", _review_draft_section, sections[i], len(sections), context)
+        for i in stale:
+            calls += 1
+            try:
+                reviews[i] = turn.result(f"section_{i}")
+                draft_chunk_cache[keys[i]] = reviews[i]
+            except Exception as section_err:
+                rec_logger.warning(f"[FEEDBACK] Section {i + 1} review failed: {section_err}")
+        turn.log_timings()
+
+    reviewed = [(section, review) for section, review in zip(sections, reviews) if review is not None]
+    if not reviewed:
+        raise ValueError("no section could be reviewed")
+    used_sections = [section for section, _ in reviewed]
+    used_reviews = [review for _, review in reviewed]
+    context_used = chunked.total_context_used(used_reviews)
+
+    # Same set of reviews as last time: reuse the combined feedback too
+    feedback_key = None
+    if len(reviewed) == len(sections):
+        feedback_key = f"{user_id}:{story_id}:draft:{chunked.context_hash(context)}:" + hashlib.sha1(
+            "".join(section['hash'] for section in sections).encode("utf-8")
+        ).hexdigest()
+        feedback = None if force else draft_chunk_cache.get(feedback_key)
+        if feedback is not None:
+            rec_logger.info("[FEEDBACK] Chunked: draft unchanged, reusing combined feedback")
+            return feedback, _draft_section_summaries(sections, stale), calls
+
+    calls += 1
+    try:
+        feedback = _synthesize_draft_feedback(story_id, used_reviews, used_sections, context_used)
+    except Exception as synth_err:
+        rec_logger.warning(f"[FEEDBACK] Synthesis failed: {synth_err}")
+        feedback = None
+    if feedback is None:
+        rec_logger.warning("[FEEDBACK] Using aggregated section scores")
+        feedback = chunked.aggregate(used_reviews, used_sections, context_used)
+    if feedback_key:
+        draft_chunk_cache[feedback_key] = feedback
+    return feedback, _draft_section_summaries(sections, stale, reviews), calls
+
+
+def _draft_section_summaries(sections, stale, reviews=None):
+    """Per-section metadata for the response (which sections were re-reviewed)."""
+    stale = set(stale)
+    return [{
+        'index': section['index'],
+        'words': section['words'],
+        'hash': section['hash'][:12],
+        'fresh': section['index'] in stale,
+        'reviewed': reviews is None or reviews[section['index']] is not None,
+        'preview': section['text'][:80],
+    } for section in sections]
+
+
 @app.route('/api/stories/<story_id>/feedback', methods=['POST'])
 def get_draft_feedback(story_id):
     """
@@ -4029,13 +4414,34 @@ Start by requesting relevant context based on what you see in the draft."""
         max_iterations = 5  # Prevent infinite loops
         iteration = 0
         final_feedback = None
-        
+        extra = {}
+
+        # Long drafts: section-by-section review instead of the tool loop below
+        mode = data.get('mode')
+        if mode == 'chunked' or (mode != 'single' and word_count >= chunked.DRAFT_CHUNKED_MIN_WORDS):
+            try:
+                final_feedback, sections, iteration = _chunked_draft_feedback(
+                    user_id, story_id, draft_text, force=bool(data.get('force'))
+                )
+            except ValueError as chunk_err:
+                rec_logger.error(f"[FEEDBACK] Chunked analysis failed: {chunk_err}")
+                return jsonify({
+                    'error': 'Analysis incomplete',
+                    'details': 'AI did not complete feedback analysis'
+                }), 500
+            extra = {
+                'mode': 'chunked',
+                'sections': sections,
+                'freshSections': sum(1 for section in sections if section['fresh']),
+            }
+
         while iteration < max_iterations and not final_feedback:
             iteration += 1
             rec_logger.info(f"[FEEDBACK] Iteration {iteration}")
             
             # Call DeepSeek
-            response = client.chat.completions.create(
+            response = cached_completion(
+                client, "draft_feedback",
                 model="deepseek-chat",
                 messages=messages,
                 stream=False,
@@ -4224,7 +4630,8 @@ Start by requesting relevant context based on what you see in the draft."""
             'processingTime': int(total_time * 1000),
             'iterations': iteration,
             'storyId': story_id,
-            'draftWordCount': word_count
+            'draftWordCount': word_count,
+            **extra
         }), 200
         
     except openai.APITimeoutError:
@@ -4408,6 +4815,91 @@ def debug_book_sources():
         return jsonify({'error': str(e)}), 500
     
 
+# ============================================
+# MENTOR TEXT ANALYSIS
+# ============================================
+
+mentor_text_cache = make_cache("mentor_text", 1000, mentor_text_store.MENTOR_TEXT_STORE_TTL)
+
+
+def _load_mentor_text_analysis(store_key):
+    """Stored (analysis, validation) for the key, from the local cache or Firebase; None on a miss."""
+    record = mentor_text_cache.get(store_key)
+    if record is None:
+        try:
+            record = db.reference(f"{mentor_text_store.MENTOR_TEXT_STORE_PATH}/{store_key}").get()
+        except Exception as load_err:
+            rec_logger.warning(f"[MODELLING] Failed to load stored analysis: {load_err}")
+            return None
+        if record:
+            mentor_text_cache[store_key] = record
+    # Decoded per request, so callers can add metadata without touching the shared copy
+    return mentor_text_store.from_record(record, int(time.time() * 1000))
+
+
+def _store_mentor_text_analysis(store_key, result, validation):
+    """Share a validated analysis with later requests for the same excerpt (non-blocking)."""
+    record = mentor_text_store.to_record(result, validation, int(time.time() * 1000))
+    mentor_text_cache[store_key] = record
+
+    def save():
+        try:
+            db.reference(f"{mentor_text_store.MENTOR_TEXT_STORE_PATH}/{store_key}").set(record)
+        except Exception as save_err:
+            rec_logger.warning(f"[MODELLING] Failed to store shared analysis: {save_err}")
+
+    background.submit("bookkeeping", save, task_name="mentor_text_store")
+
+
+def _request_mentor_text_analysis(user_message):
+    """Call DeepSeek for one analysis; raises ModelCallError on failure."""
+    rec_logger.info("[MODELLING] Calling DeepSeek")
+
+    # Call DeepSeek (existing code)
+    try:
+        response = cached_completion(
+            client, "mentor_text.analyze",
+            model="deepseek-chat",
+            messages=[
+                {"role": "system", "content": MENTOR_TEXT_ANALYSIS_SYSTEM_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            response_format={'type': 'json_object'},
+            stream=False,
+            timeout=60,
+            temperature=0.4
+        )
+
+        rec_logger.info("[MODELLING] DeepSeek response received")
+
+    except openai.APITimeoutError:
+        rec_logger.error("[MODELLING] DeepSeek timeout")
+        raise ModelCallError(504, 'Analysis timeout', 'Mentor text analysis took too long.')
+
+    except Exception as api_err:
+        rec_logger.error(f"[MODELLING] DeepSeek API error: {api_err}")
+        raise ModelCallError(500, 'AI service error', str(api_err))
+
+    # Parse response (existing code)
+    try:
+        result_text = response.choices[0].message.content.strip()
+
+        if result_text.startswith('```'):
+            result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
+            if result_text.endswith('```'):
+                result_text = result_text[:-3].strip()
+
+        result = json.loads(result_text)
+        rec_logger.info("[MODELLING] Response parsed successfully")
+        return result
+
+    except json.JSONDecodeError as parse_err:
+        rec_logger.error(f"[MODELLING] JSON parse error: {parse_err}")
+        raise ModelCallError(
+            500, 'Failed to parse AI response', 'AI returned invalid JSON format'
+        )
+
+
 @app.route('/api/mentor-text/analyze', methods=['POST'])
 def analyze_mentor_text():
     """
@@ -4445,69 +4937,30 @@ def analyze_mentor_text():
         
         rec_logger.info(f"[MODELLING] Analyzing {len(excerpt)} char excerpt")
         
-        # Build user message (existing code)
-        user_message = build_mentor_analysis_user_prompt(excerpt, genre, focus)
-        
-        rec_logger.info("[MODELLING] Calling DeepSeek")
-        
-        # Call DeepSeek (existing code)
-        try:
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": MENTOR_TEXT_ANALYSIS_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format={'type': 'json_object'},
-                stream=False,
-                timeout=60,
-                temperature=0.4
-            )
-            
-            rec_logger.info("[MODELLING] DeepSeek response received")
-            
-        except openai.APITimeoutError:
-            rec_logger.error("[MODELLING] DeepSeek timeout")
-            return jsonify({
-                'error': 'Analysis timeout',
-                'details': 'Mentor text analysis took too long.'
-            }), 504
-        
-        except Exception as api_err:
-            rec_logger.error(f"[MODELLING] DeepSeek API error: {api_err}")
-            return jsonify({
-                'error': 'AI service error',
-                'details': str(api_err)
-            }), 500
-        
-        # Parse response (existing code)
-        try:
-            result_text = response.choices[0].message.content.strip()
-            
-            if result_text.startswith('```'):
-                result_text = re.sub(r'```(?:json)?\s*', '', result_text).strip()
-                if result_text.endswith('```'):
-                    result_text = result_text[:-3].strip()
-            
-            result = json.loads(result_text)
-            rec_logger.info("[MODELLING] Response parsed successfully")
-            
-        except json.JSONDecodeError as parse_err:
-            rec_logger.error(f"[MODELLING] JSON parse error: {parse_err}")
-            return jsonify({
-                'error': 'Failed to parse AI response',
-                'details': 'AI returned invalid JSON format'
-            }), 500
-        
-        # Validate output (existing code)
-        validation = validate_analysis_output(result, excerpt)
-        
-        if not validation['passesValidation']:
-            rec_logger.warning(f"[MODELLING] Validation issues: {validation['issues']}")
-            result['_validationWarning'] = {
-                'issues': validation['issues'],
-                'warnings': validation['warnings']
-            }
+        # Same excerpt, genre and focus analyzed before (by anyone): reuse it
+        store_key = mentor_text_store.analysis_key(excerpt, genre, focus, MENTOR_TEXT_ANALYSIS_SYSTEM_PROMPT)
+        stored = None if data.get('force') else _load_mentor_text_analysis(store_key)
+
+        if stored:
+            result, validation = stored
+            rec_logger.info(f"[MODELLING] Reusing stored analysis {store_key[:12]}")
+        else:
+            try:
+                result = _request_mentor_text_analysis(build_mentor_analysis_user_prompt(excerpt, genre, focus))
+            except ModelCallError as err:
+                return jsonify({'error': err.error, 'details': err.details}), err.status
+
+            # Validate output (existing code)
+            validation = validate_analysis_output(result, excerpt)
+
+            if validation['passesValidation']:
+                _store_mentor_text_analysis(store_key, result, validation)
+            else:
+                rec_logger.warning(f"[MODELLING] Validation issues: {validation['issues']}")
+                result['_validationWarning'] = {
+                    'issues': validation['issues'],
+                    'warnings': validation['warnings']
+                }
         
         # Calculate processing time
         processing_time = int((time.time() - request_start) * 1000)
@@ -4541,7 +4994,8 @@ def analyze_mentor_text():
                 'passesValidation': validation['passesValidation'],
                 'teachingPointCount': validation['teachingPointCount']
             },
-            'processingTime': processing_time
+            'processingTime': processing_time,
+            'cached': bool(stored)
         }
 
         # Save to library (non-blocking)
@@ -4566,7 +5020,7 @@ def analyze_mentor_text():
             except Exception as save_error:
                 rec_logger.warning(f"[MODELLING] Failed to save: {save_error}")
         
-        threading.Thread(target=save_to_library, daemon=True).start()
+        background.submit("bookkeeping", save_to_library, task_name="mentor_text_save")
         
         total_time = time.time() - request_start
         rec_logger.info(
@@ -4765,8 +5219,58 @@ def clear_mapping_cache():
     except Exception as e:
         rec_logger.exception(f"[CACHE] Failed to clear cache: {e}")
         return jsonify({'error': str(e)}), 500
-    
-    # ============================================
+
+
+@app.route('/api/debug/prompt-cache', methods=['GET'])
+def get_prompt_cache_metrics():
+    """Get DeepSeek prompt prefix cache hit rates per route."""
+    try:
+        return jsonify({
+            'status': 'ok',
+            'promptCache': get_prompt_cache_stats(),
+            'timestamp': int(time.time() * 1000)
+        }), 200
+    except Exception as e:
+        rec_logger.exception(f"[PROMPT_CACHE] Failed to get stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/debug/background', methods=['GET'])
+def debug_background():
+    """Background executor queue depths, shed counts and task latencies."""
+    return jsonify(dict(background.stats(), autoTitle=auto_titler.stats())), 200
+
+
+@app.route('/debug/logging', methods=['GET'])
+def debug_logging():
+    """Async log queue depth and per-logger DEBUG sampling drops."""
+    return jsonify(log_pipeline.stats()), 200
+
+
+@app.route('/debug/serving', methods=['GET'])
+def debug_serving():
+    """Serving mode and in-flight request counts for this worker (?reset=1 clears the peak)."""
+    if request.args.get('reset'):
+        serving_tracker.reset_peak()
+    return jsonify(serving_tracker.stats()), 200
+
+
+def debug_upstream_wait():
+    """
+    Load-test probe: holds the request for ?seconds= (max 30) the way a
+    DeepSeek or Google Books call would, without spending API quota.
+    Only registered with LOAD_TEST_PROBES=1, since each call ties up a worker.
+    """
+    seconds = min(float(request.args.get('seconds', 1)), 30.0)
+    time.sleep(seconds)
+    return jsonify({'slept': seconds, **serving_tracker.stats()}), 200
+
+
+if LOAD_TEST_PROBES:
+    app.add_url_rule('/debug/upstream-wait', view_func=debug_upstream_wait, methods=['GET'])
+
+
+# ============================================
 # TIMELINE FRONTEND LOG ENDPOINTS
 # ============================================
 
@@ -5534,6 +6038,11 @@ def export_study_data_csv():
 # ============================================
 # RUN SERVER
 # ============================================
+startup.mark("routes")
+startup.log(bs_logger)
+if SERVICE_WARMUP:
+    services.warm_up()
+
 if __name__ == "__main__":
     print(f"Starting AI Server on port {os.environ.get('PORT', 5000)}")
     print(f"   - Brainstorming: /chat/brainstorming")
@@ -5545,4 +6054,5 @@ if __name__ == "__main__":
     print(f"   - Book Recommendations: /api/book-recommendations")
     print(f"   - Story Extraction: /api/story-elements/extract")
     print(f"   - Mentor Text Analysis: /api/mentor-text/analyze")
+    install_sigterm_drain()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
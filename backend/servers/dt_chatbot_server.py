@@ -18,6 +18,7 @@ from firebase_admin import credentials, db
 
 from utils.chat.DTConversationFlowManager import DTConversationFlowManager
 from utils.chat.chat_utils import DEEPSEEK_API_KEY
+from utils.sse_hub import background_task_hub
 
 app = Flask(__name__)
 CORS(app)
@@ -1729,23 +1730,20 @@ def debug_cache_stats():
 
 @app.route("/stream/<user_id>")
 def stream_updates(user_id):
-    def event_stream():
-        q = queue.Queue()
-
-        # Listen to Firebase backgroundTasks updates
-        ref = db.reference(f"backgroundTasks/{user_id}")
-
-        listener = ref.listen(lambda event: q.put(event.data))
-
-        try:
-            while True:
-                data = q.get()
-                if data:
-                    yield f"data: {json.dumps(data)}\n\n"
-        except GeneratorExit:
-            listener.close()
-
-    return Response(event_stream(), mimetype="text/event-stream")
+    # One shared Firebase listener per user; keep-alives and idle disconnects in the hub
+    subscriber = background_task_hub.subscribe(user_id)
+    response = Response(
+        background_task_hub.stream(subscriber),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Also covers clients that disconnect before the first frame is sent
+    response.call_on_close(lambda: background_task_hub.unsubscribe(subscriber))
+    return response
+
+@app.route("/debug/streams", methods=["GET"])
+def debug_streams():
+    return jsonify(background_task_hub.stats()), 200
 
 # -------------------- RUN SERVER --------------------
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+"""
+gunicorn settings for the Flask servers.
+
+    gunicorn -c gunicorn.conf.py ai_server:app
+
+SERVING_MODE selects how a worker waits on DeepSeek, Google Books, Firebase
+and the Session API:
+  threads (default) - gthread workers, one OS thread per in-flight request
+                      (GUNICORN_THREADS per worker).
+  gevent            - gevent workers. The standard library is monkey-patched
+                      before the app is imported, so requests, httpx (OpenAI
+                      client) and firebase_admin block a greenlet instead of a
+                      thread, and each worker holds up to GEVENT_CONNECTIONS
+                      in-flight requests. httpcore imports trio when it is
+                      installed, and trio fails to import once gevent has
+                      removed select.epoll, so don't install trio alongside.
+"""
+
+import os
+
+SERVING_MODE = os.getenv("SERVING_MODE", "threads").lower()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+# LLM turns can take 30s+; don't kill workers mid-reply
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+if SERVING_MODE == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("GEVENT_CONNECTIONS", "1000"))
+    # Each worker must import the app after gevent has patched it
+    preload_app = False
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
@@ -185,4 +185,20 @@ EXAMPLE MINIMAL OUTPUT (for very early conversation):
 }}
 
 Remember: Quality over quantity. Better to have fewer elements with high confidence than many with low confidence.
-"""
\ No newline at end of file
+"""
+# Cache-friendly split of STORY_EXTRACTION_PROMPT: the instructions and schema
+# go in a static system message (identical on every call, so DeepSeek serves
+# them from its prefix cache) and only the conversation is sent per request.
+_STORY_EXTRACTION_CONVERSATION_BLOCK = "Conversation History:\n{conversation_text}\n\n"
+
+STORY_EXTRACTION_SYSTEM_PROMPT = (
+    STORY_EXTRACTION_PROMPT
+    .replace(_STORY_EXTRACTION_CONVERSATION_BLOCK, "The conversation to analyze is provided in the user message.\n\n")
+    .replace("{{", "{")
+    .replace("}}", "}")
+)
+
+
+def build_story_extraction_user_prompt(conversation_text: str) -> str:
+    """Build the per-request user message for STORY_EXTRACTION_SYSTEM_PROMPT."""
+    return f"Conversation History:\n{conversation_text}\n\nExtract the story elements and return them as JSON."
@@ -11,6 +11,7 @@ You will receive:
 - links: List of relationships between entities
 - user_genre: The story's genre (if specified)
 - user_context: Any additional context about the story
+- pre-computed facts: duplicate candidate sets (scored with the algorithm below), connected components, isolated nodes and degree statistics, computed exactly before you are called. Treat them as ground truth; your job is to judge which candidates are real duplicates and what the structure means for the story
 
 NODE STRUCTURE:
 {
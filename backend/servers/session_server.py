@@ -12,7 +12,9 @@ from logging.handlers import RotatingFileHandler
 from apscheduler.schedulers.background import BackgroundScheduler
 
 
-from utils.Session import Session
+from utils.Session import Session, get_session_cache_stats
+from utils import session_index
+from utils.metrics import instrument
 
 # ---------------- LOGGING SETUP ----------------
 os.makedirs("logs", exist_ok=True)
@@ -73,7 +75,7 @@ if not DEEPSEEK_API_KEY:
 
 client = openai.OpenAI(
     api_key=DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com"
+    base_url=os.getenv("DEEPSEEK_URL", "https://api.deepseek.com")
 )
 
 # ---------------- FLASK APP ----------------
@@ -86,6 +88,7 @@ CORS(
         "http://localhost:3000"
     ]
 )
+instrument(app)
 
 # ---------------- UTIL ----------------
 
@@ -237,9 +240,11 @@ def update_metadata():
 @app.route("/sessions/list", methods=["POST"])
 def list_sessions():
     """
-    Returns all sessions for a user, normalised for the SessionsPanel component.
-    Firebase shape:  chatSessions/{uid}/{sessionId}/{ metadata, messages, ... }
+    Returns sessions for a user, normalised for the SessionsPanel component.
+    Reads the compact sessionIndex/{uid} node (see utils/session_index.py)
+    instead of chatSessions/{uid} with every message.
     Component wants: { sessionId, title, mode, updatedAt, messageCount, stage }
+    Optional pagination: "limit" plus the "before" cursor returned as nextCursor.
     """
     data = request.json
     uid = data.get("userId")
@@ -247,54 +252,37 @@ def list_sessions():
         return jsonify({"error": "userId is required"}), 400
  
     try:
-        sessions_ref = db.reference(f"chatSessions/{uid}")
-        raw = sessions_ref.get()
- 
-        if not raw:
-            return jsonify({"sessions": []})
+        entries, next_cursor = session_index.list_entries(
+            uid, limit=session_index.parse_limit(data.get("limit")), before=data.get("before")
+        )
  
         sessions = []
-        for session_id, session_data in raw.items():
-            if not isinstance(session_data, dict):
-                continue
- 
-            metadata = session_data.get("metadata", {})
-            messages = session_data.get("messages", {})
- 
-            # Count messages that are visible to the user
-            message_count = sum(
-                1 for m in messages.values()
-                if isinstance(m, dict) and m.get("visible", True)
-            ) if messages else 0
- 
-            # Pull updatedAt — stored directly on metadata in your DB
-            updated_at = metadata.get("updatedAt") or metadata.get("createdAt") or 0
+        for entry in entries:
+            mode = entry.get("mode", "brainstorming")
  
-            # Mode is stored directly on metadata
-            mode = metadata.get("mode", "brainstorming")
- 
-            # Stage lives under metadata.brainstorming.stage or metadata.deepthinking.stage
+            # Stage is the BS stage or the current DT category
             stage = None
             if mode == "brainstorming":
-                stage = metadata.get("brainstorming", {}).get("stage")
+                stage = entry.get("stage")
             elif mode == "deepthinking":
-                stage = metadata.get("deepthinking", {}).get("currentCategory")
+                stage = entry.get("currentCategory")
  
             sessions.append({
-                "sessionId": session_id,
-                "title": metadata.get("title") or "New Chat",
+                "sessionId": entry["sessionId"],
+                "title": entry.get("title") or "New Chat",
                 "mode": mode,
-                "updatedAt": updated_at,
-                "messageCount": message_count,
+                "updatedAt": entry.get("updatedAt") or entry.get("createdAt") or 0,
+                "messageCount": entry.get("visibleMessageCount", 0),
+                "lastMessagePreview": entry.get("lastMessagePreview", ""),
                 "stage": stage,
             })
  
-        # Sort newest first
-        sessions.sort(key=lambda s: s["updatedAt"] or 0, reverse=True)
- 
         logger.info(f"Listed {len(sessions)} sessions for uid={uid}")
-        return jsonify({"sessions": sessions})
+        return jsonify({"sessions": sessions, "nextCursor": next_cursor})
  
+    except ValueError as e:
+        # Malformed "before" cursor (session_index.InvalidCursorError) or a bad "limit"
+        return jsonify({"error": "Invalid pagination parameters", "details": str(e)}), 400
     except Exception as e:
         logger.error(f"List sessions error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -310,6 +298,7 @@ def delete_session():
  
     try:
         db.reference(f"chatSessions/{uid}/{session_id}").delete()
+        session_index.safe(session_index.remove_entry, uid, session_id)
         logger.info(f"Deleted session {session_id} for uid={uid}")
         return jsonify({"success": True})
     except Exception as e:
@@ -374,6 +363,8 @@ def generate_session_title():
             "titleSource": "ai",
             "updatedAt": time.time() * 1000,
         })
+        session_index.safe(session_index.update_entry, uid, session_id,
+                           title=title, titleSource="ai")
  
         logger.info(f"Generated title '{title}' for session {session_id}")
         return jsonify({"success": True, "title": title})
@@ -644,6 +635,11 @@ def debug_session(uid, session_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/debug/session-cache", methods=["GET"])
+def debug_session_cache():
+    """Session metadata cache stats (hits, misses, evictions, size)."""
+    return jsonify(get_session_cache_stats())
+
 # ---------------- RUN ----------------
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 4000)))
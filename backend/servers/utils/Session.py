@@ -1,12 +1,15 @@
 import time
 from firebase_admin import db
 import logging
+from utils import session_index
+from utils.cache import SessionCache
+from utils.cache_invalidation import listeners, CACHE_LISTENERS
 from logging.handlers import RotatingFileHandler
 import os
 
-_session_metadata_cache = {}
-_session_cache_ttl = {}
-CACHE_TTL = 5  # 5 seconds
+# Listener invalidation (utils/cache_invalidation.py) lets entries live much longer
+CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "300" if CACHE_LISTENERS else "5"))
+CACHE_MAXSIZE = int(os.getenv("SESSION_CACHE_MAXSIZE", "2000"))
 
 # ---------------- LOGGING SETUP ----------------
 os.makedirs("logs", exist_ok=True)
@@ -43,19 +46,20 @@ for handler in logger.handlers:
     if isinstance(handler, RotatingFileHandler):
         handler.stream.reconfigure(line_buffering=True)  # Python 3.7+
 
-def _get_cache_key(uid, session_id, mode=None):
-    """Generate cache key for session metadata."""
-    if mode:
-        return f"session:{uid}:{session_id}:{mode}"
-    return f"session:{uid}:{session_id}:full"
+# Bounded LRU+TTL metadata cache, keyed by (uid, session_id, mode or "full")
+_session_metadata_cache = SessionCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+
 
 def _invalidate_session_cache(uid, session_id):
     """Invalidate all cache entries for this session."""
-    prefix = f"session:{uid}:{session_id}:"
-    keys_to_delete = [k for k in _session_metadata_cache.keys() if k.startswith(prefix)]
-    for key in keys_to_delete:
-        del _session_metadata_cache[key]
-        _session_cache_ttl.pop(key, None)
+    _session_metadata_cache.invalidate_session(uid, session_id)
+
+
+listeners.add_handler(_invalidate_session_cache)
+
+
+def get_session_cache_stats():
+    return dict(_session_metadata_cache.stats(), listeners=listeners.stats())
 
 class Session:
     def __init__(self, uid: str, session_id: str):
@@ -114,6 +118,8 @@ class Session:
 
         new_session_ref.set(base_data)
         active_ref.child(session_id).set({"startedAt": now})
+        session_index.safe(session_index.create_entry, uid, session_id,
+                           mode=base_data["currentMode"], created_at=now)
         
         logger.info(f"Created session {session_id} with metadata: {metadata}")
         return Session(uid, session_id)
@@ -153,17 +159,13 @@ class Session:
 
 
     def get_metadata(self, mode: str = None):
-        cache_key = _get_cache_key(self.uid, self.session_id, mode)
-        now = time.time()
+        sub_key = mode or "full"
+        listeners.touch(self.uid, self.session_id)
         
-        # Check cache with shorter TTL
-        if cache_key in _session_metadata_cache:
-            cache_age = now - _session_cache_ttl.get(cache_key, 0)
-            if cache_age < CACHE_TTL:
-                logger.debug(f"[SESSION CACHE HIT] {cache_key} (age: {cache_age:.1f}s)")
-                return _session_metadata_cache[cache_key]
-            else:
-                logger.debug(f"[SESSION CACHE EXPIRED] {cache_key} (age: {cache_age:.1f}s)")
+        cached = _session_metadata_cache.get(self.uid, self.session_id, sub_key)
+        if cached is not None:
+            logger.debug(f"[SESSION CACHE HIT] {self.uid}/{self.session_id}:{sub_key}")
+            return cached
         
         # Cache miss - fetch from Firebase
         fetch_start = time.time()
@@ -178,8 +180,7 @@ class Session:
         else:
             result = metadata
         
-        _session_metadata_cache[cache_key] = result
-        _session_cache_ttl[cache_key] = now
+        _session_metadata_cache.set(self.uid, self.session_id, sub_key, result)
         
         return result
 
@@ -200,6 +201,13 @@ class Session:
         else:
             # Path exists, update it
             mode_ref.update(updates)
+
+        if mode == "brainstorming" and "stage" in updates:
+            session_index.safe(session_index.update_entry, self.uid, self.session_id,
+                               stage=updates["stage"])
+        elif mode == "deepthinking" and updates.get("currentCategory"):
+            session_index.safe(session_index.update_entry, self.uid, self.session_id,
+                               currentCategory=updates["currentCategory"])
     
         _invalidate_session_cache(self.uid, self.session_id)
         logger.debug(f"[SESSION CACHE INVALIDATE] Cleared cache for {self.uid}/{self.session_id}")
@@ -226,7 +234,17 @@ class Session:
             "timestamp": int(time.time() * 1000),
         }
         data.update(kwargs)
-        new_msg_ref.set(data)
+
+        # Write the message and its sessionIndex entry in one multi-path update
+        index_path = f"{session_index.INDEX_ROOT}/{self.uid}/{self.session_id}"
+        updates = {f"chatSessions/{self.uid}/{self.session_id}/messages/{new_msg_ref.key}": data}
+        updates.update({
+            f"{index_path}/{field}": value
+            for field, value in session_index.message_fields(
+                role, mode, content, data["timestamp"], data.get("visible", True)
+            ).items()
+        })
+        db.reference().update(updates)
         return new_msg_ref.key
 
     def summarise(self, client, min_messages=10):
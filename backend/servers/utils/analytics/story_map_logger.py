@@ -166,11 +166,13 @@ def log_story_map_analysis(
     link_count,
     issues_found,
     genre_inferred=None,
-    processing_time_ms=None
+    processing_time_ms=None,
+    cached=False
 ):
     """
     Log when user runs story map analysis (AI as Deconstructor).
     This is a CRITICAL metric for testing the framework.
+    cached: the stored result for an unchanged graph was returned.
     """
     metadata = {
         'overallScore': overall_score,
@@ -181,7 +183,8 @@ def log_story_map_analysis(
         'issuesBySeverity': _count_by_severity(issues_found),
         'issuesByCategory': _count_by_category(issues_found),
         'genreInferred': genre_inferred,
-        'processingTimeMs': processing_time_ms
+        'processingTimeMs': processing_time_ms,
+        'cached': cached
     }
     
     # Log to tool journey (Modelling stage - AI as Deconstructor)
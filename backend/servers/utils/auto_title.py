@@ -0,0 +1,277 @@
+"""
+Session title generation shared by /sessions/generate-title,
+/sessions/auto-title and the in-process auto-title job.
+
+AutoTitler replaces the old HTTP loopback to /sessions/auto-title: chat turns
+call request(uid, sid), which is deduplicated per session and queued on the
+background executor's titling queue. Each flush takes every pending session
+(up to AUTO_TITLE_BATCH_MAX); when more than one is waiting they are titled
+in a single DeepSeek call. The final write claims titleSource with a
+transaction, so two workers titling the same session can't both win.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from firebase_admin import db
+
+from utils import session_index
+from utils.background import background
+from utils.prompt_cache import cached_completion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLES = ("New Chat", "Untitled Chat", None, "")
+AUTO_TITLE_BATCH_MAX = int(os.getenv("AUTO_TITLE_BATCH_MAX", "8"))
+MAX_TITLE_LENGTH = 60
+
+TITLE_SYSTEM_PROMPT = "You are a helpful assistant that creates concise titles."
+
+TITLE_REQUIREMENTS = """Requirements:
+- Maximum 6 words
+- Descriptive and specific
+- No quotes or special characters
+- Capitalized like a title"""
+
+
+# ----------- HELPERS -----------
+
+def needs_auto_title(metadata):
+    """Only untitled sessions that have never been titled get an automatic title."""
+    metadata = metadata or {}
+    return metadata.get("titleSource") is None and metadata.get("title") in DEFAULT_TITLES
+
+
+def load_conversation_text(user_id, session_id, limit=10):
+    """First `limit` user messages as 'User: ...' lines, plus how many there were."""
+    messages_data = db.reference(f"chatSessions/{user_id}/{session_id}/messages").get() or {}
+    user_messages = [
+        {"content": msg.get("content", ""), "timestamp": msg.get("timestamp", 0)}
+        for msg in messages_data.values()
+        if isinstance(msg, dict) and msg.get("role") == "user"
+    ]
+    user_messages.sort(key=lambda m: m["timestamp"])
+    context_messages = user_messages[:limit]
+    text = "\n".join(f"User: {m['content']}" for m in context_messages)
+    return text, len(context_messages)
+
+
+def clean_title(title):
+    title = (title or "").strip().strip('"').strip("'").strip()
+    if len(title) > MAX_TITLE_LENGTH:
+        title = title[:MAX_TITLE_LENGTH - 3] + "..."
+    return title
+
+
+def generate_title(client, conversation_text, route="sessions.generate_title"):
+    title_prompt = f"""Based on this conversation, generate a concise, descriptive title (max 6 words).
+The title should capture the main topic or focus of the discussion.
+
+Conversation:
+{conversation_text}
+
+{TITLE_REQUIREMENTS}
+
+Respond with ONLY the title, nothing else."""
+
+    response = cached_completion(
+        client, route,
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": TITLE_SYSTEM_PROMPT},
+            {"role": "user", "content": title_prompt}
+        ],
+        stream=False,
+        temperature=0.7,
+        max_tokens=50
+    )
+    return clean_title(response.choices[0].message.content)
+
+
+def generate_titles_batch(client, conversations, route="sessions.auto_title_batch"):
+    """
+    Title several conversations in one call. conversations is {key: text};
+    returns {key: title} for the keys the model answered.
+    """
+    keys = list(conversations)
+    blocks = "\n\n".join(
+        f"### Conversation {i + 1}\n{conversations[key]}" for i, key in enumerate(keys)
+    )
+    title_prompt = f"""Generate a concise, descriptive title (max 6 words) for EACH conversation below.
+Each title should capture the main topic or focus of that conversation.
+
+{blocks}
+
+{TITLE_REQUIREMENTS}
+
+Respond with a JSON object: {{"titles": {{"1": "<title for conversation 1>", "2": "..."}}}}"""
+
+    response = cached_completion(
+        client, route,
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": TITLE_SYSTEM_PROMPT},
+            {"role": "user", "content": title_prompt}
+        ],
+        response_format={"type": "json_object"},
+        stream=False,
+        temperature=0.7,
+        max_tokens=40 * len(keys) + 50
+    )
+    titles = json.loads(response.choices[0].message.content).get("titles", {}) or {}
+    result = {}
+    for i, key in enumerate(keys):
+        title = clean_title(titles.get(str(i + 1)))
+        if title:
+            result[key] = title
+    return result
+
+
+def save_title(user_id, session_id, title, source):
+    metadata_ref = db.reference(f"chatSessions/{user_id}/{session_id}/metadata")
+    metadata_ref.update({
+        "title": title,
+        "titleSource": source,
+        "updatedAt": int(time.time() * 1000)
+    })
+    session_index.safe(session_index.update_entry, user_id, session_id,
+                       title=title, titleSource=source)
+
+
+def claim_and_save_title(user_id, session_id, title, source="ai_auto"):
+    """Write an automatic title only if nothing else has titled the session meanwhile."""
+    source_ref = db.reference(f"chatSessions/{user_id}/{session_id}/metadata/titleSource")
+    won = []
+
+    def claim(current):
+        # May run several times on contention; only the last run counts
+        won.clear()
+        if current is None:
+            won.append(True)
+            return source
+        return current
+
+    try:
+        source_ref.transaction(claim)
+    except db.TransactionAbortedError:
+        return False
+    if not won:
+        return False
+    save_title(user_id, session_id, title, source)
+    return True
+
+
+# ----------- AUTO-TITLE JOB -----------
+
+class AutoTitler:
+    def __init__(self, client, log=None, min_messages=3, batch_max=AUTO_TITLE_BATCH_MAX):
+        self.client = client
+        self.log = log or logger
+        self.min_messages = min_messages
+        self.batch_max = batch_max
+        self._lock = threading.Lock()
+        self._pending = {}          # (uid, sid) -> queued_at, insertion ordered
+        self._in_flight = set()
+        self._flush_scheduled = False
+        self.titled = 0
+        self.skipped = 0
+        self.deduplicated = 0
+        self.batches = 0
+
+    def request(self, user_id, session_id):
+        """Queue a session for auto-titling. Returns False if it is already queued or running."""
+        key = (user_id, session_id)
+        with self._lock:
+            if key in self._pending or key in self._in_flight:
+                self.deduplicated += 1
+                return False
+            self._pending[key] = time.time()
+            schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+        if schedule:
+            self._schedule_flush()
+        return True
+
+    def _schedule_flush(self):
+        background.submit("titling", self._flush, task_name="auto_title_flush", on_drop=self._flush_dropped)
+
+    def _flush_dropped(self):
+        # The queued flush was discarded (titling queue full): sessions stay
+        # pending and the next request() schedules a new flush
+        with self._lock:
+            self._flush_scheduled = False
+
+    def _flush(self):
+        with self._lock:
+            batch = list(self._pending)[:self.batch_max]
+            for key in batch:
+                del self._pending[key]
+            self._in_flight.update(batch)
+        try:
+            self._title(batch)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(batch)
+                more = bool(self._pending)
+                self._flush_scheduled = more
+            if more:
+                self._schedule_flush()
+
+    def _title(self, batch):
+        conversations = {}
+        for user_id, session_id in batch:
+            try:
+                metadata = db.reference(f"chatSessions/{user_id}/{session_id}/metadata").get() or {}
+                if not needs_auto_title(metadata):
+                    self.skipped += 1
+                    self.log.debug(
+                        f"[AUTO_TITLE] Skipped {session_id} (title: {metadata.get('title')}, "
+                        f"source: {metadata.get('titleSource')})"
+                    )
+                    continue
+                text, count = load_conversation_text(user_id, session_id)
+                if count < self.min_messages:
+                    self.skipped += 1
+                    continue
+                conversations[(user_id, session_id)] = text
+            except Exception as e:
+                self.log.warning(f"[AUTO_TITLE] Could not load {session_id}: {e}")
+
+        if not conversations:
+            return
+
+        titles = {}
+        if len(conversations) > 1:
+            try:
+                titles = generate_titles_batch(self.client, conversations)
+                self.batches += 1
+                self.log.info(f"[AUTO_TITLE] Batched {len(conversations)} sessions in one call")
+            except Exception as e:
+                self.log.warning(f"[AUTO_TITLE] Batch call failed, titling one by one: {e}")
+
+        for key, text in conversations.items():
+            user_id, session_id = key
+            try:
+                title = titles.get(key) or generate_title(self.client, text, route="sessions.auto_title")
+                if title and claim_and_save_title(user_id, session_id, title):
+                    self.titled += 1
+                    self.log.info(f"[AUTO_TITLE] Titled {session_id}: {title}")
+                else:
+                    self.skipped += 1
+            except Exception as e:
+                self.log.warning(f"[AUTO_TITLE] Failed for session {session_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            pending, in_flight = len(self._pending), len(self._in_flight)
+        return {
+            "pending": pending,
+            "in_flight": in_flight,
+            "titled": self.titled,
+            "skipped": self.skipped,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+        }
@@ -0,0 +1,264 @@
+"""
+Central background executor for work that outlives a request.
+
+Tasks go to named queues, highest priority first:
+  interactive  - follow-up actions the user is waiting to see (BS/DT background actions)
+  bookkeeping  - persistence the next turn relies on (message saves, deferred turn work)
+  logging      - analytics and metrics
+  titling      - auto-title generation
+
+A fixed pool of BACKGROUND_WORKERS threads serves all queues; each queue has a
+depth limit and an overflow policy:
+  caller_runs  - run the task in the submitting thread (backpressure)
+  drop_oldest  - discard the oldest queued task to make room
+  shed         - discard the new task
+and low-priority queues can be capped to a few concurrent workers so they never
+starve interactive work. On shutdown (atexit, or SIGTERM when no other handler
+is installed) queued work is drained for up to BACKGROUND_DRAIN_SECONDS.
+"""
+
+import os
+import time
+import atexit
+import signal
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "8"))
+BACKGROUND_DRAIN_SECONDS = int(os.getenv("BACKGROUND_DRAIN_SECONDS", "20"))
+LATENCY_WINDOW = 200
+
+# name: (priority, max_depth, overflow policy, max concurrently running)
+DEFAULT_QUEUES = {
+    "interactive": (0, 200, "caller_runs", None),
+    "bookkeeping": (1, 500, "caller_runs", None),
+    "logging": (2, 500, "shed", 2),
+    "titling": (3, 100, "drop_oldest", 1),
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class _Queue:
+    def __init__(self, name, priority, max_depth, policy, max_running):
+        self.name = name
+        self.priority = priority
+        self.max_depth = max_depth
+        self.policy = policy
+        self.max_running = max_running
+        self.tasks = deque()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.ran_inline = 0
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+        self.runtimes = deque(maxlen=LATENCY_WINDOW)
+
+    def runnable(self):
+        return self.tasks and (self.max_running is None or self.running < self.max_running)
+
+    def stats(self):
+        return {
+            "priority": self.priority,
+            "depth": len(self.tasks),
+            "max_depth": self.max_depth,
+            "policy": self.policy,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "ran_inline": self.ran_inline,
+            "wait_p50": round(_percentile(self.waits, 50), 4),
+            "wait_p95": round(_percentile(self.waits, 95), 4),
+            "run_p50": round(_percentile(self.runtimes, 50), 4),
+            "run_p95": round(_percentile(self.runtimes, 95), 4),
+        }
+
+
+class BackgroundExecutor:
+    def __init__(self, workers=BACKGROUND_WORKERS, queues=None):
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._queues = {}
+        for name, (priority, depth, policy, max_running) in (queues or DEFAULT_QUEUES).items():
+            self._queues[name] = _Queue(name, priority, depth, policy, max_running)
+        self._ordered = sorted(self._queues.values(), key=lambda q: q.priority)
+        self._threads = []
+        self._accepting = True
+        self._stopping = False
+
+    # ----------- SUBMISSION -----------
+
+    def submit(self, queue_name, fn, *args, task_name=None, on_drop=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs). Returns True if queued or run inline,
+        False if shed. Never raises for task errors (they are logged).
+        on_drop() is called if the task is discarded without running (shed,
+        or dropped from a full drop_oldest queue), so callers can undo any
+        "already scheduled" state.
+        """
+        queue = self._queues[queue_name]
+        name = task_name or getattr(fn, "__name__", "task")
+        task = (name, fn, args, kwargs, time.time(), on_drop)
+        dropped = None
+        shed = False
+
+        with self._cond:
+            queue.submitted += 1
+            if not self._accepting:
+                run_inline = True
+            elif len(queue.tasks) < queue.max_depth:
+                queue.tasks.append(task)
+                run_inline = False
+            elif queue.policy == "drop_oldest":
+                dropped = queue.tasks.popleft()
+                queue.shed += 1
+                queue.tasks.append(task)
+                run_inline = False
+            elif queue.policy == "shed":
+                queue.shed += 1
+                shed = True
+            else:
+                run_inline = True
+
+            if not shed and not run_inline:
+                self._ensure_workers()
+                self._cond.notify()
+
+        if shed:
+            logger.warning(f"[BACKGROUND] Shed {name} ({queue_name} queue full)")
+            self._dropped(task)
+            return False
+        if dropped:
+            logger.warning(f"[BACKGROUND] Dropped queued {dropped[0]} ({queue_name} queue full)")
+            self._dropped(dropped)
+        if run_inline:
+            # Queue full (caller_runs) or shutting down: do the work here
+            with self._cond:
+                queue.ran_inline += 1
+                queue.running += 1
+            self._run(queue, task)
+        return True
+
+    # ----------- WORKERS -----------
+
+    def _ensure_workers(self):
+        """Start worker threads on first use (called under the condition)."""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"background-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _next(self):
+        for queue in self._ordered:
+            if queue.runnable():
+                queue.running += 1
+                return queue, queue.tasks.popleft()
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                queue, task = self._next()
+                while task is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    queue, task = self._next()
+            self._run(queue, task)
+
+    def _dropped(self, task):
+        name, on_drop = task[0], task[5]
+        if on_drop is None:
+            return
+        try:
+            on_drop()
+        except Exception as e:
+            logger.exception(f"[BACKGROUND] on_drop for {name} failed: {e}")
+
+    def _run(self, queue, task):
+        name, fn, args, kwargs, queued_at, _ = task
+        start = time.time()
+        ok = True
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            ok = False
+            logger.exception(f"[BACKGROUND] {queue.name}/{name} failed: {e}")
+        finally:
+            end = time.time()
+            with self._cond:
+                queue.running -= 1
+                queue.waits.append(start - queued_at)
+                queue.runtimes.append(end - start)
+                if ok:
+                    queue.completed += 1
+                else:
+                    queue.failed += 1
+                # A capped queue may now be runnable again
+                self._cond.notify_all()
+
+    # ----------- SHUTDOWN -----------
+
+    def drain(self, timeout=BACKGROUND_DRAIN_SECONDS):
+        """Stop accepting queued work and wait for queued/running tasks to finish."""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._accepting = False
+            while any(q.tasks or q.running for q in self._ordered):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            left = sum(len(q.tasks) + q.running for q in self._ordered)
+            self._stopping = True
+            self._cond.notify_all()
+        if left:
+            logger.warning(f"[BACKGROUND] Drain timed out with {left} tasks unfinished")
+        else:
+            logger.info("[BACKGROUND] Drained")
+        return left == 0
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "started": bool(self._threads),
+                "accepting": self._accepting,
+                "queues": {q.name: q.stats() for q in self._ordered},
+            }
+
+
+background = BackgroundExecutor()
+atexit.register(background.drain)
+
+
+def install_sigterm_drain():
+    """
+    Drain on SIGTERM when running under the Flask dev server. Servers such as
+    gunicorn install their own handler and exit normally, which runs atexit.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) not in (signal.SIG_DFL, None):
+        return
+
+    def handler(signum, frame):
+        background.drain()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, handler)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+bench_dt_question_modes.py
+Compares deep-thinking turn latency between the single-call question mode
+(candidates injected into the first DeepSeek call) and the two-call mode
+(CFM selection followed by a separate reword call).
+
+Each mode gets its own fresh session and the same scripted student turns.
+
+Run:
+    BENCH_UID=<test uid> python bench_dt_question_modes.py
+    BENCH_URL=http://localhost:5000 BENCH_TURNS=8 BENCH_UID=<uid> python bench_dt_question_modes.py
+"""
+
+import os
+import sys
+import time
+import json
+import statistics
+import requests
+
+BASE_URL = os.getenv("BENCH_URL", "http://localhost:5000")
+TEST_UID = os.getenv("BENCH_UID")
+TURNS = int(os.getenv("BENCH_TURNS", "6"))
+MODES = ("two_call", "single")
+
+STUDENT_TURNS = [
+    "I'm writing a story about a girl who runs away from a floating city.",
+    "She leaves because the city is sinking and the council is lying about it.",
+    "I think she wants to prove she can survive on her own.",
+    "Her brother stays behind and she feels guilty about it.",
+    "The ground world is dangerous, full of storms and scavengers.",
+    "Maybe she meets someone on the ground who used to live in the city.",
+    "I'm not sure how it should end yet.",
+    "I want the reader to feel hopeful but uneasy.",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_mode(mode):
+    session_id = None
+    latencies = []
+    served_modes = []
+
+    for i in range(TURNS):
+        payload = {
+            "user_id": TEST_UID,
+            "session_id": session_id,
+            "message": STUDENT_TURNS[i % len(STUDENT_TURNS)],
+            "questionMode": mode,
+        }
+        start = time.time()
+        r = requests.post(f"{BASE_URL}/chat/deepthinking", json=payload, timeout=120)
+        elapsed = time.time() - start
+        r.raise_for_status()
+        body = r.json()
+
+        session_id = body.get("session_id", session_id)
+        latencies.append(elapsed)
+        served_modes.append(body.get("question_mode", mode))
+        print(f"  [{mode}] turn {i + 1}: {elapsed:.2f}s")
+
+    return {
+        "mode": mode,
+        "session_id": session_id,
+        "turns": len(latencies),
+        "mean": statistics.mean(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies),
+        "served_modes": served_modes,
+    }
+
+
+def main():
+    if not TEST_UID:
+        print("BENCH_UID must be set to a test user id")
+        sys.exit(1)
+
+    results = {}
+    for mode in MODES:
+        print(f"Running {TURNS} turns in {mode} mode against {BASE_URL}")
+        results[mode] = run_mode(mode)
+
+    print("\n" + "=" * 60)
+    print(f"{'mode':<10} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+    for mode in MODES:
+        r = results[mode]
+        print(f"{mode:<10} {r['mean']:>7.2f}s {r['p50']:>7.2f}s {r['p95']:>7.2f}s {r['max']:>7.2f}s")
+
+    two, single = results["two_call"], results["single"]
+    if single["mean"]:
+        print(f"\nMean speedup (two_call / single): {two['mean'] / single['mean']:.2f}x")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Microbenchmarks for CPU-bound per-request code, with stored baselines and a
+regression gate. See run.py for usage.
+"""
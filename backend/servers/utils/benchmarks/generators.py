@@ -0,0 +1,159 @@
+"""
+Synthetic, seeded inputs for the microbenchmarks. Every generator takes a
+size and a random.Random so the same scale always produces the same data.
+"""
+
+import json
+
+GENRES = ["fantasy", "science fiction", "mystery", "historical fiction", "contemporary", "horror", "romance"]
+THEMES = ["identity", "family", "power", "betrayal", "redemption", "friendship", "freedom", "grief", "justice"]
+SCAMPER = ["Substitute", "Combine", "Adapt", "Modify", "Put", "Eliminate", "Reverse"]
+CATEGORIES = ["character", "setting", "plot", "theme", "conflict", "worldbuilding"]
+LEVELS = ["Low", "Medium", "High"]
+WORDS = (
+    "lighthouse clockwork daughter storm harbor secret key memory beam keeper "
+    "mentor village sea rival map tide lantern signal gear winter promise"
+).split()
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def ideas(n, rng):
+    """Brainstorming ideas as stored by the Session API (id -> idea)."""
+    return {
+        f"idea_{i:05d}": {
+            "text": sentence(rng),
+            "scamperTechnique": rng.choice(SCAMPER),
+            "evaluations": {
+                "flexibilityCategory": rng.choice(CATEGORIES),
+                "elaboration": rng.choice(LEVELS),
+                "originality": rng.choice(LEVELS),
+            },
+            "refined": rng.random() < 0.2,
+        }
+        for i in range(n)
+    }
+
+
+def bs_metadata(n, rng):
+    return {
+        "brainstorming": {
+            "stage": rng.choice(["Clarify", "Ideate", "Develop"]),
+            "baseConcept": {"text": sentence(rng)},
+            "hmwQuestions": {
+                f"hmw_{i}": {"question": f"How might we {sentence(rng, 6).lower()}"}
+                for i in range(max(3, n // 10))
+            },
+        }
+    }
+
+
+def books(n, rng):
+    """Candidate books as returned by BookSourceManager, with ~20% duplicates."""
+    out = []
+    for i in range(n):
+        if out and rng.random() < 0.2:
+            # Same title and author from another source
+            dup = dict(rng.choice(out))
+            dup["id"] = f"dup_{i}"
+            dup["source"] = "open_library" if dup["source"] == "google_books" else "google_books"
+            out.append(dup)
+            continue
+        out.append({
+            "id": f"book_{i}",
+            "title": f"The {rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+            "author": f"Author {rng.randrange(max(1, n // 3))}",
+            "description": " ".join(sentence(rng) for _ in range(4)) + f" A {rng.choice(THEMES)} story.",
+            "categories": rng.sample(GENRES, 2),
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "year": rng.randrange(1990, 2025),
+            "source": rng.choice(["google_books", "open_library", "curated"]),
+        })
+    return out
+
+
+def themes(rng):
+    return {
+        "genre": rng.choice(GENRES),
+        "themes": rng.sample(THEMES, 3),
+        "characterTypes": ["reluctant hero", "mentor"],
+        "plotStructures": ["hero's journey"],
+        "tone": "hopeful",
+        "settingType": "coastal town",
+    }
+
+
+def conversation(n, rng):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(sentence(rng) for _ in range(3))}
+        for i in range(n)
+    ]
+
+
+def subjects(n, rng):
+    extra = ["Juvenile fiction", "Young adult", "Magic", "Dragons", "Coming of age", "Detective and mystery stories"]
+    return [rng.choice(GENRES + extra) for _ in range(n)]
+
+
+def llm_reply(n, rng, fenced=True):
+    """A DeepSeek reply carrying n JSON actions, fenced the way the model usually answers."""
+    actions = [{"action": "respond", "data": {"message": sentence(rng, 30)}}]
+    actions += [
+        {"action": "log_idea", "data": {"text": sentence(rng), "scamperTechnique": rng.choice(SCAMPER)}}
+        for _ in range(n - 1)
+    ]
+    body = json.dumps(actions, indent=2)
+    return f"Here you go:\n```json\n{body}\n```" if fenced else body
+
+
+def markdown_text(n, rng):
+    parts = []
+    for i in range(n):
+        parts.append(f"## Section {i}")
+        parts.append(f"Some **bold** and _italic_ text with a [link](https://example.com/{i}). {sentence(rng)}")
+        parts.append(f"- {sentence(rng, 6)}\n- {sentence(rng, 6)}")
+    return "\n\n".join(parts)
+
+
+def dt_asked(n, rng, bank):
+    """DT metadata with n questions already asked from the real question bank."""
+    ids = list(bank)
+    asked = []
+    for _ in range(n):
+        q = bank[rng.choice(ids)]
+        asked.append({"id": q["id"], "action": "new_category", "category": q.get("category"), "angle": q.get("angle")})
+    last = asked[-1] if asked else {}
+    return {
+        "asked": asked,
+        "currentCategory": last.get("category"),
+        "currentAngle": last.get("angle"),
+        "followUpCount": 0,
+    }
+
+
+def story_map(n, rng):
+    """Story-map nodes and links with some near-duplicate labels and a few isolated nodes."""
+    groups = ["Character", "Location", "Object", "Concept", "Event"]
+    nodes = []
+    for i in range(n):
+        if nodes and rng.random() < 0.1:
+            # A variant of an existing label: reordered, extended or misspelled
+            base = rng.choice(nodes)
+            label = rng.choice([
+                " ".join(reversed(base["label"].split())),
+                f"{base['label']} {rng.choice(WORDS).title()}",
+                base["label"][:-1],
+            ])
+            group = base["group"]
+        else:
+            label = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}{i}"
+            group = rng.choice(groups)
+        nodes.append({"id": f"node_{i}", "label": label, "group": group, "aliases": "", "level": 1, "note": sentence(rng, 8)})
+    links = []
+    for i in range(n * 2):
+        a, b = rng.randrange(n), rng.randrange(n)
+        if a % 17 and b % 17:  # every 17th node stays isolated
+            links.append({"source": f"node_{a}", "target": f"node_{b}", "type": "knows", "context": sentence(rng, 6)})
+    return nodes, links
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Run the microbenchmarks and compare against a stored baseline.
+
+Run from backend/servers:
+    python -m utils.benchmarks.run                                   # print timings
+    BENCH_SAVE=utils/benchmarks/baseline.json python -m utils.benchmarks.run
+    BENCH_BASELINE=utils/benchmarks/baseline.json python -m utils.benchmarks.run
+    python -m utils.benchmarks.run compare old.json new.json
+
+With a baseline, any benchmark whose best time per call is more than
+BENCH_THRESHOLD (default 0.25 = 25%) slower is flagged, and the exit status
+is 1. Timings are only comparable on the same machine and Python version,
+so record the baseline where the comparison will run (the file records
+both).
+
+Settings:
+    BENCH_FILTER      only run benchmarks whose name contains this
+    BENCH_MIN_TIME    seconds per timing run; loops are scaled up to reach it (default 0.2)
+    BENCH_REPEAT      timing runs per benchmark, best is kept (default 5)
+    BENCH_SEED        seed for the input generators (default 7)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import statistics
+import tempfile
+import timeit
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+from utils.benchmarks.suite import BENCHMARKS
+
+FILTER = os.getenv("BENCH_FILTER", "")
+MIN_TIME = float(os.getenv("BENCH_MIN_TIME", "0.2"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+SEED = int(os.getenv("BENCH_SEED", "7"))
+THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.25"))
+
+
+def measure(fn):
+    timer = timeit.Timer(fn)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= MIN_TIME or loops >= 10**7:
+            break
+        loops = loops * 10 if elapsed < MIN_TIME / 10 else max(loops + 1, int(loops * MIN_TIME / elapsed * 1.1))
+    runs = [timer.timeit(loops) / loops for _ in range(REPEAT)]
+    return {"best": min(runs), "median": statistics.median(runs), "loops": loops}
+
+
+def run_all():
+    results = {}
+    for name, (setup, scales) in BENCHMARKS.items():
+        if FILTER and FILTER not in name:
+            continue
+        for scale in scales:
+            fn = setup(scale, random.Random(SEED))
+            result = measure(fn)
+            results[f"{name}@{scale}"] = result
+            print(f"{name:<52} n={scale:<5} {_fmt(result['best']):>10} best {_fmt(result['median']):>10} median")
+    return results
+
+
+def _fmt(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    return f"{seconds * 1e3:.2f}ms"
+
+
+def _meta():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "recordedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": SEED,
+    }
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Print per-benchmark ratios; returns the list of regressed keys."""
+    base_meta, cur_meta = baseline.get("meta", {}), current.get("meta", {})
+    if base_meta.get("python") != cur_meta.get("python") or base_meta.get("platform") != cur_meta.get("platform"):
+        print(f"WARNING: baseline from {base_meta.get('platform')} / Python {base_meta.get('python')}, "
+              f"comparing on {cur_meta.get('platform')} / Python {cur_meta.get('python')}")
+
+    regressions = []
+    print(f"\n{'benchmark':<60} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            print(f"{key:<60} {'-':>10} {_fmt(result['best']):>10} {'new':>8}")
+            continue
+        change = result["best"] / before["best"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  << SLOWER"
+        print(f"{key:<60} {_fmt(before['best']):>10} {_fmt(result['best']):>10} {change:>+7.0%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {threshold:.0%} slower than baseline")
+    else:
+        print(f"\nNo regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    if sys.argv[1:2] == ["compare"]:
+        if len(sys.argv) != 4:
+            print("usage: python -m utils.benchmarks.run compare BASELINE.json CURRENT.json")
+            sys.exit(2)
+        sys.exit(1 if compare(_load(sys.argv[2]), _load(sys.argv[3])) else 0)
+
+    save = os.getenv("BENCH_SAVE")
+    baseline_path = os.getenv("BENCH_BASELINE")
+    # Resolve before the chdir below
+    save = os.path.abspath(save) if save else None
+    baseline = _load(os.path.abspath(baseline_path)) if baseline_path else None
+
+    # Server modules create logs/ in the working directory on import
+    os.chdir(tempfile.mkdtemp(prefix="gcp-bench-"))
+    logging.disable(logging.CRITICAL)
+
+    current = {"meta": _meta(), "results": run_all()}
+
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nSaved {len(current['results'])} results to {save}")
+    if baseline:
+        sys.exit(1 if compare(baseline, current) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Microbenchmarks for pure per-request code paths.
+
+Each benchmark is a setup function registered with @benchmark(name, scales).
+setup(n, rng) builds the inputs for scale n and returns a zero-argument
+callable that runs the code under test once. Server modules are imported
+inside setup so that listing the suite has no side effects.
+"""
+
+BENCHMARKS = {}
+DEFAULT_SCALES = (10, 100, 1000)
+
+
+def benchmark(name, scales=DEFAULT_SCALES):
+    def register(setup):
+        BENCHMARKS[name] = (setup, tuple(scales))
+        return setup
+    return register
+
+
+# ----------- CHAT -----------
+
+@benchmark("chat_utils.parse_deepseek_json", scales=(1, 10, 100))
+def _parse_deepseek_json(n, rng):
+    from utils.chat.chat_utils import parse_deepseek_json
+    from utils.benchmarks import generators
+    raw = generators.llm_reply(n, rng)
+    return lambda: parse_deepseek_json(raw)
+
+
+@benchmark("chat_utils.parse_markdown", scales=(1, 10, 100))
+def _parse_markdown(n, rng):
+    from utils.chat.chat_utils import parse_markdown
+    from utils.benchmarks import generators
+    text = generators.markdown_text(n, rng)
+    return lambda: parse_markdown(text)
+
+
+def _stub_bs_cfm(n, rng):
+    """A BS flow manager whose Session API reads are served from memory."""
+    from utils.chat.BSConversationFlowManager import BSConversationFlowManager
+    from utils.benchmarks import generators
+
+    cfm = BSConversationFlowManager.__new__(BSConversationFlowManager)
+    cfm.uid, cfm.session_id = "bench-user", "bench-session"
+    metadata = generators.bs_metadata(n, rng)
+    cfm._metadata_cache = metadata
+    cfm._ideas_cache = generators.ideas(n, rng)
+    cfm.get_metadata = lambda: metadata
+    return cfm
+
+
+@benchmark("BSConversationFlowManager.get_session_snapshot")
+def _bs_snapshot(n, rng):
+    cfm = _stub_bs_cfm(n, rng)
+    return cfm.get_session_snapshot
+
+
+@benchmark("BSConversationFlowManager.get_scamper_coverage")
+def _bs_scamper(n, rng):
+    cfm = _stub_bs_cfm(n, rng)
+    return cfm.get_scamper_coverage
+
+
+@benchmark("DTConversationFlowManager.get_question_candidates", scales=(0, 10, 100))
+def _dt_candidates(n, rng):
+    from utils.chat import DTConversationFlowManager as dt
+    from utils.benchmarks import generators
+
+    cfm = dt.DTConversationFlowManager.__new__(dt.DTConversationFlowManager)
+    cfm.uid, cfm.session_id = "bench-user", "bench-session"
+    metadata = generators.dt_asked(n, rng, dt.primary)
+    cfm._metadata_cache = metadata
+    cfm.get_metadata = lambda: metadata
+    return cfm.get_question_candidates
+
+
+# ----------- RECOMMENDATIONS -----------
+
+@benchmark("BookRanker.rank_and_deduplicate_books")
+def _rank(n, rng):
+    from utils.recommendations.ranker import BookRanker
+    from utils.benchmarks import generators
+    ranker = BookRanker()
+    books, themes = generators.books(n, rng), generators.themes(rng)
+    return lambda: ranker.rank_and_deduplicate_books(books, themes, limit=10)
+
+
+@benchmark("BookRanker._enforce_diversity")
+def _diversity(n, rng):
+    from utils.recommendations.ranker import BookRanker
+    from utils.benchmarks import generators
+    ranker = BookRanker()
+    books = generators.books(n, rng)
+    for book in books:
+        book["relevance_score"] = rng.uniform(0, 100)
+    ranked = sorted(books, key=lambda b: b["relevance_score"], reverse=True)
+    # A large limit makes it walk the whole list, as for browse pages
+    return lambda: ranker._enforce_diversity(ranked, limit=n)
+
+
+@benchmark("StoryElementExtractor.format_conversation")
+def _format_conversation(n, rng):
+    from utils.recommendations.StoryElementExtractor import StoryElementExtractor
+    from utils.benchmarks import generators
+    conversation = generators.conversation(n, rng)
+    return lambda: StoryElementExtractor.format_conversation(conversation)
+
+
+@benchmark("SubjectMapper._hardcoded_map")
+def _hardcoded_map(n, rng):
+    from utils.recommendations.SubjectMapper import SubjectMapper
+    from utils.benchmarks import generators
+    mapper = SubjectMapper(enable_dynamic=False)
+    subjects = generators.subjects(n, rng)
+    return lambda: mapper._hardcoded_map(subjects)
+
+
+# ----------- STORY MAP -----------
+
+@benchmark("story_map_analysis.analyze")
+def _story_map_analyze(n, rng):
+    from utils import story_map_analysis
+    from utils.benchmarks import generators
+    nodes, links = generators.story_map(n, rng)
+    return lambda: story_map_analysis.analyze(nodes, links)
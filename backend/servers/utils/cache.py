@@ -1,59 +1,488 @@
+"""
+Shared caches for the conversation flow managers.
+
+metadata_cache and summaries_cache are mapping-like backends chosen by
+CACHE_BACKEND:
+  - "memory" (default): per-process cachetools.TTLCache, as before.
+  - "sqlite": one SQLite database in WAL mode shared by every worker on the
+    host (CACHE_SQLITE_PATH). Entries, invalidations and hit/miss counters
+    are visible to all workers, so invalidate_metadata in one gunicorn worker
+    takes effect in the others and get_cache_stats() reports totals.
+
+With CACHE_LISTENERS enabled, entries for active sessions are also evicted by
+Firebase listeners (utils/cache_invalidation.py), so the default TTLs are
+raised from seconds to minutes.
+
+make_cache() creates further caches on the same backend for other
+JSON-serializable results.
+"""
+
 from cachetools import TTLCache
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import tempfile
 import threading
+import time
+import uuid
+import logging
+
+from utils.cache_invalidation import listeners, CACHE_LISTENERS
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.getenv(
+    "CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "gcp_shared_cache.sqlite3")
+)
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", "300" if CACHE_LISTENERS else "30"))
+SUMMARIES_CACHE_TTL = int(os.getenv("SUMMARIES_CACHE_TTL", "600" if CACHE_LISTENERS else "60"))
+# Workers whose counters haven't been flushed for this long are treated as gone
+CACHE_COUNTER_STALE_SECONDS = int(os.getenv("CACHE_COUNTER_STALE_SECONDS", "3600"))
+
+
+# ----------- BACKENDS -----------
+
+class InProcessBackend:
+    """Per-process TTL cache (each worker has its own copy)."""
+
+    kind = "memory"
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._cache.get(key, default)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._cache[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._cache[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._cache
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._cache.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+
+class _SQLiteStore:
+    """
+    Connection handling for the shared SQLite file. Connections are per
+    thread and re-opened after a fork (gunicorn workers must not share the
+    master's handle).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def conn(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            local.conn.execute("PRAGMA journal_mode=WAL")
+            local.conn.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+            self._ensure_schema(local.conn)
+        return local.conn
+
+    def _ensure_schema(self, conn):
+        with self._init_lock:
+            if self._initialized:
+                return
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (cache, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_expiry ON cache_entries (cache, expires_at)"
+            )
+            # Replaced by cache_worker_counters (rows keyed by pid outlived their workers)
+            conn.execute("DROP TABLE IF EXISTS cache_counters")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_worker_counters ("
+                " worker TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL, PRIMARY KEY (worker, name))"
+            )
+            conn.execute(
+                "DELETE FROM cache_worker_counters WHERE updated_at<?",
+                (time.time() - CACHE_COUNTER_STALE_SECONDS,),
+            )
+            self._initialized = True
+
+
+class SQLiteBackend:
+    """
+    Cache shared by all workers through one SQLite (WAL) file. Values are
+    stored as JSON, so only JSON-serializable data should be cached.
+    Size is bounded by pruning expired and oldest rows every PRUNE_EVERY writes.
+    """
+
+    kind = "sqlite"
+    PRUNE_EVERY = 100
+
+    def __init__(self, name, maxsize, ttl, store):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._store = store
+        self._writes = 0
+
+    def get(self, key, default=None):
+        row = self._store.conn().execute(
+            "SELECT value FROM cache_entries WHERE cache=? AND key=? AND expires_at>?",
+            (self.name, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._store.conn().execute(
+            "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.name, key, json.dumps(value), time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def __delitem__(self, key):
+        if self.pop(key, None) is None:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._store.conn().execute(
+            "SELECT 1 FROM cache_entries WHERE cache=? AND key=? AND expires_at>?",
+            (self.name, key, time.time()),
+        ).fetchone() is not None
+
+    def pop(self, key, default=None):
+        conn = self._store.conn()
+        value = self.get(key, default)
+        conn.execute("DELETE FROM cache_entries WHERE cache=? AND key=?", (self.name, key))
+        return value
+
+    def clear(self):
+        self._store.conn().execute("DELETE FROM cache_entries WHERE cache=?", (self.name,))
+
+    def __len__(self):
+        return self._store.conn().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE cache=? AND expires_at>?",
+            (self.name, time.time()),
+        ).fetchone()[0]
+
+    def _prune(self):
+        conn = self._store.conn()
+        conn.execute(
+            "DELETE FROM cache_entries WHERE cache=? AND expires_at<=?", (self.name, time.time())
+        )
+        conn.execute(
+            "DELETE FROM cache_entries WHERE cache=? AND key IN ("
+            " SELECT key FROM cache_entries WHERE cache=? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.name, self.name, self.maxsize),
+        )
+
+
+class CacheCounters(dict):
+    """
+    Hit/miss counters. Behaves like the plain dict call sites already use
+    (cache_stats["metadata_hits"] += 1); with a shared store, this worker's
+    totals are also written (at most once per FLUSH_INTERVAL) so totals() can
+    sum across workers.
+
+    Rows are keyed by a per-process worker id (pid plus a random suffix, so a
+    restarted worker that gets a reused pid doesn't overwrite or inherit the
+    old row) and stamped on every flush. Rows not flushed for
+    CACHE_COUNTER_STALE_SECONDS belong to workers that have exited, or been
+    idle that long: they are left out of totals() and pruned, and an idle
+    worker's row comes back with its next flush.
+    """
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, names, store=None, stale_after=CACHE_COUNTER_STALE_SECONDS):
+        super().__init__({name: 0 for name in names})
+        self._store = store
+        self.stale_after = stale_after
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def _worker_id(self):
+        # A forked worker gets its own id (and starts its own row)
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._worker = f"{self._worker_pid}-{uuid.uuid4().hex[:8]}"
+        return self._worker
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        if self._store and time.time() - self._last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._store:
+            return
+        with self._lock:
+            now = self._last_flush = time.time()
+            worker = self._worker_id()
+            conn = self._store.conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache_worker_counters (worker, name, value, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(worker, name, value, now) for name, value in dict(self).items()],
+            )
+            conn.execute(
+                "DELETE FROM cache_worker_counters WHERE updated_at<?", (now - self.stale_after,)
+            )
+
+    def totals(self):
+        """Counters summed over live workers (just this process for the memory backend)."""
+        if not self._store:
+            return dict(self), 1
+        self.flush()
+        conn = self._store.conn()
+        cutoff = time.time() - self.stale_after
+        totals = {name: 0 for name in self}
+        for name, value in conn.execute(
+            "SELECT name, SUM(value) FROM cache_worker_counters WHERE updated_at>=? GROUP BY name",
+            (cutoff,),
+        ):
+            totals[name] = value
+        workers = conn.execute(
+            "SELECT COUNT(DISTINCT worker) FROM cache_worker_counters WHERE updated_at>=?", (cutoff,)
+        ).fetchone()[0]
+        return totals, workers
+
+
+def _make_backends():
+    if CACHE_BACKEND == "sqlite":
+        try:
+            store = _SQLiteStore(CACHE_SQLITE_PATH)
+            store.conn()
+            logger.info(f"[CACHE] Using shared SQLite cache at {CACHE_SQLITE_PATH}")
+            return (
+                SQLiteBackend("metadata", 1000, METADATA_CACHE_TTL, store),
+                SQLiteBackend("summaries", 500, SUMMARIES_CACHE_TTL, store),
+                store,
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite cache unavailable ({e}), falling back to in-process cache")
+    elif CACHE_BACKEND != "memory":
+        logger.warning(f"[CACHE] Unknown CACHE_BACKEND={CACHE_BACKEND!r}, using in-process cache")
+    return (
+        InProcessBackend("metadata", 1000, METADATA_CACHE_TTL),
+        InProcessBackend("summaries", 500, SUMMARIES_CACHE_TTL),
+        None,
+    )
+
 
 # Separate caches with different TTLs
-metadata_cache = TTLCache(maxsize=1000, ttl=30)  # 30 seconds
-summaries_cache = TTLCache(maxsize=500, ttl=60)  # 60 seconds
+metadata_cache, summaries_cache, _shared_store = _make_backends()
+
 
-# Thread-safe locks
+def make_cache(name, maxsize, ttl):
+    """
+    Extra cache on the configured backend, for JSON-serializable results
+    (e.g. analysis responses keyed by a content hash).
+    """
+    if _shared_store is not None:
+        return SQLiteBackend(name, maxsize, ttl, _shared_store)
+    return InProcessBackend(name, maxsize, ttl)
+
+
+# Thread-safe locks (per process; the backends are safe to use without them)
 metadata_lock = threading.RLock()
 summaries_lock = threading.RLock()
 
 # Statistics tracking
-cache_stats = {
-    "metadata_hits": 0,
-    "metadata_misses": 0,
-    "summaries_hits": 0,
-    "summaries_misses": 0,
-    "metadata_invalidations": 0,
-    "summaries_invalidations": 0
-}
+cache_stats = CacheCounters([
+    "metadata_hits",
+    "metadata_misses",
+    "summaries_hits",
+    "summaries_misses",
+    "metadata_invalidations",
+    "summaries_invalidations"
+], store=_shared_store)
 
 def get_cache_stats():
-    """Return cache statistics with hit rates."""
-    total_metadata = cache_stats["metadata_hits"] + cache_stats["metadata_misses"]
-    total_summaries = cache_stats["summaries_hits"] + cache_stats["summaries_misses"]
+    """Return cache statistics with hit rates (summed across workers for shared backends)."""
+    totals, workers = cache_stats.totals()
+    total_metadata = totals["metadata_hits"] + totals["metadata_misses"]
+    total_summaries = totals["summaries_hits"] + totals["summaries_misses"]
     
-    metadata_hit_rate = (cache_stats["metadata_hits"] / total_metadata * 100) if total_metadata > 0 else 0
-    summaries_hit_rate = (cache_stats["summaries_hits"] / total_summaries * 100) if total_summaries > 0 else 0
+    metadata_hit_rate = (totals["metadata_hits"] / total_metadata * 100) if total_metadata > 0 else 0
+    summaries_hit_rate = (totals["summaries_hits"] / total_summaries * 100) if total_summaries > 0 else 0
     
     return {
+        "backend": metadata_cache.kind,
+        "workers": workers,
         "metadata": {
-            "hits": cache_stats["metadata_hits"],
-            "misses": cache_stats["metadata_misses"],
+            "hits": totals["metadata_hits"],
+            "misses": totals["metadata_misses"],
             "hit_rate": f"{metadata_hit_rate:.2f}%",
-            "invalidations": cache_stats["metadata_invalidations"],
-            "size": len(metadata_cache)
+            "invalidations": totals["metadata_invalidations"],
+            "size": len(metadata_cache),
+            "ttl": metadata_cache.ttl
         },
         "summaries": {
-            "hits": cache_stats["summaries_hits"],
-            "misses": cache_stats["summaries_misses"],
+            "hits": totals["summaries_hits"],
+            "misses": totals["summaries_misses"],
             "hit_rate": f"{summaries_hit_rate:.2f}%",
-            "invalidations": cache_stats["summaries_invalidations"],
-            "size": len(summaries_cache)
-        }
+            "invalidations": totals["summaries_invalidations"],
+            "size": len(summaries_cache),
+            "ttl": summaries_cache.ttl
+        },
+        "listeners": listeners.stats()
     }
 
 def invalidate_metadata(cache_key):
-    """Thread-safe metadata cache invalidation."""
+    """Thread-safe metadata cache invalidation (visible to all workers on a shared backend)."""
     with metadata_lock:
-        if cache_key in metadata_cache:
-            del metadata_cache[cache_key]
+        if metadata_cache.pop(cache_key, None) is not None:
             cache_stats["metadata_invalidations"] += 1
 
 def invalidate_summaries(cache_key):
-    """Thread-safe summaries cache invalidation."""
+    """Thread-safe summaries cache invalidation (visible to all workers on a shared backend)."""
     with summaries_lock:
-        if cache_key in summaries_cache:
-            del summaries_cache[cache_key]
-            cache_stats["summaries_invalidations"] += 1
\ No newline at end of file
+        if summaries_cache.pop(cache_key, None) is not None:
+            cache_stats["summaries_invalidations"] += 1
+
+def invalidate_session(uid, session_id):
+    """Drop every CFM cache entry for one session (bs/dt metadata and summaries)."""
+    invalidate_metadata(f"bs:{uid}:{session_id}")
+    invalidate_metadata(f"dt:{uid}:{session_id}")
+    invalidate_summaries(f"summaries:{uid}:{session_id}")
+
+def watch_session(uid, session_id):
+    """Keep a metadata listener open for this session while it is in use."""
+    return listeners.touch(uid, session_id)
+
+listeners.add_handler(invalidate_session)
+
+
+class SessionCache:
+    """
+    Bounded LRU + TTL cache for per-session data (e.g. Session metadata by mode).
+
+    Entries are keyed by (uid, session_id, sub_key). A secondary index maps
+    (uid, session_id) to its keys so invalidating a session only touches that
+    session's entries. All operations take a single lock, so it is safe under
+    Flask's threaded server.
+    """
+
+    def __init__(self, maxsize=2000, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # (uid, sid, sub) -> (value, expires_at)
+        self._by_session = {}        # (uid, sid) -> set of sub keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        self._data.pop(key, None)
+        session = key[:2]
+        subs = self._by_session.get(session)
+        if subs is not None:
+            subs.discard(key[2])
+            if not subs:
+                del self._by_session[session]
+
+    def get(self, uid, session_id, sub_key, default=None):
+        key = (uid, session_id, sub_key)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, uid, session_id, sub_key, value):
+        key = (uid, session_id, sub_key)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            self._by_session.setdefault((uid, session_id), set()).add(sub_key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_session(self, uid, session_id):
+        """Drop every entry for one session; cost is O(entries for that session)."""
+        with self._lock:
+            subs = self._by_session.pop((uid, session_id), None)
+            if not subs:
+                return 0
+            for sub in subs:
+                self._data.pop((uid, session_id, sub), None)
+            self.invalidations += len(subs)
+            return len(subs)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_session.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": f"{(self.hits / total * 100) if total else 0:.2f}%",
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "size": len(self._data),
+                "sessions": len(self._by_session),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,254 @@
+"""
+Firebase listener-driven cache invalidation.
+
+While a session is active, a db.reference(...).listen() stream is kept open
+on chatSessions/{uid}/{sid}/metadata. Any change event (including the initial
+snapshot, which closes the gap between starting the listener and the first
+fetch) calls the registered handlers, which evict that session's cache
+entries. Because another service's writes now evict entries immediately,
+cache TTLs can be raised from seconds to minutes (see CACHE_LISTENERS).
+
+Listeners are reference-counted: acquire()/release() bracket explicit use,
+touch() marks activity. A listener whose count is zero and that has been idle
+for LISTENER_IDLE_SECONDS is closed by a reaper thread, and at most
+LISTENER_MAX are open at once (least recently used idle ones go first). When
+a listener is torn down the handlers run one last time, so nothing stays
+cached for a session that is no longer watched. The registry lock is never
+held while a stream is being opened: the slot is reserved first, listen()
+runs outside the lock, and other callers for the same session wait for it.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from firebase_admin import db
+
+logger = logging.getLogger(__name__)
+
+CACHE_LISTENERS = os.getenv("CACHE_LISTENERS", "0").lower() in ("1", "true", "yes")
+LISTENER_IDLE_SECONDS = int(os.getenv("LISTENER_IDLE_SECONDS", "600"))
+LISTENER_MAX = int(os.getenv("LISTENER_MAX", "200"))
+REAP_INTERVAL = 30
+# How long a second caller waits for a listener another request is opening
+LISTENER_START_TIMEOUT = float(os.getenv("LISTENER_START_TIMEOUT", "10"))
+
+
+class _Watch:
+    def __init__(self):
+        self.registration = None
+        # Set once the listener is open (or failed to open); see _use()
+        self.ready = threading.Event()
+        self.ok = False
+        self.refs = 0
+        self.last_used = time.time()
+        self.events = 0
+
+
+class MetadataListenerRegistry:
+    def __init__(self, enabled=CACHE_LISTENERS, idle_seconds=LISTENER_IDLE_SECONDS,
+                 max_listeners=LISTENER_MAX):
+        self.enabled = enabled
+        self.idle_seconds = idle_seconds
+        self.max_listeners = max_listeners
+        self._lock = threading.Lock()
+        self._watches = OrderedDict()   # (uid, sid) -> _Watch
+        self._handlers = []
+        self._reaper = None
+        self.started = 0
+        self.closed = 0
+        self.events = 0
+        self.failures = 0
+
+    def add_handler(self, handler):
+        """handler(uid, session_id) is called whenever a watched session's metadata changes."""
+        self._handlers.append(handler)
+
+    # ----------- REFCOUNTING -----------
+
+    def acquire(self, uid, session_id):
+        """Start (or reuse) the listener for a session and hold it open until release()."""
+        return self._use(uid, session_id, hold=True)
+
+    def release(self, uid, session_id):
+        with self._lock:
+            watch = self._watches.get((uid, session_id))
+            if watch:
+                watch.refs = max(0, watch.refs - 1)
+                watch.last_used = time.time()
+
+    def touch(self, uid, session_id):
+        """Mark a session active, starting its listener if needed. Returns True if watched."""
+        return self._use(uid, session_id, hold=False)
+
+    def _use(self, uid, session_id, hold):
+        if not self.enabled or not uid or not session_id:
+            return False
+        key = (uid, session_id)
+        evicted = []
+        starting = False
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                # Reserve the slot; the stream is opened outside the lock so a
+                # slow handshake only delays this session
+                evicted = self._make_room()
+                watch = _Watch()
+                self._watches[key] = watch
+                starting = True
+            self._watches.move_to_end(key)
+            watch.last_used = time.time()
+            if hold:
+                watch.refs += 1
+        for old_key, old_watch in evicted:
+            self._teardown(old_key, old_watch)
+
+        if starting:
+            self._start(key, watch)
+        else:
+            watch.ready.wait(LISTENER_START_TIMEOUT)
+        if not watch.ok:
+            return False
+        self._ensure_reaper()
+        return True
+
+    def _start(self, key, watch):
+        uid, session_id = key
+        path = f"chatSessions/{uid}/{session_id}/metadata"
+        try:
+            registration = db.reference(path).listen(
+                lambda event: self._on_event(uid, session_id, event)
+            )
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                if self._watches.get(key) is watch:
+                    del self._watches[key]
+            watch.ready.set()
+            logger.warning(f"[CACHE_LISTENER] Could not listen on {path}: {e}")
+            return
+
+        with self._lock:
+            # Evicted or closed while the stream was opening: don't keep it
+            published = self._watches.get(key) is watch
+            if published:
+                watch.registration = registration
+                watch.ok = True
+                self.started += 1
+        watch.ready.set()
+        if published:
+            logger.debug(f"[CACHE_LISTENER] Watching {path}")
+        else:
+            self._close(key, registration)
+            with self._lock:
+                self.closed += 1
+
+    def _make_room(self):
+        """Pick least recently used idle listeners to close (called under the lock)."""
+        evicted = []
+        if len(self._watches) < self.max_listeners:
+            return evicted
+        for key, watch in list(self._watches.items()):
+            if watch.refs == 0:
+                evicted.append((key, self._watches.pop(key)))
+                if len(self._watches) < self.max_listeners:
+                    break
+        return evicted
+
+    # ----------- EVENTS -----------
+
+    def _on_event(self, uid, session_id, event):
+        self.events += 1
+        watch = self._watches.get((uid, session_id))
+        if watch:
+            watch.events += 1
+        logger.debug(
+            f"[CACHE_LISTENER] {event.event_type} {uid}/{session_id}{event.path}"
+        )
+        self._notify(uid, session_id)
+
+    def _notify(self, uid, session_id):
+        for handler in self._handlers:
+            try:
+                handler(uid, session_id)
+            except Exception as e:
+                logger.warning(f"[CACHE_LISTENER] Handler {handler} failed for {uid}/{session_id}: {e}")
+
+    # ----------- TEARDOWN -----------
+
+    def _close(self, key, registration):
+        try:
+            registration.close()
+        except Exception as e:
+            logger.warning(f"[CACHE_LISTENER] Closing listener for {key} failed: {e}")
+
+    def _teardown(self, key, watch):
+        # A watch still opening is closed by _start() once listen() returns
+        if watch.registration is not None:
+            self._close(key, watch.registration)
+            self.closed += 1
+        # No longer watched: drop anything that could now go stale
+        self._notify(*key)
+
+    def reap(self):
+        """Close listeners that are unreferenced and idle past idle_seconds."""
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            idle = [
+                (key, watch) for key, watch in self._watches.items()
+                if watch.refs == 0 and watch.last_used < cutoff
+            ]
+            for key, _ in idle:
+                del self._watches[key]
+        for key, watch in idle:
+            self._teardown(key, watch)
+        if idle:
+            logger.info(f"[CACHE_LISTENER] Closed {len(idle)} idle listeners, {len(self._watches)} active")
+        return len(idle)
+
+    def _ensure_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+
+            def loop():
+                while True:
+                    time.sleep(REAP_INTERVAL)
+                    try:
+                        self.reap()
+                    except Exception as e:
+                        logger.warning(f"[CACHE_LISTENER] Reaper failed: {e}")
+
+            self._reaper = threading.Thread(target=loop, name="cache-listener-reaper", daemon=True)
+            self._reaper.start()
+
+    def close_all(self):
+        with self._lock:
+            watches = list(self._watches.items())
+            self._watches.clear()
+        for key, watch in watches:
+            self._teardown(key, watch)
+
+    def stats(self):
+        with self._lock:
+            held = sum(1 for w in self._watches.values() if w.refs)
+            active = len(self._watches)
+        return {
+            "enabled": self.enabled,
+            "active": active,
+            "held": held,
+            "started": self.started,
+            "closed": self.closed,
+            "events": self.events,
+            "failures": self.failures,
+            "idle_seconds": self.idle_seconds,
+            "max": self.max_listeners,
+        }
+
+
+# One registry per process; caches register their eviction handlers on it
+listeners = MetadataListenerRegistry()
@@ -8,8 +8,11 @@ import threading
 from utils.cache import (
     metadata_cache, summaries_cache, cache_stats,
     metadata_lock, summaries_lock,
-    invalidate_metadata, invalidate_summaries
+    invalidate_metadata, invalidate_summaries, watch_session
 )
+from utils.background import background
+from utils.log_pipeline import log_payload
+from utils.metrics import upstream
 
 import logging
 from logging.handlers import RotatingFileHandler
@@ -27,7 +30,7 @@ logger.setLevel(logging.DEBUG)
 logger.addHandler(rotating_handler)
 
 # ------------------ CONFIG ------------------
-SESSION_API_URL = "https://guidedcreativeplanning-session.onrender.com"
+SESSION_API_URL = os.getenv("SESSION_API_URL", "https://guidedcreativeplanning-session.onrender.com")
 
 RATING_MAP = {"Low": 1, "Medium": 2, "High": 3}
 REVERSE_MAP = {1: "Low", 2: "Medium", 3: "High"}
@@ -72,7 +75,8 @@ class BSConversationFlowManager:
 
     def _post(self, path: str, payload: dict, timeout: float = 10.0) -> dict:
         try:
-            r = requests.post(self._url(path), json=payload, timeout=timeout)
+            with upstream("session_api"):
+                r = requests.post(self._url(path), json=payload, timeout=timeout)
             r.raise_for_status()
             return r.json()
         except Exception as e:
@@ -81,7 +85,8 @@ class BSConversationFlowManager:
 
     def _get(self, path: str, params: dict = None, timeout: float = 10.0) -> dict:
         try:
-            r = requests.get(self._url(path), params=params, timeout=timeout)
+            with upstream("session_api"):
+                r = requests.get(self._url(path), params=params, timeout=timeout)
             r.raise_for_status()
             return r.json()
         except Exception as e:
@@ -116,7 +121,7 @@ class BSConversationFlowManager:
         }
 
         # ADD LOGGING TO DEBUG
-        logger.debug(f"[SESSION CREATE] Sending payload: {payload}")
+        log_payload(logger, "[SESSION CREATE] Sending payload", payload)
         
         res = requests.post(f"{SESSION_API_URL}/session/create", json=payload, timeout=10.0)
         res.raise_for_status()
@@ -146,12 +151,14 @@ class BSConversationFlowManager:
     def get_metadata(self):
         """Thread-safe cached metadata retrieval."""
         cache_key = f"bs:{self.uid}:{self.session_id}"
+        watch_session(self.uid, self.session_id)
         
         with metadata_lock:
-            if cache_key in metadata_cache:
+            cached = metadata_cache.get(cache_key)
+            if cached is not None:
                 cache_stats["metadata_hits"] += 1
                 logger.debug(f"[CACHE HIT] Metadata for {cache_key}")
-                return metadata_cache[cache_key]
+                return cached
         
         # Cache miss
         cache_stats["metadata_misses"] += 1
@@ -229,7 +236,7 @@ class BSConversationFlowManager:
             except Exception as e:
                 logger.error(f"[MESSAGE SAVE] Failed: {e}")
         
-        threading.Thread(target=save_async, daemon=True).start()
+        background.submit("bookkeeping", save_async, task_name="save_message")
         return None
 
     # ----------- HMW MGMT -----------
@@ -597,7 +604,7 @@ class BSConversationFlowManager:
             "action": "evaluate_idea",
             "params": {"ideaId": idea_id, "text": idea_text}
         }
-        logger.debug(f"[AI REQUEST] Payload: {payload}")
+        log_payload(logger, "[AI REQUEST] Payload", payload)
         return payload
 
     def request_ai_refinement(self, idea_id: str, idea_text: str, focus: str = None):
@@ -606,7 +613,7 @@ class BSConversationFlowManager:
             "action": "refine_idea",
             "params": {"ideaId": idea_id, "text": idea_text, "focus": focus}
         }
-        logger.debug(f"[AI REQUEST] Payload: {payload}")
+        log_payload(logger, "[AI REQUEST] Payload", payload)
         return payload
 
     def request_ai_combination(self, idea_ids: list, idea_texts: list):
@@ -615,7 +622,7 @@ class BSConversationFlowManager:
             "action": "combine_ideas",
             "params": {"ideaIds": idea_ids, "texts": idea_texts}
         }
-        logger.debug(f"[AI REQUEST] Payload: {payload}")
+        log_payload(logger, "[AI REQUEST] Payload", payload)
         return payload
 
     def evaluate_idea(self, idea_id: str, evaluations: dict):
@@ -680,7 +687,7 @@ class BSConversationFlowManager:
         }
         
         res = self._post("/cps/refine_idea", payload)
-        logger.debug(f"[IDEA REFINE] Session API response: {res}")
+        log_payload(logger, "[IDEA REFINE] Session API response", res)
         
         # Update category if provided
         if new_idea.get("evaluations", {}).get("flexibilityCategory"):
@@ -932,12 +939,13 @@ class BSConversationFlowManager:
     def get_recent_messages(self, limit=10, maxed_out=False):
         """Return existing summaries (cached) + unsummarised messages."""
         cache_key = f"summaries:{self.uid}:{self.session_id}"
+        watch_session(self.uid, self.session_id)
         
         try:
             # Get summaries from cache
-            if cache_key in summaries_cache and not maxed_out:
+            cached_data = None if maxed_out else summaries_cache.get(cache_key)
+            if cached_data is not None:
                 cache_stats["summaries_hits"] += 1
-                cached_data = summaries_cache[cache_key]
                 logger.debug(f"[CACHE HIT] Summaries for {cache_key}")
             else:
                 cache_stats["summaries_misses"] += 1
@@ -1167,7 +1175,7 @@ class BSConversationFlowManager:
         }
         
         res = self._post("/cps/refine_idea", payload)
-        logger.debug(f"[SCAMPER REFINE] Session API response: {res}")
+        log_payload(logger, "[SCAMPER REFINE] Session API response", res)
         
         # Update category if provided
         if new_idea.get("evaluations", {}).get("flexibilityCategory"):
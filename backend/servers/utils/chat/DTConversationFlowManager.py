@@ -8,8 +8,10 @@ import requests
 from utils.cache import (
     metadata_cache, summaries_cache, cache_stats,
     metadata_lock, summaries_lock,
-    invalidate_metadata, invalidate_summaries
+    invalidate_metadata, invalidate_summaries, watch_session
 )
+from utils.background import background
+from utils.metrics import upstream
 
 import logging
 from logging.handlers import RotatingFileHandler
@@ -40,7 +42,7 @@ follow_up = question_bank.get("follow_up", {})
 meta_transitions = question_bank.get("meta_transitions", {})
 
 # ------------------ CONFIG ------------------
-SESSION_API_URL = "https://guidedcreativeplanning-session.onrender.com"
+SESSION_API_URL = os.getenv("SESSION_API_URL", "https://guidedcreativeplanning-session.onrender.com")
 KEEP_LAST_N = 10
 
 
@@ -75,7 +77,8 @@ class DTConversationFlowManager:
 
     def _post(self, path: str, payload: dict, timeout: float = 10.0) -> dict:
         try:
-            r = requests.post(self._url(path), json=payload, timeout=timeout)
+            with upstream("session_api"):
+                r = requests.post(self._url(path), json=payload, timeout=timeout)
             r.raise_for_status()
             return r.json()
         except Exception as e:
@@ -135,12 +138,14 @@ class DTConversationFlowManager:
     def get_metadata(self):
         """Thread-safe cached metadata retrieval."""
         cache_key = f"dt:{self.uid}:{self.session_id}"
+        watch_session(self.uid, self.session_id)
         
         with metadata_lock:
-            if cache_key in metadata_cache:
+            cached = metadata_cache.get(cache_key)
+            if cached is not None:
                 cache_stats["metadata_hits"] += 1
                 logger.debug(f"[CACHE HIT] Metadata for {cache_key}")
-                return metadata_cache[cache_key].get("deepthinking", {})
+                return cached.get("deepthinking", {})
         
         # Cache miss
         cache_stats["metadata_misses"] += 1
@@ -208,7 +213,7 @@ class DTConversationFlowManager:
             except Exception as e:
                 logger.error(f"[MESSAGE SAVE] Failed: {e}")
         
-        threading.Thread(target=save_async, daemon=True).start()
+        background.submit("bookkeeping", save_async, task_name="save_message")
         return None
 
     # ----------- MAIN QUESTION FLOW -----------
@@ -429,17 +434,143 @@ class DTConversationFlowManager:
         limit = limit or self.RECENT_LIMIT
         recent_ids = [q["id"] for q in asked[-limit:]]
         return [q for q in pool if q["id"] not in recent_ids]
-    
+
+    # ----------- SINGLE-CALL CANDIDATES -----------
+
+    def get_question_candidates(self, max_angles=4, max_categories=3, max_follow_ups=4):
+        """
+        Pre-select bank questions the model is likely to need this turn so it
+        can pick and reword one in the same call (no second reword request).
+
+        Returns a compact list of candidates grouped by type:
+          - follow_up: unused follow-ups (only while under FOLLOW_UP_LIMIT)
+          - primary: other angles of the current category, plus one question
+            from a few other categories
+          - meta_transition: transitions not asked recently
+        """
+        metadata = self.get_metadata() or {}
+        asked = metadata.get("asked", [])
+        asked_ids = {q.get("id") for q in asked}
+        current_category = metadata.get("currentCategory")
+        current_angle = metadata.get("currentAngle")
+
+        def _compact(q, qtype):
+            item = {"id": q["id"], "type": qtype, "prompt": q.get("prompt")}
+            if q.get("category"):
+                item["category"] = q["category"]
+            if q.get("angle"):
+                item["angle"] = q["angle"]
+            if q.get("transition_type"):
+                item["transition_type"] = q["transition_type"]
+            return item
+
+        follow_ups = []
+        if current_category and metadata.get("followUpCount", 0) < self.FOLLOW_UP_LIMIT:
+            # Follow-up categories are thinking standards (clarity, depth...),
+            # so offer one unused question from a spread of them.
+            by_standard = {}
+            for q in follow_up.values():
+                if q["id"] not in asked_ids:
+                    by_standard.setdefault(q.get("category"), []).append(q)
+            standards = list(by_standard)
+            random.shuffle(standards)
+            for standard in standards[:max_follow_ups]:
+                pool = self._filter_recent(by_standard[standard], asked)
+                if pool:
+                    follow_ups.append(_compact(random.choice(pool), "follow_up"))
+
+        primaries = []
+        if current_category:
+            same_category = [
+                q for q in primary.values()
+                if q.get("category") == current_category
+                and q.get("angle") != current_angle
+                and q["id"] not in asked_ids
+            ]
+            random.shuffle(same_category)
+            primaries.extend(_compact(q, "primary") for q in same_category[:max_angles])
+
+        asked_categories = {q.get("category") for q in asked if q.get("category")}
+        other_categories = sorted(
+            {q.get("category") for q in primary.values()} - {current_category},
+            key=lambda c: (c in asked_categories, random.random())
+        )
+        for category in other_categories[:max_categories]:
+            pool = [
+                q for q in primary.values()
+                if q.get("category") == category and q["id"] not in asked_ids
+            ]
+            if pool:
+                primaries.append(_compact(random.choice(pool), "primary"))
+
+        transitions = [_compact(q, "meta_transition") for q in self._pool_meta_transition()]
+
+        logger.debug(
+            f"[CANDIDATES] {len(follow_ups)} follow-ups, {len(primaries)} primaries, "
+            f"{len(transitions)} transitions (category={current_category}, angle={current_angle})"
+        )
+        return follow_ups + primaries + transitions
+
+    def record_asked_question(self, question_id):
+        """
+        Track a bank question as asked and move the category/angle/follow-up
+        state forward, mirroring what the two-call CFM path records.
+        Returns the bank entry, or None if the id is unknown.
+        """
+        if question_id in primary:
+            question, qtype = primary[question_id], "primary"
+        elif question_id in follow_up:
+            question, qtype = follow_up[question_id], "follow_up"
+        elif question_id in meta_transitions:
+            question, qtype = meta_transitions[question_id], "meta_transition"
+        else:
+            logger.warning(f"[CANDIDATES] Unknown question id: {question_id}")
+            return None
+
+        metadata = self.get_metadata() or {}
+        asked = metadata.get("asked", [])
+
+        if qtype == "primary":
+            asked.append({
+                "id": question_id,
+                "action": "new_category",
+                "category": question.get("category"),
+                "angle": question.get("angle")
+            })
+            self.update_metadata({
+                "asked": asked,
+                "depth": metadata.get("depth", 0) + 1,
+                "followUpCount": 0,
+                "currentCategory": question.get("category"),
+                "currentAngle": question.get("angle")
+            })
+        elif qtype == "follow_up":
+            asked.append({"id": question_id, "action": "follow_up"})
+            self.update_metadata({
+                "asked": asked,
+                "followUpCount": metadata.get("followUpCount", 0) + 1
+            })
+        else:
+            asked.append({
+                "id": question_id,
+                "action": "meta_transition",
+                "transition_type": question.get("transition_type")
+            })
+            self.update_metadata({"asked": asked})
+
+        return question
+
     def get_recent_messages(self, limit=10, maxed_out=False):
         """Thread-safe cached message retrieval."""
         cache_key = f"summaries:{self.uid}:{self.session_id}"
+        watch_session(self.uid, self.session_id)
         
         try:
             # Get summaries from cache
             with summaries_lock:
-                if cache_key in summaries_cache and not maxed_out:
+                cached_data = None if maxed_out else summaries_cache.get(cache_key)
+                if cached_data is not None:
                     cache_stats["summaries_hits"] += 1
-                    cached_data = summaries_cache[cache_key]
                     logger.debug(f"[CACHE HIT] Summaries for {cache_key}")
                 else:
                     cache_stats["summaries_misses"] += 1
@@ -16,6 +16,7 @@ from utils.chat.chat_utils import (
     fetch_profile_data_batch, DEEPSEEK_API_KEY, DEEPSEEK_URL
 )
 
+from utils.prompt_cache import cached_completion
 from prompts.bs_system_prompt import BS_SYSTEM_PROMPT
 
 import logging
@@ -324,7 +325,8 @@ Format: {{"action": "respond", "data": {{"message": "your formatted response"}}}
 
                 followup_start = time.time()
                 try:
-                    followup_resp = client.chat.completions.create(
+                    followup_resp = cached_completion(
+                        client, "brainstorming.followup",
                         model="deepseek-chat",
                         messages=followup_messages,
                         stream=False,
@@ -390,7 +392,8 @@ Format: {{"action": "respond", "data": {{"message": "your formatted response"}}}
 
                 followup_start = time.time()
                 try:
-                    followup_resp = client.chat.completions.create(
+                    followup_resp = cached_completion(
+                        client, "brainstorming.followup",
                         model="deepseek-chat",
                         messages=followup_messages,
                         stream=False,
@@ -481,7 +484,8 @@ Format: {{"action": "respond", "data": {{"message": "your formatted response"}}}
             ]
 
             try:
-                followup_resp = client.chat.completions.create(
+                followup_resp = cached_completion(
+                    client, "brainstorming.followup",
                     model="deepseek-chat",
                     messages=followup_messages,
                     stream=False
@@ -7,6 +7,11 @@ import requests
 import os
 import logging
 from logging.handlers import RotatingFileHandler
+from requests.adapters import HTTPAdapter
+
+from utils.chat.entity_index import EntityIndexRegistry
+from utils.log_pipeline import log_payload
+from utils.metrics import instrument_session
 
 # ============================================
 # API KEYS & CONFIG
@@ -14,7 +19,8 @@ from logging.handlers import RotatingFileHandler
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 LEONARDO_API_KEY = os.getenv("LEONARDO_API_KEY", "ff99362e-8a7e-4776-b03a-aed92b7ada51")
 PROFILE_MANAGER_URL = os.getenv("PROFILE_MANAGER_URL", "https://guidedcreativeplanning-pfm.onrender.com/api")
-DEEPSEEK_URL = "https://api.deepseek.com" 
+DEEPSEEK_URL = os.getenv("DEEPSEEK_URL", "https://api.deepseek.com")
+PROFILE_MANAGER_TIMEOUT = float(os.getenv("PROFILE_MANAGER_TIMEOUT", "10"))
 
 # ============================================
 # CONSTANTS
@@ -57,7 +63,7 @@ def parse_markdown(md_text, output="text"):
     return text.strip()
 
 def parse_deepseek_json(raw):
-    logger.debug(f"Parsing DeepSeek raw response:\n{raw[:300]}...")
+    log_payload(logger, "Parsing DeepSeek raw response", raw)
     matches = re.findall(r'```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```', raw, re.DOTALL)
     results = []
 
@@ -72,7 +78,7 @@ def parse_deepseek_json(raw):
             try:
                 parsed = json.loads(m)
                 results.extend(ensure_list(parsed))
-                logger.debug(f"Parsed JSON block: {parsed}")
+                log_payload(logger, "Parsed JSON block", parsed)
             except json.JSONDecodeError as e:
                 logger.warning(f"Failed to parse JSON block: {e}")
     else:
@@ -111,7 +117,7 @@ def parse_deepseek_json(raw):
     return results
 
 def normalize_deepseek_response(parsed):
-    logger.debug(f"Normalizing DeepSeek response: {parsed}")
+    log_payload(logger, "Normalizing DeepSeek response", parsed)
     if isinstance(parsed, dict):
         return [parsed]
     if isinstance(parsed, list):
@@ -133,12 +139,86 @@ def generate_entity_id(name):
 # ============================================
 # PROFILE MANAGER FETCH UTILITIES
 # ============================================
+# Pooled keep-alive connections to the Profile Manager
+profile_http = requests.Session()
+_profile_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+profile_http.mount("http://", _profile_adapter)
+profile_http.mount("https://", _profile_adapter)
+instrument_session(profile_http, "profile_manager")
+
+
+def _load_profile_entities(user_id, entity_type):
+    """Loader for the entity index: all nodes/links/events for a user as {id: data}."""
+    resp = profile_http.get(
+        f"{PROFILE_MANAGER_URL}/{entity_type}",
+        params={"userId": user_id},
+        timeout=PROFILE_MANAGER_TIMEOUT
+    )
+    if resp.status_code == 404:
+        return {}
+    resp.raise_for_status()
+    data = resp.json() or {}
+    if isinstance(data, dict) and "error" in data:
+        raise RuntimeError(data["error"])
+    if isinstance(data, list):
+        return {(item.get("id") or item.get("firebaseKey") or str(i)): item
+                for i, item in enumerate(data) if isinstance(item, dict)}
+    return data
+
+
+entity_index = EntityIndexRegistry(_load_profile_entities)
+
+
+def _fetch_from_entity_index(target, entity_id, filters, user_id):
+    """
+    Answer list/label/id lookups for nodes, links and events from the local
+    entity index. Returns None when the request needs the Profile Manager.
+    """
+    if target not in ("nodes", "links", "events"):
+        return None
+
+    index = entity_index.for_user(user_id)
+    if entity_id:
+        entity = index.get(target, entity_id)
+        if entity is None:
+            matches = index.lookup(target, entity_id)
+            entity = matches[0] if matches else None
+        return entity
+
+    if not filters:
+        return index.all(target)
+
+    if target == "nodes" and set(filters) == {"label"}:
+        wanted = filters["label"]
+        wanted = wanted if isinstance(wanted, list) else [wanted]
+        result = {}
+        for label in wanted:
+            for node in index.lookup("nodes", label):
+                result[node["id"]] = node
+        return result
+
+    return None
+
 def fetch_profile_data_batch(requests_list, user_id):
     if not requests_list:
         return []
     
     logger.debug(f"[BATCH] Attempting batch fetch for {len(requests_list)} requests")
     batch_start = time.time()
+
+    # Serve the whole batch locally when every request is an indexed lookup
+    try:
+        indexed = [
+            _fetch_from_entity_index(req.get("target"), req.get("entity_id"),
+                                     req.get("payload", {}).get("filters", {}), user_id)
+            for req in requests_list
+        ]
+        if all(result is not None for result in indexed):
+            logger.info(f"[TIMING] Batch served from entity index in {time.time() - batch_start:.3f}s")
+            return [{"request": req, "data": result or {"data": []}}
+                    for req, result in zip(requests_list, indexed)]
+    except Exception as e:
+        logger.warning(f"[BATCH] Entity index lookup failed, using Profile Manager: {e}")
     
     try:
         batch_payload = {
@@ -146,7 +226,7 @@ def fetch_profile_data_batch(requests_list, user_id):
             "requests": requests_list
         }
         
-        response = requests.post(
+        response = profile_http.post(
             f"{PROFILE_MANAGER_URL}/batch",
             json=batch_payload,
             timeout=15.0
@@ -238,7 +318,7 @@ def fetch_profile_data(req_obj, user_id):
         
         try:
             logger.debug(f"Fetching world-building: {url} with params {params}")
-            resp = requests.get(url, params=params)
+            resp = profile_http.get(url, params=params, timeout=PROFILE_MANAGER_TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
             logger.debug(f"World-building response: {len(data) if isinstance(data, dict) else 'N/A'} items")
@@ -255,6 +335,14 @@ def fetch_profile_data(req_obj, user_id):
             logger.exception(f"Error fetching world-building: {e}")
             return {"error": str(e)}
     
+    try:
+        indexed = _fetch_from_entity_index(target, entity_id, filters, user_id)
+        if indexed is not None:
+            logger.debug(f"Served {target} request from entity index")
+            return indexed or {"data": []}
+    except Exception as e:
+        logger.warning(f"Entity index lookup failed, falling back to Profile Manager: {e}")
+
     if target == "nodes":
         url = f"{PROFILE_MANAGER_URL}/nodes/{entity_id}" if entity_id else f"{PROFILE_MANAGER_URL}/nodes"
     elif target == "links":
@@ -270,13 +358,14 @@ def fetch_profile_data(req_obj, user_id):
 
     try:
         logger.debug(f"Sending GET request to Profile Manager: {url} with filters {filters}")
-        resp = requests.get(url, params={"userId": user_id, **filters})
+        resp = profile_http.get(url, params={"userId": user_id, **filters},
+                                timeout=PROFILE_MANAGER_TIMEOUT)
         resp.raise_for_status()
         data = resp.json()
         if isinstance(data, dict) and "error" in data:
             logger.warning(f"Profile Manager returned error: {data['error']}")
             return {"error": data["error"]}
-        logger.debug(f"Profile Manager response: {data}")
+        log_payload(logger, "Profile Manager response", data)
         return data or {"data": []}
     except requests.HTTPError as e:
         if e.response.status_code == 404:
@@ -291,10 +380,47 @@ def fetch_profile_data(req_obj, user_id):
 # ============================================
 # STAGING UTILITIES
 # ============================================
+def _is_node_create(req_obj):
+    """
+    True for a request that creates a node. Deletes and updates name their
+    target with newData.identifier (entityId is always null from the prompts).
+    """
+    node = req_obj.get("newData") or {}
+    change = str(req_obj.get("changeType") or req_obj.get("action") or "").lower()
+    return not req_obj.get("entityId") and not node.get("identifier") and change not in ("delete", "update")
+
+
+def _existing_node(node, user_id):
+    """The indexed node matching the new node's label or an alias, or None."""
+    try:
+        index = entity_index.for_user(user_id)
+        names = [node["label"]] + [a for a in str(node.get("aliases") or "").split(",") if a.strip()]
+        for name in names:
+            existing = index.lookup("nodes", name)
+            if existing:
+                return name, existing[0]
+    except Exception as e:
+        logger.warning(f"[STAGING] Existence check failed, staging anyway: {e}")
+    return None
+
+
 def process_node_request(req_obj, user_id):
     logger.debug(f"[STAGING] process_node_request called")
     node = req_obj["newData"]
 
+    # Existence check: a create request for a label/alias that already
+    # exists returns the existing node instead of staging a duplicate
+    if _is_node_create(req_obj) and node.get("label"):
+        match = _existing_node(node, user_id)
+        if match:
+            name, existing = match
+            logger.info(f"[STAGING] Blocked duplicate node '{node['label']}' (matches '{name}')")
+            return {
+                "status": "exists",
+                "message": f"A node matching '{name}' already exists; not creating a duplicate.",
+                "existing": existing
+            }
+
     if not node.get("label"):
         if node.get("identifier"):
             node["label"] = node["identifier"]
@@ -303,20 +429,21 @@ def process_node_request(req_obj, user_id):
 
     node["entity_id"] = generate_entity_id(node["label"])
 
-    resp = requests.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
+    resp = profile_http.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
         "userId": user_id,
         "label": node["label"],
         "entityType": "node",
         "entityId": node["entity_id"],
         "newData": node
-    })
+    }, timeout=PROFILE_MANAGER_TIMEOUT)
+    entity_index.invalidate(user_id, "nodes")
     return resp.json()
 
 def process_link_request(req_obj, user_id):
     logger.debug(f"[STAGING] process_link_request called")
     link = req_obj["newData"]
 
-    resp = requests.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
+    resp = profile_http.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
         "userId": user_id,
         "entityType": "link",
         "entityId": None,
@@ -326,7 +453,8 @@ def process_link_request(req_obj, user_id):
             "type": link["type"],
             "context": link.get("context", "")
         }
-    })
+    }, timeout=PROFILE_MANAGER_TIMEOUT)
+    entity_index.invalidate(user_id, "links")
     return resp.json()
 
 def process_event_request(req_obj, user_id):
@@ -334,12 +462,13 @@ def process_event_request(req_obj, user_id):
     event = req_obj["newData"]
     event["entity_id"] = generate_entity_id(event["title"])
 
-    resp = requests.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
+    resp = profile_http.post(f"{PROFILE_MANAGER_URL}/stage-change", json={
         "userId": user_id,
         "entityType": "event",
         "entityId": event["entity_id"],
         "newData": event
-    })
+    }, timeout=PROFILE_MANAGER_TIMEOUT)
+    entity_index.invalidate(user_id, "events")
     return resp.json()
 
 def process_worldbuilding_request(req_obj, user_id, etype):
@@ -356,7 +485,7 @@ def process_worldbuilding_request(req_obj, user_id, etype):
         return {"error": f"Invalid category: {category}"}
     
     try:
-        staging_resp = requests.post(
+        staging_resp = profile_http.post(
             f"{PROFILE_MANAGER_URL}/stage-change",
             json={
                 "userId": user_id,
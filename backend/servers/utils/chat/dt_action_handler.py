@@ -15,6 +15,7 @@ from utils.chat.chat_utils import (
     fetch_profile_data_batch, DEEPSEEK_API_KEY, DEEPSEEK_URL
 )
 
+from utils.prompt_cache import cached_completion
 from prompts.dt_system_prompt import DT_SYSTEM_PROMPT
 import logging
 from logging.handlers import RotatingFileHandler
@@ -221,7 +222,8 @@ Format: {{"action": "respond", "data": {{"message": "your formatted response"}}}
 
                 followup_start = time.time()
                 try:
-                    followup_resp = client.chat.completions.create(
+                    followup_resp = cached_completion(
+                        client, "deepthinking.followup",
                         model="deepseek-chat",
                         messages=followup_messages,
                         stream=False,
@@ -324,7 +326,8 @@ Format: {{"action": "respond", "data": {{"message": "your formatted response"}}}
 
             followup_start = time.time()
             try:
-                followup_resp = client.chat.completions.create(
+                followup_resp = cached_completion(
+                    client, "deepthinking.followup",
                     model="deepseek-chat",
                     messages=followup_messages,
                     stream=False
@@ -0,0 +1,236 @@
+"""
+Per-user in-process index of Profile Manager entities (nodes, links, events).
+
+Each user's entities are fetched lazily (one request per entity type) and
+indexed by:
+  - entity id,
+  - normalized label / alias / title (exact lookups, existence checks),
+  - label trigrams (fuzzy search for misspelled or partial names),
+  - a precomputed lowercase text blob (substring search over all fields).
+
+The index is invalidated per user and entity type whenever a change is staged
+through process_*_request, and entries also expire after ENTITY_INDEX_TTL
+seconds because confirmations happen in the Profile Manager directly.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TYPES = ("nodes", "links", "events")
+ENTITY_INDEX_TTL = int(os.getenv("ENTITY_INDEX_TTL", "120"))
+ENTITY_INDEX_MAX_USERS = int(os.getenv("ENTITY_INDEX_MAX_USERS", "500"))
+
+_WS_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_label(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    if not text:
+        return ""
+    text = _PUNCT_RE.sub(" ", str(text).lower())
+    return _WS_RE.sub(" ", text).strip()
+
+
+def trigrams(text):
+    padded = f"  {normalize_label(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _split_aliases(aliases):
+    if not aliases:
+        return []
+    if isinstance(aliases, (list, tuple)):
+        return [str(a) for a in aliases if a]
+    return [a for a in str(aliases).split(",") if a.strip()]
+
+
+def entity_names(entity_type, data):
+    """Names an entity can be referred to by."""
+    if entity_type == "nodes":
+        return [data.get("label")] + _split_aliases(data.get("aliases"))
+    if entity_type == "events":
+        return [data.get("title")]
+    if entity_type == "links":
+        return [data.get("node1"), data.get("node2")]
+    return [data.get("label") or data.get("name") or data.get("title")]
+
+
+class _TypeIndex:
+    """Index over one entity type for one user."""
+
+    def __init__(self, entity_type, entities):
+        self.entity_type = entity_type
+        self.loaded_at = time.time()
+        self.by_id = {}
+        self.by_name = {}
+        self.by_trigram = {}
+        self.text = {}
+
+        for entity_id, data in entities.items():
+            if not isinstance(data, dict):
+                continue
+            data = dict(data)
+            data.setdefault("id", entity_id)
+            self.by_id[entity_id] = data
+            self.text[entity_id] = str(data).lower()
+            for name in entity_names(entity_type, data):
+                key = normalize_label(name)
+                if not key:
+                    continue
+                self.by_name.setdefault(key, set()).add(entity_id)
+                for gram in trigrams(key):
+                    self.by_trigram.setdefault(gram, set()).add(entity_id)
+
+    def expired(self, ttl):
+        return time.time() - self.loaded_at > ttl
+
+
+class EntityIndex:
+    """All indexed entity types for a single user."""
+
+    def __init__(self, user_id, loader, ttl=ENTITY_INDEX_TTL):
+        self.user_id = user_id
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._types = {}
+        self.hits = 0
+        self.loads = 0
+
+    def _get(self, entity_type):
+        if entity_type not in ENTITY_TYPES:
+            raise ValueError(f"Unsupported entity type: {entity_type}")
+
+        with self._lock:
+            index = self._types.get(entity_type)
+            if index and not index.expired(self._ttl):
+                self.hits += 1
+                return index
+
+            # Load under the lock so concurrent requests don't stampede the
+            # Profile Manager for the same user/type
+            start = time.time()
+            entities = self._loader(self.user_id, entity_type)
+            index = _TypeIndex(entity_type, entities or {})
+            self._types[entity_type] = index
+            self.loads += 1
+            logger.debug(
+                f"[ENTITY_INDEX] Loaded {len(index.by_id)} {entity_type} for {self.user_id} "
+                f"in {time.time() - start:.3f}s"
+            )
+            return index
+
+    def invalidate(self, entity_type=None):
+        with self._lock:
+            if entity_type:
+                self._types.pop(entity_type, None)
+            else:
+                self._types.clear()
+
+    # ----------- LOOKUPS -----------
+
+    def all(self, entity_type):
+        """All entities of a type as {id: data} (the Profile Manager list shape)."""
+        return dict(self._get(entity_type).by_id)
+
+    def get(self, entity_type, entity_id):
+        return self._get(entity_type).by_id.get(entity_id)
+
+    def lookup(self, entity_type, name):
+        """Entities whose label/alias/title matches name after normalization."""
+        index = self._get(entity_type)
+        ids = index.by_name.get(normalize_label(name), ())
+        return [index.by_id[i] for i in ids]
+
+    def exists(self, entity_type, name):
+        return bool(self.lookup(entity_type, name))
+
+    def search(self, entity_type, term, limit=None, min_similarity=0.4):
+        """
+        Search by name and content. Results are ordered: exact name matches,
+        then substring matches anywhere in the entity, then fuzzy name matches
+        (trigram Jaccard similarity >= min_similarity).
+        """
+        index = self._get(entity_type)
+        key = normalize_label(term)
+        needle = str(term).lower().strip()
+        if not needle:
+            return []
+
+        ordered = list(index.by_name.get(key, ()))
+        seen = set(ordered)
+
+        for entity_id, text in index.text.items():
+            if entity_id not in seen and needle in text:
+                ordered.append(entity_id)
+                seen.add(entity_id)
+
+        query_grams = trigrams(key)
+        if query_grams:
+            overlap = {}
+            for gram in query_grams:
+                for entity_id in index.by_trigram.get(gram, ()):
+                    if entity_id not in seen:
+                        overlap[entity_id] = overlap.get(entity_id, 0) + 1
+
+            scored = []
+            for entity_id, shared in overlap.items():
+                best = 0.0
+                for name in entity_names(entity_type, index.by_id[entity_id]):
+                    grams = trigrams(name)
+                    if grams:
+                        best = max(best, len(query_grams & grams) / len(query_grams | grams))
+                if best >= min_similarity:
+                    scored.append((best, entity_id))
+            scored.sort(reverse=True)
+            ordered.extend(entity_id for _, entity_id in scored)
+
+        if limit:
+            ordered = ordered[:limit]
+        return [index.by_id[i] for i in ordered]
+
+
+class EntityIndexRegistry:
+    """LRU of per-user EntityIndex objects sharing one loader."""
+
+    def __init__(self, loader, max_users=ENTITY_INDEX_MAX_USERS, ttl=ENTITY_INDEX_TTL):
+        self._loader = loader
+        self._max_users = max_users
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def for_user(self, user_id):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                index = EntityIndex(user_id, self._loader, self._ttl)
+                self._users[user_id] = index
+                if len(self._users) > self._max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            return index
+
+    def invalidate(self, user_id, entity_type=None):
+        with self._lock:
+            index = self._users.get(user_id)
+        if index:
+            index.invalidate(entity_type)
+            logger.debug(f"[ENTITY_INDEX] Invalidated {entity_type or 'all'} for {user_id}")
+
+    def stats(self):
+        with self._lock:
+            indexes = list(self._users.values())
+        return {
+            "users": len(indexes),
+            "hits": sum(i.hits for i in indexes),
+            "loads": sum(i.loads for i in indexes),
+        }
@@ -0,0 +1,243 @@
+"""
+Chunked draft feedback: split a draft into sections, review changed
+sections concurrently, reuse cached reviews for unchanged ones, and
+synthesise the usual feedback structure from the section reviews.
+
+Sections are cut at scene breaks, before headings and at paragraph
+boundaries. Within a scene a section closes once it has
+DRAFT_CHUNK_MIN_WORDS and the paragraph just added hashes to a boundary (or it reaches DRAFT_CHUNK_MAX_WORDS), so
+where sections end depends on the paragraphs themselves rather than on
+running word counts: fixing a typo or adding a sentence usually changes only
+the section it's in, and every other section keeps its hash and cached review.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+DRAFT_CHUNKED_MIN_WORDS = int(os.getenv("DRAFT_CHUNKED_MIN_WORDS", "1200"))
+DRAFT_CHUNK_MIN_WORDS = int(os.getenv("DRAFT_CHUNK_MIN_WORDS", "150"))
+DRAFT_CHUNK_MAX_WORDS = int(os.getenv("DRAFT_CHUNK_MAX_WORDS", "600"))
+DRAFT_CHUNK_CACHE_TTL = int(os.getenv("DRAFT_CHUNK_CACHE_TTL", str(7 * 24 * 3600)))
+# On average one paragraph in BOUNDARY_EVERY ends a section (once it has the minimum size)
+BOUNDARY_EVERY = 3
+
+CATEGORIES = (
+    ("Consistency", "✓"),
+    ("Clarity", "💡"),
+    ("Context Usage", "🔗"),
+    ("Craft Technique", "🎨"),
+    ("Character Voice", "👤"),
+)
+CONTEXT_KEYS = ("characters", "locations", "events", "relationships")
+MAX_CONTEXT_ITEMS = 25
+
+# Bare separator lines end a scene and are dropped; headings start a new one and are kept
+_SCENE_BREAK_RE = re.compile(r"^\s*(\*\s*\*\s*\*|#{1,3}|-{3,}|~{3,})\s*$")
+_HEADING_RE = re.compile(r"^\s*#{1,3}\s+\S")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+# ----------- SPLITTING -----------
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def _scenes(draft_text):
+    """Paragraph lists, one per scene."""
+    scenes, current = [], []
+    for block in _PARAGRAPH_RE.split(draft_text):
+        lines = [line for line in block.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        if len(lines) == 1 and _SCENE_BREAK_RE.match(lines[0]):
+            if current:
+                scenes.append(current)
+            current = []
+            continue
+        if _HEADING_RE.match(lines[0]) and current:
+            scenes.append(current)
+            current = []
+        current.append("\n".join(lines))
+    if current:
+        scenes.append(current)
+    return scenes
+
+
+def split_draft(draft_text):
+    """
+    Sections as [{"index", "text", "words", "hash"}]. The hash is over the
+    whitespace-normalised text, so reflowing a paragraph doesn't count as a
+    change.
+    """
+    sections = []
+
+    def close(paragraphs):
+        text = "\n\n".join(paragraphs)
+        sections.append({
+            "index": len(sections),
+            "text": text,
+            "words": len(text.split()),
+            "hash": _hash(_normalize(text)),
+        })
+
+    for scene in _scenes(draft_text):
+        current, words = [], 0
+        for paragraph in scene:
+            current.append(paragraph)
+            words += len(paragraph.split())
+            boundary = int(_hash(_normalize(paragraph))[:8], 16) % BOUNDARY_EVERY == 0
+            if words >= DRAFT_CHUNK_MAX_WORDS or (words >= DRAFT_CHUNK_MIN_WORDS and boundary):
+                close(current)
+                current, words = [], 0
+        if current:
+            close(current)
+    return sections
+
+
+def context_hash(context):
+    """Hash of the story-profile summary a review was written against."""
+    return _hash(context)[:16]
+
+
+def cache_key(user_id, story_id, section, context):
+    # A review scores consistency and context usage against the story profile,
+    # so changing characters or events must not reuse it
+    return f"{user_id}:{story_id}:{context_hash(context)}:{section['hash']}"
+
+
+# ----------- PROMPTS -----------
+
+def context_summary(nodes, events):
+    """Compact story-profile summary shared by every section prompt."""
+    lines = []
+    for node in list(nodes)[:MAX_CONTEXT_ITEMS]:
+        label = node.get("label") or node.get("name")
+        if not label:
+            continue
+        kind = node.get("group") or node.get("type") or "entity"
+        detail = node.get("note") or node.get("description") or ""
+        aliases = node.get("aliases")
+        line = f"- {label} ({kind})"
+        if aliases:
+            line += f", also called {aliases if isinstance(aliases, str) else ', '.join(aliases)}"
+        if detail:
+            line += f": {str(detail)[:120]}"
+        lines.append(line)
+    ordered = sorted(events, key=lambda e: e.get("order", 0) if isinstance(e.get("order"), (int, float)) else 0)
+    for event in ordered[:MAX_CONTEXT_ITEMS]:
+        lines.append(f"- Event [{event.get('stage') or event.get('order', '?')}] {event.get('title', 'Untitled')}")
+    return "\n".join(lines) if lines else "No story profile data yet. Focus on general craft."
+
+
+def section_message(section, total, context):
+    return f"""STORY PROFILE:
+{context}
+
+SECTION {section['index'] + 1} OF {total} ({section['words']} words):
+{section['text']}
+
+Review this section and return the JSON described."""
+
+
+def synthesis_message(story_id, reviews, sections, context_used):
+    """Synthesis prompt: per-section scores and notes instead of the draft itself."""
+    lines = []
+    for section, review in zip(sections, reviews):
+        scores = ", ".join(f"{name} {review['scores'].get(name, '?')}" for name, _ in CATEGORIES)
+        lines.append(f"Section {section['index'] + 1} ({section['words']} words): {scores}")
+        if review.get("notes"):
+            lines.append(f"  Main issue: {review['notes']}")
+        for strength in (review.get("strengths") or [])[:2]:
+            lines.append(f"  Strength: {strength}")
+        for suggestion in (review.get("suggestions") or [])[:2]:
+            lines.append(f"  Suggestion: {suggestion}")
+    return f"""Combine these section reviews of one story draft into the final feedback.
+
+STORY ID: {story_id}
+CONTEXT USED (counted across sections): {json.dumps(context_used)}
+
+SECTION REVIEWS:
+{chr(10).join(lines)}
+
+Do not request context; everything you need is above. Weigh sections by length,
+pick the single most important improvement across the whole draft as topPriority,
+and return the final feedback JSON (the FEEDBACK STRUCTURE) directly."""
+
+
+# ----------- RESULTS -----------
+
+def parse_review(text):
+    """A section review from model output, with scores clamped to 1-10; None if unusable."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"```(?:json)?\s*", "", text).strip().rstrip("`").strip()
+    try:
+        review = json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            review = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(review, dict) or not isinstance(review.get("scores"), dict):
+        return None
+    scores = {}
+    for name, _ in CATEGORIES:
+        value = review["scores"].get(name)
+        if isinstance(value, (int, float)):
+            scores[name] = max(1, min(10, value))
+    if not scores:
+        return None
+    review["scores"] = scores
+    return review
+
+
+def total_context_used(reviews):
+    """Largest count per context kind across sections (sections overlap in who appears)."""
+    used = {key: 0 for key in CONTEXT_KEYS}
+    for review in reviews:
+        counts = review.get("contextUsed") or {}
+        for key in CONTEXT_KEYS:
+            if isinstance(counts.get(key), (int, float)):
+                used[key] = max(used[key], int(counts[key]))
+    return used
+
+
+def aggregate(reviews, sections, context_used):
+    """
+    Feedback in the standard structure computed directly from the section
+    reviews (word-weighted mean scores), used when the synthesis call fails.
+    """
+    categories = []
+    for name, icon in CATEGORIES:
+        weighted = [(r["scores"][name], s["words"]) for r, s in zip(reviews, sections) if name in r["scores"]]
+        total = sum(w for _, w in weighted)
+        score = round(sum(v * w for v, w in weighted) / total) if total else 5
+        # Strength from the best section for this category, suggestion from the weakest
+        ranked = sorted(
+            (r for r in reviews if name in r["scores"]),
+            key=lambda r: r["scores"][name]
+        )
+        strength = next((s for r in reversed(ranked) for s in r.get("strengths") or []), "")
+        suggestion = next((s for r in ranked for s in r.get("suggestions") or []), "")
+        categories.append({"name": name, "icon": icon, "score": score, "strength": strength, "suggestion": suggestion})
+
+    weakest = min(categories, key=lambda c: c["score"])
+    return {
+        "overallScore": round(sum(c["score"] for c in categories) / len(categories)),
+        "topPriority": weakest["suggestion"] or f"Focus on {weakest['name'].lower()} in your next revision.",
+        "contextUsed": context_used,
+        "categories": categories,
+    }
@@ -4,6 +4,8 @@ import requests
 import logging
 import os
 
+from utils.chat.chat_utils import entity_index, profile_http
+
 rec_logger = logging.getLogger("FEEDBACK")
 
 
@@ -57,96 +59,42 @@ def _handle_get_info(data, user_id, story_id):
     filters = data.get('filters', {})
     
     try:
-        # ================= NODES =================
-        if info_type == 'nodes':
-            response = requests.get(
-                f"{PROFILE_MANAGER_URL}/api/nodes",
-                params={'userId': user_id},
-                timeout=10
-            )
-            
-            if response.status_code != 200:
-                rec_logger.error(f"[GET_INFO] Nodes fetch failed: {response.status_code}")
-                return {'error': 'Failed to fetch entities', 'nodes': []}
-            
-            raw_data = response.json()
-            
-            # Use the helper to handle List vs Dict
-            items_iter = _normalize_to_items(raw_data)
-            
-            filtered = []
-            for node_id, node_data in items_iter:
-                if isinstance(node_data, dict):
-                    # Filter by type if specified
-                    if 'type' in filters and node_data.get('type') != filters['type']:
-                        continue
-                    
-                    # Ensure ID is in the object
-                    if 'id' not in node_data:
-                        node_data['id'] = node_id
-                        
-                    filtered.append(node_data)
-            
-            rec_logger.info(f"[GET_INFO] Fetched {len(filtered)} nodes")
-            return {'nodes': filtered, 'count': len(filtered)}
-        
-        # ================= LINKS =================
-        elif info_type == 'links':
-            response = requests.get(
-                f"{PROFILE_MANAGER_URL}/api/links",
-                params={'userId': user_id},
-                timeout=10
-            )
-            
-            if response.status_code != 200:
-                return {'error': 'Failed to fetch relationships', 'links': []}
-            
-            raw_data = response.json()
-            items_iter = _normalize_to_items(raw_data)
-            
-            filtered = []
-            for link_id, link_data in items_iter:
-                if isinstance(link_data, dict):
-                    if 'id' not in link_data:
-                        link_data['id'] = link_id
-                    filtered.append(link_data)
-            
-            return {'links': filtered, 'count': len(filtered)}
-        
-        # ================= EVENTS =================
-        elif info_type == 'events':
-            response = requests.get(
-                f"{PROFILE_MANAGER_URL}/api/events",
-                params={'userId': user_id},
-                timeout=10
-            )
-            
-            if response.status_code != 200:
-                return {'error': 'Failed to fetch events', 'events': []}
-            
-            raw_data = response.json()
-            items_iter = _normalize_to_items(raw_data)
-            
+        # ================= NODES / LINKS / EVENTS =================
+        # Served from the per-user entity index (one Profile Manager fetch
+        # per type, then in-process until a change is staged or TTL expires)
+        if info_type in ('nodes', 'links', 'events'):
+            try:
+                items = entity_index.for_user(user_id).all(info_type)
+            except Exception as e:
+                rec_logger.error(f"[GET_INFO] {info_type} fetch failed: {e}")
+                return {'error': f'Failed to fetch {info_type}', info_type: []}
+
             filtered = []
-            for event_id, event_data in items_iter:
-                if isinstance(event_data, dict):
-                    if 'id' not in event_data:
-                        event_data['id'] = event_id
-                    
-                    # Optional: Check storyId
-                    if not event_data.get('storyId') or event_data.get('storyId') == story_id:
-                        filtered.append(event_data)
-            
-            # Sort by order
-            filtered.sort(key=lambda e: e.get('order', 0))
-            return {'events': filtered, 'count': len(filtered)}
+            for item_id, item_data in _normalize_to_items(items):
+                if not isinstance(item_data, dict):
+                    continue
+                if info_type == 'nodes' and 'type' in filters and item_data.get('type') != filters['type']:
+                    continue
+                # Optional: Check storyId
+                if info_type == 'events' and item_data.get('storyId') and item_data.get('storyId') != story_id:
+                    continue
+                if 'id' not in item_data:
+                    item_data['id'] = item_id
+                filtered.append(item_data)
+
+            if info_type == 'events':
+                # Sort by order
+                filtered.sort(key=lambda e: e.get('order', 0))
+
+            rec_logger.info(f"[GET_INFO] Fetched {len(filtered)} {info_type}")
+            return {info_type: filtered, 'count': len(filtered)}
         
         # ================= WORLDBUILDING =================
-        elif info_type == 'worldbuilding':
+        if info_type == 'worldbuilding':
             category = data.get('category', 'magicSystems')
             
             # Note: Using /api/world/items as the endpoint
-            response = requests.get(
+            response = profile_http.get(
                 f"{PROFILE_MANAGER_URL}/api/world/items",
                 params={'userId': user_id},
                 timeout=10
@@ -190,6 +138,15 @@ def _handle_query(data, user_id, story_id):
     if not search_term:
         return {'error': 'searchTerm required for query'}
     
+    if query_type in ('nodes', 'links', 'events'):
+        # Name matches first, then any-field substring, then fuzzy name matches
+        try:
+            matches = entity_index.for_user(user_id).search(query_type, search_term)
+        except Exception as e:
+            rec_logger.error(f"[QUERY] {query_type} search failed: {e}")
+            return {'error': f'Failed to fetch {query_type}', query_type: []}
+        return {'matches': matches, 'count': len(matches), 'searchTerm': search_term}
+
     # Reuse the robust logic above
     result = _handle_get_info({'type': query_type}, user_id, story_id)
     
@@ -0,0 +1,534 @@
+"""
+In-memory stand-in for the firebase_admin Realtime Database API.
+
+Implements the subset the servers use: db.reference(path) with child, get,
+set, update (including multi-path "a/b/c" keys), push, delete, transaction,
+listen, and order_by_child / order_by_key / order_by_value queries with
+start_at, end_at, equal_to, limit_to_first and limit_to_last.
+
+Every call that would be a network round trip against the real database
+is counted (per operation, and per request via count_round_trips() or
+install_request_counter()) and can be slowed down with an injected latency,
+so a route's Firebase cost is measurable and assertable:
+
+    database = firebase_emulator.install(latency=0.02)
+    with database.expect_round_trips(at_most=40):
+        client.post("/chat/brainstorming", json=...)
+
+install() patches firebase_admin so modules that did `from firebase_admin
+import db` read and write the in-memory tree instead of a live project:
+
+    from utils import firebase_emulator
+    emulator = firebase_emulator.install()
+    import ai_server    # FIREBASE_SERVICE_ACCOUNT_KEY may be any JSON, e.g. "{}"
+
+Values follow RTDB rules: writing None (or an empty dict) deletes the node,
+and empty parents are pruned. Lists are stored as written. Server-value
+sentinels ({".sv": "timestamp"}, {".sv": {"increment": n}}) are resolved on
+write.
+"""
+
+import copy
+import time
+import queue
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+_current_counter = contextvars.ContextVar("firebase_round_trips", default=None)
+
+
+def _segments(path):
+    return [s for s in (path or "").split("/") if s]
+
+
+def _normalize(value):
+    """Deep copy a value the way RTDB would store it (no None, no empty dicts)."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = _normalize(v)
+            if v is not None:
+                out[str(k)] = v
+        return out or None
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _resolve_server_values(value, current):
+    """
+    Replace server-value sentinels the way RTDB does on write:
+    {".sv": "timestamp"} becomes the time in ms and {".sv": {"increment": n}}
+    adds n to the current number at that location (0 if there is none).
+    """
+    if isinstance(value, dict):
+        if set(value) == {".sv"}:
+            server_value = value[".sv"]
+            if server_value == "timestamp":
+                return int(time.time() * 1000)
+            if isinstance(server_value, dict) and "increment" in server_value:
+                base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+                return base + server_value["increment"]
+            return value
+        current = current if isinstance(current, dict) else {}
+        return {k: _resolve_server_values(v, current.get(str(k))) for k, v in value.items()}
+    return value
+
+
+def _key_order(key):
+    """Integer-like keys sort numerically before all other keys."""
+    try:
+        return (0, int(key), "")
+    except (TypeError, ValueError):
+        return (1, 0, str(key))
+
+
+def _value_order(value):
+    """RTDB ordering: null < false < true < numbers < strings < objects."""
+    if value is None:
+        return (0, 0)
+    if value is False:
+        return (1, 0)
+    if value is True:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, 0)
+
+
+class RoundTripCounter:
+    """Round trips made while this counter is current; nested counters also feed their parent."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.total = 0
+        self.by_op = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add(self, op, path):
+        with self._lock:
+            self.total += 1
+            self.by_op[op] = self.by_op.get(op, 0) + 1
+            self.calls.append((op, path))
+        if self.parent is not None:
+            self.parent.add(op, path)
+
+
+class Event:
+    """Same shape as firebase_admin.db.Event."""
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class ListenerRegistration:
+    """Delivers events on its own thread, like the SSE stream behind db listen()."""
+
+    def __init__(self, database, segments, callback):
+        self._db = database
+        self.segments = segments
+        self._callback = callback
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._deliver, name="emulator-listener", daemon=True)
+        self._thread.start()
+
+    def _deliver(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            try:
+                self._callback(event)
+            except Exception:
+                pass  # A failing callback must not stop later events
+
+    def notify(self, event_type, path, data):
+        self._events.put(Event(event_type, path, data))
+
+    def close(self):
+        self._db._remove_listener(self)
+        self._events.put(None)
+
+
+class InMemoryDatabase:
+    def __init__(self, data=None, latency=0.0):
+        """latency: seconds per round trip, or a callable(op, path) -> seconds."""
+        self._lock = threading.RLock()
+        self._root = _normalize(data) or {}
+        self._last_push_ms = 0
+        self._last_push_suffix = []
+        self._listeners = []
+        self.latency = latency
+        self.round_trips = RoundTripCounter()
+        self.request_round_trips = {}   # route -> [round trips per request]
+
+    # ----------- ROUND TRIPS -----------
+
+    def _round_trip(self, op, path):
+        self.round_trips.add(op, path)
+        counter = _current_counter.get()
+        if counter is not None:
+            counter.add(op, path)
+        delay = self.latency(op, path) if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    @contextmanager
+    def count_round_trips(self):
+        """Count round trips made in this context (and contexts copied from it)."""
+        counter = RoundTripCounter(parent=_current_counter.get())
+        token = _current_counter.set(counter)
+        try:
+            yield counter
+        finally:
+            _current_counter.reset(token)
+
+    @contextmanager
+    def expect_round_trips(self, at_most=None, exactly=None):
+        with self.count_round_trips() as counter:
+            yield counter
+        if exactly is not None and counter.total != exactly:
+            raise AssertionError(
+                f"Expected {exactly} Firebase round trips, got {counter.total}: {counter.by_op}"
+            )
+        if at_most is not None and counter.total > at_most:
+            raise AssertionError(
+                f"Expected at most {at_most} Firebase round trips, got {counter.total}: {counter.by_op}"
+            )
+
+    # ----------- LISTENERS -----------
+
+    def _add_listener(self, segments, callback):
+        registration = ListenerRegistration(self, segments, callback)
+        with self._lock:
+            self._listeners.append(registration)
+            # Like the real stream, the first event is the current value
+            registration.notify("put", "/", self.get("/".join(segments)))
+        return registration
+
+    def _remove_listener(self, registration):
+        with self._lock:
+            if registration in self._listeners:
+                self._listeners.remove(registration)
+
+    def _notify(self, segments, event_type="put", data=None):
+        """Called with the lock held after a write at segments."""
+        for listener in self._listeners:
+            base = listener.segments
+            if segments[:len(base)] == base:
+                # Write at or below the listened path
+                relative = "/" + "/".join(segments[len(base):])
+                listener.notify(event_type, relative, copy.deepcopy(data))
+            elif base[:len(segments)] == segments:
+                # Write above the listened path replaces it
+                listener.notify("put", "/", self.get("/".join(base)))
+
+    def _notify_patch(self, segments, values):
+        """One patch event per listener for a multi-path update (lock held)."""
+        for listener in self._listeners:
+            base = listener.segments
+            if segments[:len(base)] == base:
+                relative = "/" + "/".join(segments[len(base):])
+                listener.notify("patch", relative, _normalize(values) or {})
+            elif base[:len(segments)] == segments:
+                touched = any(
+                    full[:len(base)] == base or base[:len(full)] == full
+                    for full in (segments + _segments(key) for key in values)
+                )
+                if touched:
+                    listener.notify("put", "/", self.get("/".join(base)))
+
+    # ----------- TREE OPERATIONS -----------
+
+    def _raw(self, segs):
+        """Stored value at segs without copying (lock held)."""
+        node = self._root
+        for seg in segs:
+            if isinstance(node, dict):
+                node = node.get(seg)
+            elif isinstance(node, list) and seg.isdigit() and int(seg) < len(node):
+                node = node[int(seg)]
+            else:
+                return None
+            if node is None:
+                return None
+        return node
+
+    def get(self, path):
+        with self._lock:
+            node = self._raw(_segments(path))
+            return copy.deepcopy(node) if node is not None and node != {} else None
+
+    def set(self, path, value, notify=True):
+        segs = _segments(path)
+        with self._lock:
+            value = _normalize(_resolve_server_values(value, self._raw(segs)))
+            if not segs:
+                self._root = value if isinstance(value, dict) else {}
+                if notify:
+                    self._notify([], data=value)
+                return
+            parents = []
+            node = self._root
+            for seg in segs[:-1]:
+                child = node.get(seg) if isinstance(node, dict) else None
+                if not isinstance(child, dict):
+                    if value is None:
+                        if notify:
+                            self._notify(segs, data=None)
+                        return
+                    child = {}
+                    node[seg] = child
+                parents.append((node, seg))
+                node = child
+            if value is None:
+                node.pop(segs[-1], None)
+                # Prune parents left empty by the delete
+                for parent, seg in reversed(parents):
+                    if parent[seg]:
+                        break
+                    del parent[seg]
+            else:
+                node[segs[-1]] = value
+            if notify:
+                self._notify(segs, data=value)
+
+    def update(self, path, values):
+        """Multi-path update: each key may itself be a slash-separated path."""
+        base = "/".join(_segments(path))
+        with self._lock:
+            written = {}
+            for key, value in values.items():
+                full = f"{base}/{key}" if base else key
+                written[key] = _resolve_server_values(value, self._raw(_segments(full)))
+                self.set(full, written[key], notify=False)
+            self._notify_patch(_segments(path), written)
+
+    def delete(self, path):
+        self.set(path, None)
+
+    def push_id(self):
+        """Chronologically ordered 20-character key, like Firebase push IDs."""
+        with self._lock:
+            now = int(time.time() * 1000)
+            if now == self._last_push_ms:
+                # Same millisecond: increment the random suffix to keep keys ordered
+                for i in range(11, -1, -1):
+                    if self._last_push_suffix[i] < 63:
+                        self._last_push_suffix[i] += 1
+                        break
+                    self._last_push_suffix[i] = 0
+            else:
+                self._last_push_ms = now
+                self._last_push_suffix = [random.randrange(64) for _ in range(12)]
+            stamp = []
+            for _ in range(8):
+                stamp.append(PUSH_CHARS[now % 64])
+                now //= 64
+            return "".join(reversed(stamp)) + "".join(PUSH_CHARS[i] for i in self._last_push_suffix)
+
+    def reference(self, path="/", app=None, url=None):
+        return Reference(self, path)
+
+
+class Reference:
+    def __init__(self, database, path="/"):
+        self._db = database
+        self._segments = _segments(path)
+
+    @property
+    def key(self):
+        return self._segments[-1] if self._segments else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self._segments)
+
+    @property
+    def parent(self):
+        if not self._segments:
+            return None
+        return Reference(self._db, "/".join(self._segments[:-1]))
+
+    def child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError(f"Invalid path argument: {path!r}")
+        return Reference(self._db, "/".join(self._segments + _segments(path)))
+
+    def get(self, etag=False, shallow=False):
+        self._db._round_trip("get", self.path)
+        value = self._db.get(self.path)
+        if shallow and isinstance(value, dict):
+            value = {k: True for k in value}
+        return (value, "emulator") if etag else value
+
+    def set(self, value):
+        if value is None:
+            raise ValueError("Value must not be None.")
+        self._db._round_trip("set", self.path)
+        self._db.set(self.path, value)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        if None in value.keys():
+            raise ValueError("Dictionary must not contain None keys.")
+        self._db._round_trip("update", self.path)
+        self._db.update(self.path, value)
+
+    def push(self, value=""):
+        # The key is generated locally; only a write with a value reaches the server
+        ref = self.child(self._db.push_id())
+        if value != "":
+            ref.set(value)
+        return ref
+
+    def delete(self):
+        self._db._round_trip("delete", self.path)
+        self._db.delete(self.path)
+
+    def transaction(self, transaction_update):
+        # At least a read and a conditional write against the real database
+        self._db._round_trip("transaction_get", self.path)
+        self._db._round_trip("transaction_put", self.path)
+        # One lock for the whole tree, so the read-modify-write is atomic
+        with self._db._lock:
+            new_value = transaction_update(self._db.get(self.path))
+            self._db.set(self.path, new_value)
+            return new_value
+
+    def listen(self, callback):
+        self._db._round_trip("listen", self.path)
+        return self._db._add_listener(list(self._segments), callback)
+
+    def order_by_child(self, path):
+        return Query(self, "child", path)
+
+    def order_by_key(self):
+        return Query(self, "key")
+
+    def order_by_value(self):
+        return Query(self, "value")
+
+    def __repr__(self):
+        return f"<emulator Reference {self.path}>"
+
+
+class Query:
+    def __init__(self, ref, order_by, child_path=None):
+        self._ref = ref
+        self._order_by = order_by
+        self._child_segments = _segments(child_path)
+        self._start = self._end = None
+        self._has_start = self._has_end = False
+        self._limit_first = self._limit_last = None
+
+    def start_at(self, start):
+        self._start, self._has_start = start, True
+        return self
+
+    def end_at(self, end):
+        self._end, self._has_end = end, True
+        return self
+
+    def equal_to(self, value):
+        return self.start_at(value).end_at(value)
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def _sort_value(self, key, value):
+        if self._order_by == "key":
+            return key
+        if self._order_by == "value":
+            return value
+        for seg in self._child_segments:
+            value = value.get(seg) if isinstance(value, dict) else None
+        return value
+
+    def _sort_key(self, key, value):
+        if self._order_by == "key":
+            return (_key_order(key),)
+        return (_value_order(self._sort_value(key, value)), _key_order(key))
+
+    def get(self):
+        self._ref._db._round_trip("query", self._ref.path)
+        data = self._ref._db.get(self._ref.path)
+        if isinstance(data, list):
+            data = {str(i): v for i, v in enumerate(data) if v is not None}
+        if not isinstance(data, dict):
+            return data
+
+        items = sorted(data.items(), key=lambda kv: self._sort_key(*kv))
+        if self._has_start or self._has_end:
+            bound = _key_order if self._order_by == "key" else _value_order
+            items = [
+                (k, v) for k, v in items
+                if (not self._has_start or bound(self._sort_value(k, v)) >= bound(self._start))
+                and (not self._has_end or bound(self._sort_value(k, v)) <= bound(self._end))
+            ]
+        if self._limit_first is not None:
+            items = items[:self._limit_first]
+        if self._limit_last is not None:
+            items = items[-self._limit_last:] if self._limit_last else []
+        return OrderedDict(items)
+
+
+class _EmulatorApp:
+    name = "[DEFAULT]"
+    project_id = "emulator"
+
+
+def install(database=None, latency=0.0):
+    """Point firebase_admin (credentials, initialize_app, db.reference) at the emulator."""
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    database = database or InMemoryDatabase(latency=latency)
+    db.reference = database.reference
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: _EmulatorApp()
+    return database
+
+
+def install_request_counter(app, database, header="X-Firebase-Round-Trips"):
+    """Count round trips per Flask request; totals go in a response header and database.request_round_trips."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_round_trips():
+        g._round_trips = database.count_round_trips()
+        g._round_trip_counter = g._round_trips.__enter__()
+
+    @app.after_request
+    def _finish_round_trips(response):
+        counter = g.get("_round_trip_counter")
+        if counter is not None:
+            response.headers[header] = str(counter.total)
+            route = request.url_rule.rule if request.url_rule else request.path
+            with database._lock:
+                database.request_round_trips.setdefault(route, []).append(counter.total)
+        return response
+
+    @app.teardown_request
+    def _close_round_trips(exc=None):
+        counting = g.pop("_round_trips", None)
+        if counting is not None:
+            counting.__exit__(None, None, None)
+
+    return app
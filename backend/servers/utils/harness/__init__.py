@@ -0,0 +1,4 @@
+"""
+Local load-test harness: fake upstream services plus a mixed-traffic driver.
+See run.py for usage.
+"""
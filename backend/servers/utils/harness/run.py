@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Boot ai_server and session_server in-process against local fakes and drive
+mixed traffic at them. Nothing leaves the machine: DeepSeek, the Profile
+Manager and the book APIs are served by utils/harness/stubs.py and Firebase
+is the in-memory utils/firebase_emulator.py.
+
+Run from backend/servers:
+    python -m utils.harness.run
+    HARNESS_CONCURRENCY=5,20,50 HARNESS_LLM_MEDIAN=0.8 python -m utils.harness.run
+
+Settings:
+    HARNESS_CONCURRENCY          virtual users per level (default 5,20)
+    HARNESS_REQUESTS_PER_USER    requests each user sends per level (default 10)
+    HARNESS_MIX                  scenario weights, e.g. bs_chat=4,dt_chat=2,recommendations=1,ui_batch=3
+    HARNESS_SEED                 seeds traffic and stub latencies (default 1)
+    HARNESS_LLM_MEDIAN / HARNESS_LLM_SIGMA / HARNESS_LLM_TOKENS / HARNESS_LLM_TOKENS_PER_SECOND
+                                 DeepSeek stub latency model (see stubs.LatencyModel)
+    HARNESS_CANNED               JSON file of canned DeepSeek replies
+    HARNESS_FIREBASE_LATENCY     seconds added to every emulated Firebase round trip (default 0.02)
+    HARNESS_WORKDIR              where the servers write logs/ (default: a temp dir)
+"""
+
+import os
+import sys
+import json
+import random
+import socket
+import logging
+import tempfile
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+from utils.harness import stubs, traffic
+from utils import firebase_emulator
+
+LEVELS = [int(c) for c in os.getenv("HARNESS_CONCURRENCY", "5,20").split(",")]
+REQUESTS_PER_USER = int(os.getenv("HARNESS_REQUESTS_PER_USER", "10"))
+SEED = int(os.getenv("HARNESS_SEED", "1"))
+FIREBASE_LATENCY = float(os.getenv("HARNESS_FIREBASE_LATENCY", "0.02"))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def boot():
+    """Start the stubs, install the emulator, then import and serve both servers."""
+    random.seed(SEED)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    _, deepseek_url = stubs.serve(stubs.deepseek_app())
+    _, profile_manager_url = stubs.serve(stubs.profile_manager_app())
+    _, books_url = stubs.serve(stubs.books_app())
+    session_port = _free_port()
+
+    # Module-level config in the servers reads these at import time
+    os.environ.update({
+        "DEEPSEEK_API_KEY": "harness",
+        "DEEPSEEK_URL": deepseek_url,
+        "LEONARDO_API_KEY": "harness",
+        "GOOGLE_BOOKS_API_KEY": "harness",
+        "GOOGLE_BOOKS_URL": f"{books_url}/books/v1/volumes",
+        "OPENLIBRARY_URL": f"{books_url}/search.json",
+        "PROFILE_MANAGER_URL": f"{profile_manager_url}/api",
+        "SESSION_API_URL": f"http://127.0.0.1:{session_port}",
+        "FIREBASE_SERVICE_ACCOUNT_KEY": "{}",
+    })
+    database = firebase_emulator.install(latency=FIREBASE_LATENCY)
+
+    workdir = os.getenv("HARNESS_WORKDIR") or tempfile.mkdtemp(prefix="gcp-harness-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    import session_server
+    firebase_emulator.install_request_counter(session_server.app, database)
+    stubs.serve(session_server.app, port=session_port)
+    import ai_server
+    firebase_emulator.install_request_counter(ai_server.app, database)
+    _, ai_url = stubs.serve(ai_server.app)
+
+    print(f"ai_server {ai_url}, session_server :{session_port}, logs in {workdir}")
+    return ai_url, database
+
+
+def main():
+    mix = traffic.parse_mix(os.getenv("HARNESS_MIX"))
+    ai_url, database = boot()
+
+    results = []
+    for level in LEVELS:
+        wall, rows = traffic.drive(ai_url, level, REQUESTS_PER_USER, mix, seed=SEED)
+        traffic.print_report(level, wall, rows)
+        results.append({"concurrency": level, "wall": wall, "routes": rows})
+
+    from utils.metrics import metrics
+    upstream = {k: v for k, v in metrics.summary().items() if k.startswith("upstream_seconds")}
+    print("\nUpstream latency (all levels):")
+    for name, summary in sorted(upstream.items()):
+        print(f"  {name}: {summary}")
+
+    print("\nFirebase round trips per request (all levels, both servers):")
+    for route, counts in sorted(database.request_round_trips.items()):
+        print(f"  {route:<40} mean={sum(counts) / len(counts):6.1f} max={max(counts):4d} n={len(counts)}")
+    print(f"  total by operation: {database.round_trips.by_op}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Local stand-ins for the services the Flask servers call over HTTP.
+
+  deepseek_app        - OpenAI-compatible /chat/completions with lognormal
+                        latency, a token-count range and canned replies
+  profile_manager_app - the Profile Manager /api routes chat_utils uses
+  books_app           - Google Books /books/v1/volumes and Open Library
+                        /search.json answering from a fixed fixture
+
+serve(app) runs any of them (or ai_server / session_server) on a free local
+port in a daemon thread and returns the base URL.
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import threading
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+CANNED_PATH = os.path.join(os.path.dirname(__file__), "canned_responses.json")
+
+
+def serve(app, host="127.0.0.1", port=0):
+    """Serve a WSGI app in a background thread; returns (server, base_url)."""
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name=f"harness-{app.name}", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+# ----------- DEEPSEEK -----------
+
+class LatencyModel:
+    """
+    Time to first token is lognormal (median, sigma); the rest of the reply
+    streams at tokens_per_second. Completion length is uniform in tokens.
+    """
+
+    def __init__(self, median=1.5, sigma=0.4, tokens=(80, 400), tokens_per_second=0.0):
+        self.median = median
+        self.sigma = sigma
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+
+    @classmethod
+    def from_env(cls):
+        low, _, high = os.getenv("HARNESS_LLM_TOKENS", "80-400").partition("-")
+        return cls(
+            median=float(os.getenv("HARNESS_LLM_MEDIAN", "1.5")),
+            sigma=float(os.getenv("HARNESS_LLM_SIGMA", "0.4")),
+            tokens=(int(low), int(high or low)),
+            tokens_per_second=float(os.getenv("HARNESS_LLM_TOKENS_PER_SECOND", "0")),
+        )
+
+    def sample(self):
+        completion_tokens = random.randint(*self.tokens)
+        delay = random.lognormvariate(math.log(self.median), self.sigma) if self.median > 0 else 0.0
+        if self.tokens_per_second > 0:
+            delay += completion_tokens / self.tokens_per_second
+        return delay, completion_tokens
+
+
+def _load_canned(path):
+    with open(path, "r", encoding="utf-8") as f:
+        canned = json.load(f)
+
+    def as_text(content):
+        return content if isinstance(content, str) else json.dumps(content)
+
+    rules = [(r["match"].lower(), as_text(r["content"])) for r in canned.get("responses", [])]
+    return rules, as_text(canned.get("default", ""))
+
+
+def deepseek_app(latency=None, canned_path=None):
+    app = Flask("deepseek_stub")
+    latency = latency or LatencyModel.from_env()
+    rules, default = _load_canned(canned_path or os.getenv("HARNESS_CANNED", CANNED_PATH))
+    # Repeated prefixes count as cache hits, like DeepSeek's prefix cache
+    seen_prefixes = set()
+    stats = {"calls": 0}
+    lock = threading.Lock()
+
+    @app.route("/chat/completions", methods=["POST"])
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def completions():
+        body = request.get_json(force=True) or {}
+        messages = body.get("messages", [])
+        text = "\n".join(str(m.get("content", "")) for m in messages)
+        lowered = text.lower()
+        content = next((reply for match, reply in rules if match in lowered), default)
+
+        prompt_tokens = max(1, len(text) // 4)
+        prefix = hashlib.sha1(str(messages[:1]).encode()).hexdigest()
+        with lock:
+            hit_tokens = min(prompt_tokens, len(str(messages[:1])) // 4) if prefix in seen_prefixes else 0
+            seen_prefixes.add(prefix)
+            stats["calls"] += 1
+
+        delay, completion_tokens = latency.sample()
+        time.sleep(delay)
+
+        return jsonify({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "deepseek-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_cache_hit_tokens": hit_tokens,
+                "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+            },
+        })
+
+    @app.route("/stats", methods=["GET"])
+    def stub_stats():
+        return jsonify(stats)
+
+    return app
+
+
+# ----------- PROFILE MANAGER -----------
+
+def profile_manager_app(latency=0.05):
+    """Empty story profiles; every staged change is accepted."""
+    app = Flask("profile_manager_stub")
+
+    @app.route("/api/batch", methods=["POST"])
+    def batch():
+        time.sleep(latency)
+        body = request.get_json(force=True) or {}
+        return jsonify({"results": [{"data": []} for _ in body.get("requests", [])]})
+
+    @app.route("/api/stage-change", methods=["POST"])
+    def stage_change():
+        time.sleep(latency)
+        return jsonify({"success": True, "changeId": uuid.uuid4().hex[:12]})
+
+    @app.route("/api/<path:entity>", methods=["GET"])
+    def entities(entity):
+        time.sleep(latency)
+        return jsonify([])
+
+    return app
+
+
+# ----------- BOOKS -----------
+
+FIXTURE_BOOKS = [
+    ("The Clockwork Heir", "R. Vance", "fantasy", 2019),
+    ("Lanterns Over Saltmere", "J. Okafor", "fantasy", 2021),
+    ("The Keeper's Daughter", "M. Lindqvist", "young adult fiction", 2016),
+    ("Brass and Tide", "A. Moreno", "science fiction", 2018),
+    ("A Map of Quiet Storms", "S. Patel", "coming of age", 2020),
+    ("The Gearwright's Apprentice", "T. Nakamura", "steampunk", 2015),
+    ("Ninefold Light", "E. Castellanos", "fantasy", 2022),
+    ("What the Fog Remembers", "H. Adeyemi", "mystery", 2017),
+    ("Copper Wings", "L. Brennan", "adventure", 2013),
+    ("The Last Signal Fire", "C. Duarte", "historical fiction", 2012),
+    ("Under the Iron Moon", "P. Sørensen", "fantasy", 2023),
+    ("Salt, Smoke and Starlight", "N. Haddad", "young adult fiction", 2019),
+]
+
+
+def _book_id(title):
+    return hashlib.md5(title.encode()).hexdigest()[:10]
+
+
+def books_app(latency=0.15):
+    """The same fixture books for every query, in a query-dependent order."""
+    app = Flask("books_stub")
+
+    def shuffled(query):
+        books = list(FIXTURE_BOOKS)
+        random.Random(query).shuffle(books)
+        return books
+
+    @app.route("/books/v1/volumes", methods=["GET"])
+    def google_books():
+        time.sleep(latency)
+        limit = int(request.args.get("maxResults", 10))
+        return jsonify({"items": [
+            {
+                "id": f"gb_{_book_id(title)}",
+                "volumeInfo": {
+                    "title": title,
+                    "authors": [author],
+                    "description": f"A {category} novel.",
+                    "categories": [category.title()],
+                    "averageRating": 4.0,
+                    "publishedDate": str(year),
+                    "imageLinks": {"thumbnail": ""},
+                },
+            }
+            for title, author, category, year in shuffled(request.args.get("q", ""))[:limit]
+        ]})
+
+    @app.route("/search.json", methods=["GET"])
+    def open_library():
+        time.sleep(latency)
+        limit = int(request.args.get("limit", 10))
+        return jsonify({"docs": [
+            {
+                "key": f"/works/OL{_book_id(title)}W",
+                "title": title,
+                "author_name": [author],
+                "first_publish_year": year,
+                "subject": [category, "Juvenile fiction"],
+                "ratings_average": 3.9,
+            }
+            for title, author, category, year in shuffled(request.args.get("q", ""))[:limit]
+        ]})
+
+    return app
@@ -0,0 +1,161 @@
+"""
+Mixed-traffic driver for the harness.
+
+Each virtual user loops over scenarios drawn from a weighted mix:
+  bs_chat          - brainstorming turn (keeps its session across turns)
+  dt_chat          - deep-thinking turn
+  recommendations  - book recommendations for the user's brainstorming session
+  ui_batch         - a batch of story-map UI interaction logs
+
+Latencies are collected per route and summarized with percentiles.
+"""
+
+import time
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.load_test_serving import percentile
+
+USER_MESSAGES = [
+    "I want to write about a girl who keeps a lighthouse that runs on clockwork.",
+    "Her father disappeared and left her a key she can't place.",
+    "What if the lighthouse beam could show people's memories?",
+    "I'm stuck on why the villain wants the lighthouse.",
+    "Maybe the clockmaker who mentors her is hiding something.",
+]
+
+DEFAULT_MIX = {"bs_chat": 4, "dt_chat": 2, "recommendations": 1, "ui_batch": 3}
+
+
+def parse_mix(spec):
+    """"bs_chat=4,ui_batch=3" -> {"bs_chat": 4.0, "ui_batch": 3.0}"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unknown scenario {name.strip()!r}; expected one of {list(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    def __init__(self, index, base_url, rng, timeout):
+        self.user_id = f"harness-user-{index:04d}"
+        self.base_url = base_url
+        self.rng = rng
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.sessions = {}
+
+    def _post(self, path, body):
+        return self.http.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+
+    def chat(self, mode):
+        path = "/chat/brainstorming" if mode == "bs" else "/chat/deepthinking"
+        r = self._post(path, {
+            "user_id": self.user_id,
+            "message": self.rng.choice(USER_MESSAGES),
+            "session_id": self.sessions.get(mode),
+        })
+        if r.ok:
+            self.sessions[mode] = r.json().get("session_id") or self.sessions.get(mode)
+        return path, r
+
+    def recommendations(self):
+        if "bs" not in self.sessions:
+            # Recommendations need a conversation to read
+            return self.chat("bs")
+        return "/api/book-recommendations", self._post("/api/book-recommendations", {
+            "userId": self.user_id,
+            "sessionId": self.sessions["bs"],
+            "limit": 5,
+        })
+
+    def ui_batch(self):
+        now = int(time.time() * 1000)
+        return "/api/log-ui-batch", self._post("/api/log-ui-batch", {
+            "userId": self.user_id,
+            "feature": "storyMap",
+            "interactions": [
+                {"action": "move_node", "metadata": {"nodeId": f"n{i}"}, "timestamp": now + i}
+                for i in range(self.rng.randint(3, 15))
+            ],
+        })
+
+    def run(self, scenario):
+        if scenario == "bs_chat":
+            return self.chat("bs")
+        if scenario == "dt_chat":
+            return self.chat("dt")
+        if scenario == "recommendations":
+            return self.recommendations()
+        return self.ui_batch()
+
+
+class RouteStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            if ok:
+                self.latencies.setdefault(route, []).append(seconds)
+            else:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, wall):
+        rows = []
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(route, [])
+            rows.append({
+                "route": route,
+                "ok": len(values),
+                "errors": self.errors.get(route, 0),
+                "throughput": len(values) / wall if wall else 0.0,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values) if values else 0.0,
+            })
+        return rows
+
+
+def drive(base_url, concurrency, requests_per_user, mix, seed=0, timeout=120):
+    """Run concurrency virtual users for requests_per_user requests each."""
+    stats = RouteStats()
+    names, weights = zip(*mix.items())
+
+    def user_loop(index):
+        rng = random.Random(seed * 100003 + index)
+        user = VirtualUser(index, base_url, rng, timeout)
+        for _ in range(requests_per_user):
+            scenario = rng.choices(names, weights)[0]
+            start = time.time()
+            try:
+                route, r = user.run(scenario)
+                ok = r.status_code < 500
+            except requests.RequestException:
+                route, ok = scenario, False
+            stats.record(route, time.time() - start, ok)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user_loop, range(concurrency)))
+    wall = time.time() - start
+    return wall, stats.summary(wall)
+
+
+def print_report(concurrency, wall, rows):
+    print(f"\n{concurrency} users, {wall:.1f}s wall")
+    print(f"{'route':<30} {'ok':>6} {'err':>5} {'ok/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in rows:
+        print(
+            f"{r['route']:<30} {r['ok']:>6} {r['errors']:>5} {r['throughput']:>7.2f} "
+            f"{r['p50']:>7.3f}s {r['p95']:>7.3f}s {r['p99']:>7.3f}s {r['max']:>7.3f}s"
+        )
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+load_test_serving.py
+Measures how many upstream-bound requests one server overlaps, to compare
+SERVING_MODE=threads against SERVING_MODE=gevent (see gunicorn.conf.py).
+
+By default every request hits /debug/upstream-wait, which holds the request
+for LOAD_WAIT seconds like a DeepSeek call would (the server must be started
+with LOAD_TEST_PROBES=1 for that route to exist). Set LOAD_PATH and
+LOAD_BODY (a JSON file) to drive a real route such as /chat/brainstorming.
+
+Run the same test against each mode:
+    LOAD_TEST_PROBES=1 SERVING_MODE=threads gunicorn -c gunicorn.conf.py ai_server:app
+    LOAD_TEST_PROBES=1 SERVING_MODE=gevent  gunicorn -c gunicorn.conf.py ai_server:app
+    LOAD_URL=http://localhost:5000 LOAD_CONCURRENCY=10,50,200 python load_test_serving.py
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.getenv("LOAD_URL", "http://localhost:5000")
+LOAD_PATH = os.getenv("LOAD_PATH")
+LOAD_BODY = os.getenv("LOAD_BODY")
+WAIT = float(os.getenv("LOAD_WAIT", "2"))
+LEVELS = [int(c) for c in os.getenv("LOAD_CONCURRENCY", "10,50,200").split(",")]
+REQUESTS_PER_CLIENT = int(os.getenv("LOAD_REQUESTS_PER_CLIENT", "2"))
+TIMEOUT = float(os.getenv("LOAD_TIMEOUT", "120"))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def make_request(session, body):
+    if LOAD_PATH:
+        return session.post(f"{BASE_URL}{LOAD_PATH}", json=body, timeout=TIMEOUT)
+    return session.get(f"{BASE_URL}/debug/upstream-wait", params={"seconds": WAIT}, timeout=TIMEOUT)
+
+
+def run_level(concurrency, body):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    local = threading.local()
+
+    def client(_):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        for _ in range(REQUESTS_PER_CLIENT):
+            start = time.time()
+            try:
+                r = make_request(local.session, body)
+                ok = r.status_code < 500
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.time() - start)
+                else:
+                    errors[0] += 1
+
+    requests.get(f"{BASE_URL}/debug/serving", params={"reset": 1}, timeout=10)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.time() - start
+    server = requests.get(f"{BASE_URL}/debug/serving", timeout=10).json()
+
+    total = concurrency * REQUESTS_PER_CLIENT
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors[0],
+        "wall": wall,
+        "throughput": (total - errors[0]) / wall if wall else 0.0,
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+        "p95": percentile(latencies, 95),
+        "server_mode": server.get("mode"),
+        "server_gevent": server.get("gevent"),
+        # Peak for the worker that answered /debug/serving (one of WEB_CONCURRENCY)
+        "server_max_in_flight": server.get("max_in_flight"),
+    }
+
+
+def main():
+    body = None
+    if LOAD_PATH and LOAD_BODY:
+        with open(LOAD_BODY) as f:
+            body = json.load(f)
+    elif LOAD_PATH:
+        print("LOAD_BODY must point to a JSON request body when LOAD_PATH is set")
+        sys.exit(1)
+
+    target = LOAD_PATH or f"/debug/upstream-wait?seconds={WAIT}"
+    print(f"Load testing {BASE_URL}{target}")
+    results = []
+    for level in LEVELS:
+        print(f"  {level} concurrent clients x {REQUESTS_PER_CLIENT} requests...")
+        results.append(run_level(level, body))
+
+    print("\n" + "=" * 78)
+    print(f"{'clients':>7} {'ok/s':>8} {'mean':>8} {'p95':>8} {'errors':>7} {'peak in-flight':>15} {'mode':>8}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>7} {r['throughput']:>8.2f} {r['mean']:>7.2f}s {r['p95']:>7.2f}s "
+            f"{r['errors']:>7} {r['server_max_in_flight']:>15} {r['server_mode']:>8}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Asynchronous, sampled logging for the Flask servers.
+
+install() moves every handler already attached to a named logger behind a
+single queue: request threads only enqueue the LogRecord (message
+formatting and disk writes happen on one background writer thread), and
+verbose loggers can be sampled and rate-limited at DEBUG:
+
+    LOG_DEBUG_SAMPLE="BS_CFM=0.2,utils.chat.chat_utils=0.5"   # keep 20% / 50%
+    LOG_DEBUG_RATE=200                                         # max DEBUG lines/s per logger
+
+INFO and above are never sampled. Large payloads (raw API responses, full
+LLM replies, request bodies) go through log_payload(), which only logs when
+payload logging is on for the current request (X-Debug-Log: 1 header or
+?debugLog=1, see install_request_flag) or globally via LOG_PAYLOADS=1. The
+payload is serialized lazily on the writer thread.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+import contextvars
+
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1").lower() in ("1", "true", "yes")
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0").lower() in ("1", "true", "yes")
+LOG_DEBUG_RATE = int(os.getenv("LOG_DEBUG_RATE", "200"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "4000"))
+
+
+def _parse_samples(spec):
+    samples = {}
+    for part in (spec or "").split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            samples[name.strip()] = float(rate)
+    return samples
+
+
+LOG_DEBUG_SAMPLE = _parse_samples(os.getenv("LOG_DEBUG_SAMPLE", ""))
+
+_payload_flag = contextvars.ContextVar("log_payloads", default=False)
+
+
+# ----------- LAZY FORMATTING -----------
+
+class LazyJSON:
+    """Serialized only when the record is formatted (on the writer thread)."""
+
+    __slots__ = ("obj", "indent", "limit")
+
+    def __init__(self, obj, indent=None, limit=PAYLOAD_MAX_CHARS):
+        self.obj = obj
+        self.indent = indent
+        self.limit = limit
+
+    def __str__(self):
+        try:
+            text = json.dumps(self.obj, indent=self.indent, default=str)
+        except Exception as e:
+            # The object may be mutated by the request thread while we serialize
+            text = f"<payload not serializable: {e}>"
+        if self.limit and len(text) > self.limit:
+            text = f"{text[:self.limit]}... [{len(text) - self.limit} more chars]"
+        return text
+
+
+def payloads_enabled():
+    return LOG_PAYLOADS or _payload_flag.get()
+
+
+def log_payload(log, label, payload, level=logging.DEBUG, indent=None):
+    """Log a large payload only when payload logging is enabled for this request."""
+    if payloads_enabled() and log.isEnabledFor(level):
+        log.log(level, "%s: %s", label, LazyJSON(payload, indent=indent))
+
+
+def install_request_flag(app):
+    """Turn on payload logging for requests that ask for it."""
+    from flask import request
+
+    @app.before_request
+    def _set_payload_flag():
+        enabled = (
+            request.headers.get("X-Debug-Log") == "1"
+            or request.args.get("debugLog") == "1"
+        )
+        _payload_flag.set(enabled)
+
+    return app
+
+
+# ----------- SAMPLING -----------
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of DEBUG records and caps DEBUG records per second."""
+
+    def __init__(self, sample_rate=1.0, max_per_second=LOG_DEBUG_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._window = 0
+        self._count = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        if self.max_per_second:
+            now = int(time.time())
+            with self._lock:
+                if now != self._window:
+                    self._window, self._count = now, 0
+                self._count += 1
+                if self._count > self.max_per_second:
+                    self.dropped += 1
+                    return False
+        return True
+
+
+# ----------- QUEUE PIPELINE -----------
+
+class _DeferredQueueHandler(logging.Handler):
+    """
+    Stands in for a logger's original handlers: emit() only enqueues the
+    record with those handlers. Unlike logging.handlers.QueueHandler, msg/args
+    are not merged here, so formatting also happens on the writer thread.
+    """
+
+    def __init__(self, pipeline, targets):
+        super().__init__(min(h.level for h in targets))
+        self.pipeline = pipeline
+        self.targets = targets
+
+    def emit(self, record):
+        if record.exc_info and not record.exc_text:
+            # Tracebacks must be captured while the frame is still alive
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        try:
+            self.pipeline.queue.put_nowait((self.targets, record))
+        except queue.Full:
+            self.pipeline.queue_full += 1
+
+
+class _Pipeline:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.loggers = {}
+        self.queue_full = 0
+        self.written = 0
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def attach(self, log):
+        """Move a logger's handlers onto the writer thread."""
+        moved = [h for h in log.handlers if not isinstance(h, _DeferredQueueHandler)]
+        if not moved:
+            return False
+        for h in moved:
+            log.removeHandler(h)
+        log.addHandler(_DeferredQueueHandler(self, moved))
+
+        if log.name not in self.loggers:
+            sampling = SamplingFilter(LOG_DEBUG_SAMPLE.get(log.name, 1.0))
+            log.addFilter(sampling)
+            self.loggers[log.name] = sampling
+        return True
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            targets, record = item
+            for handler in targets:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+            self.written += 1
+
+    def start(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write, name="log-writer", daemon=True)
+            self._writer.start()
+
+    def stop(self, timeout=5):
+        """Flush what's queued (called at exit)."""
+        if self._writer is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._writer.join(timeout)
+        self._writer = None
+
+
+_pipeline = _Pipeline()
+atexit.register(_pipeline.stop)
+
+
+def install(loggers=None):
+    """
+    Put every logger that has its own handlers behind the async queue.
+    Safe to call again after more modules have configured their loggers.
+    """
+    if not LOG_ASYNC:
+        return 0
+    with _pipeline._lock:
+        if loggers is None:
+            loggers = [
+                l for l in logging.Logger.manager.loggerDict.values()
+                if isinstance(l, logging.Logger) and l.handlers
+            ]
+        attached = sum(1 for log in loggers if _pipeline.attach(log))
+        if attached:
+            _pipeline.start()
+        return attached
+
+
+def stats():
+    return {
+        "async": LOG_ASYNC and _pipeline._writer is not None,
+        "queued": _pipeline.queue.qsize(),
+        "written": _pipeline.written,
+        "queue_full_drops": _pipeline.queue_full,
+        "payloads_global": LOG_PAYLOADS,
+        "loggers": {
+            name: {"sample_rate": f.sample_rate, "dropped": f.dropped}
+            for name, f in _pipeline.loggers.items()
+        },
+    }
@@ -0,0 +1,76 @@
+"""
+Shared, content-addressed store for /api/mentor-text/analyze results.
+
+A mentor-text analysis depends only on the excerpt, genre and focus (and
+the system prompt), not on who asked for it, so when a class pastes the
+same published passage the first analysis is reused for everyone else.
+Entries are keyed by analysis_key(): the excerpt is normalised first
+(Unicode compatibility forms, case, punctuation and whitespace dropped), so
+copies that differ only in curly vs straight quotes, line wrapping or
+trailing punctuation map to the same entry.
+
+The route checks an in-process/SQLite cache (utils.cache.make_cache) first
+and the Firebase copy at mentorTextAnalysisCache/{key} second. Only
+analyses that pass validate_analysis_output() are stored.
+"""
+
+import os
+import re
+import json
+import hashlib
+import unicodedata
+
+MENTOR_TEXT_STORE_PATH = "mentorTextAnalysisCache"
+MENTOR_TEXT_STORE_TTL = int(os.getenv("MENTOR_TEXT_STORE_TTL", str(30 * 24 * 3600)))
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_excerpt(excerpt):
+    """Lowercased words of the excerpt, single-spaced, with punctuation removed."""
+    text = unicodedata.normalize("NFKC", excerpt).casefold()
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def _setting(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def analysis_key(excerpt, genre, focus, system_prompt):
+    """
+    Store key for an analysis request. A prefix of the system prompt's hash
+    is included so that editing the prompt stops old entries from matching.
+    """
+    prompt_version = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:8]
+    payload = json.dumps(
+        [normalize_excerpt(excerpt), _setting(genre), _setting(focus), prompt_version],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def shareable(result):
+    """The analysis without per-request fields, as stored for other users."""
+    return {k: v for k, v in result.items() if k not in ("metadata", "_validationWarning")}
+
+
+def to_record(result, validation, now_ms):
+    # Stored as JSON strings: RTDB drops empty lists and rejects some key characters
+    return {
+        'analysis': json.dumps(shareable(result)),
+        'validation': json.dumps(validation),
+        'createdAt': now_ms,
+    }
+
+
+def from_record(record, now_ms):
+    """(analysis, validation) from a stored record, or None if missing, expired or unreadable."""
+    if not isinstance(record, dict):
+        return None
+    created = record.get("createdAt") or 0
+    if now_ms - created > MENTOR_TEXT_STORE_TTL * 1000:
+        return None
+    try:
+        return json.loads(record["analysis"]), json.loads(record["validation"])
+    except (KeyError, TypeError, ValueError):
+        return None
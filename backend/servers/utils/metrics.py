@@ -0,0 +1,238 @@
+"""
+In-process request metrics with a Prometheus text endpoint.
+
+  - request_seconds{route,method,status}: one observation per Flask request
+  - phase_seconds{route,phase}: named phases inside a request (session_init,
+    llm, parse, actions, persist, ...) via span() or observe_phase()
+  - upstream_seconds{dependency} / upstream_calls_total{dependency,outcome}:
+    calls to DeepSeek, the Session API, the Profile Manager, Google Books...
+    via upstream()
+
+Latencies go into log-bucketed (HDR-style) histograms: each power of two is
+split into SUB_BUCKETS buckets, so quantiles are within ~5% at any scale
+without configuring bucket bounds. /metrics exposes every histogram as a
+Prometheus summary (p50/p95/p99, _sum, _count) and counters as counters.
+"""
+
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+SUB_BUCKETS = 8
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_route = contextvars.ContextVar("metrics_route", default="unknown")
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(value):
+        if value <= 0:
+            return None
+        return math.floor(math.log2(value) * SUB_BUCKETS)
+
+    def observe(self, value):
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        # None (zero/negative observations) sorts first
+        for index in sorted(self.buckets, key=lambda i: -math.inf if i is None else i):
+            seen += self.buckets[index]
+            if seen >= rank:
+                if index is None:
+                    return 0.0
+                # Geometric midpoint of the bucket, clamped to what was actually seen
+                return min(max(2 ** ((index + 0.5) / SUB_BUCKETS), self.min), self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms = {}   # (name, labels) -> Histogram
+        self._counters = {}     # (name, labels) -> float
+        self._help = {}
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, value, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    # ----------- EXPORT -----------
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for k, v in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {k: (h.count, h.sum, [h.quantile(q) for q in QUANTILES])
+                          for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        by_name = {}
+        for (name, labels), data in histograms.items():
+            by_name.setdefault(name, []).append((labels, data))
+        for name in sorted(by_name):
+            full = f"{self.namespace}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} summary")
+            for labels, (count, total, quantiles) in sorted(by_name[name]):
+                for q, value in zip(QUANTILES, quantiles):
+                    lines.append(f"{full}{self._format_labels(labels, [('quantile', str(q))])} {value:.6f}")
+                lines.append(f"{full}_sum{self._format_labels(labels)} {total:.6f}")
+                lines.append(f"{full}_count{self._format_labels(labels)} {count}")
+
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            full = f"{self.namespace}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} counter")
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{full}{self._format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """JSON-friendly p50/p95/p99 per histogram (for debug endpoints)."""
+        with self._lock:
+            return {
+                f"{name}{dict(labels)}": {
+                    "count": h.count,
+                    **{f"p{int(q * 100)}": round(h.quantile(q), 4) for q in QUANTILES},
+                }
+                for (name, labels), h in self._histograms.items()
+            }
+
+
+metrics = MetricsRegistry("gcp")
+metrics.describe("request_seconds", "Request latency by route")
+metrics.describe("phase_seconds", "Latency of named phases within a request")
+metrics.describe("upstream_seconds", "Latency of calls to upstream dependencies")
+metrics.describe("upstream_calls_total", "Upstream calls by dependency and outcome")
+metrics.describe("requests_total", "Requests by route and status")
+
+
+# ----------- HELPERS -----------
+
+def current_route():
+    return _current_route.get()
+
+
+def observe_phase(phase, seconds, route=None):
+    metrics.observe("phase_seconds", seconds, route=route or current_route(), phase=phase)
+
+
+@contextmanager
+def span(phase, route=None):
+    """Time a block as a named phase of the current request."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        observe_phase(phase, time.time() - start, route)
+
+
+@contextmanager
+def upstream(dependency):
+    """Time and count a call to an upstream dependency."""
+    start = time.time()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        metrics.observe("upstream_seconds", time.time() - start, dependency=dependency)
+        metrics.inc("upstream_calls_total", dependency=dependency, outcome=outcome)
+
+
+def instrument_session(session, dependency):
+    """
+    Count and time every response from a requests.Session (uses
+    response.elapsed). dependency is a name or a callable(response) -> name.
+    Connection errors raise before a response exists and are not counted.
+    """
+    def hook(response, *args, **kwargs):
+        name = dependency(response) if callable(dependency) else dependency
+        metrics.observe("upstream_seconds", response.elapsed.total_seconds(), dependency=name)
+        metrics.inc("upstream_calls_total", dependency=name,
+                    outcome="ok" if response.status_code < 500 else "error")
+        return response
+
+    session.hooks.setdefault("response", []).append(hook)
+    return session
+
+
+def instrument(app):
+    """Record request latency per route and serve GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.time()
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        _current_route.set(rule)
+
+    @app.after_request
+    def _metrics_finish(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None and request.path != "/metrics":
+            route = current_route()
+            metrics.observe("request_seconds", time.time() - start,
+                            route=route, method=request.method, status=response.status_code)
+            metrics.inc("requests_total", route=route, status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return app
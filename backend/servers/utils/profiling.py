@@ -0,0 +1,229 @@
+"""
+On-demand request profiling.
+
+A request is profiled when either
+  - it carries X-Profile: <PROFILE_TOKEN> (admin only; ignored if PROFILE_TOKEN is unset), or
+  - it hits one of PROFILE_ROUTES and wins a PROFILE_SAMPLE_RATE coin flip.
+
+The request thread runs under cProfile with tracemalloc tracing, and the top
+functions (by cumulative time), the allocation sites still holding memory
+when the response is built, and the peak traced memory are kept in a ring buffer
+of the last PROFILE_BUFFER profiles, served at /debug/profiles to requests
+carrying the X-Profile token (always 403 when PROFILE_TOKEN is unset). The
+profiled response carries X-Profile-Id.
+
+Only one request is profiled at a time per worker: cProfile and tracemalloc
+are process-wide, and overlapping runs would mix their numbers. Work that the
+request hands to other threads (TurnExecutor fan-out, background queues) is
+not captured by cProfile, though its allocations show up in tracemalloc.
+
+When neither trigger is configured, install_profiling() registers no request
+hooks at all, so disabled profiling costs nothing.
+"""
+
+import os
+import hmac
+import time
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import deque
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROUTES = [
+    r.strip() for r in os.getenv(
+        "PROFILE_ROUTES", "/api/story-map/analyze,/api/book-recommendations"
+    ).split(",") if r.strip()
+]
+PROFILE_BUFFER = int(os.getenv("PROFILE_BUFFER", "20"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+
+def _token_matches(value):
+    return bool(PROFILE_TOKEN) and bool(value) and hmac.compare_digest(value, PROFILE_TOKEN)
+
+
+class _ActiveProfile:
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.profiler = cProfile.Profile()
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+
+    def start(self):
+        if self.owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.time() - self.started_at
+        self.snapshot = tracemalloc.take_snapshot()
+        _, self.peak = tracemalloc.get_traced_memory()
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+
+
+class ProfileStore:
+    def __init__(self, maxlen=PROFILE_BUFFER):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=maxlen)
+        self._next_id = 1
+        self._busy = threading.Lock()
+        self.skipped_busy = 0
+
+    # ----------- CAPTURE -----------
+
+    def begin(self, trigger):
+        """Start profiling the current thread, or return None if another profile is running."""
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        active = _ActiveProfile(trigger)
+        try:
+            active.start()
+        except Exception:
+            self._busy.release()
+            raise
+        return active
+
+    def end(self, active, **request_info):
+        try:
+            active.stop()
+        finally:
+            self._busy.release()
+
+        with self._lock:
+            profile_id = self._next_id
+            self._next_id += 1
+        self._profiles.append({
+            "id": profile_id,
+            "trigger": active.trigger,
+            "startedAt": int(active.started_at * 1000),
+            "duration": round(active.duration, 4),
+            "peakMemoryKb": round(active.peak / 1024, 1),
+            **request_info,
+            "functions": self._top_functions(active.profiler),
+            "allocations": self._top_allocations(active.snapshot),
+        })
+        return profile_id
+
+    @staticmethod
+    def _top_functions(profiler):
+        stats = pstats.Stats(profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_N]
+        return [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({func})" if line else func,
+                "calls": ncalls,
+                "selfTime": round(tottime, 4),
+                "cumulativeTime": round(cumtime, 4),
+            }
+            for (filename, line, func), (_, ncalls, tottime, cumtime, _) in rows
+        ]
+
+    @staticmethod
+    def _top_allocations(snapshot):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats = snapshot.statistics("lineno")[:PROFILE_TOP_N]
+        return [
+            {
+                "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "sizeKb": round(stat.size / 1024, 1),
+                "blocks": stat.count,
+            }
+            for stat in stats
+        ]
+
+    # ----------- READ -----------
+
+    def list(self):
+        return [
+            {k: v for k, v in p.items() if k not in ("functions", "allocations")}
+            for p in reversed(self._profiles)
+        ]
+
+    def get(self, profile_id):
+        for p in self._profiles:
+            if p["id"] == profile_id:
+                return p
+        return None
+
+
+profiles = ProfileStore()
+
+
+def _trigger_for(request):
+    if _token_matches(request.headers.get("X-Profile")):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and request.url_rule is not None \
+            and request.url_rule.rule in PROFILE_ROUTES \
+            and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def install_profiling(app):
+    """Register the profiling hooks (only if a trigger is configured) and /debug/profiles."""
+    from flask import g, request, jsonify
+
+    if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+        @app.before_request
+        def _profile_start():
+            trigger = _trigger_for(request)
+            if trigger:
+                g._profile = profiles.begin(trigger)
+
+        @app.after_request
+        def _profile_finish(response):
+            active = g.pop("_profile", None)
+            if active is not None:
+                profile_id = profiles.end(
+                    active,
+                    route=request.url_rule.rule if request.url_rule else request.path,
+                    method=request.method,
+                    status=response.status_code,
+                )
+                response.headers["X-Profile-Id"] = str(profile_id)
+            return response
+
+        @app.teardown_request
+        def _profile_abort(exc=None):
+            # after_request is skipped when the view raises; never leave the profiler running
+            active = g.pop("_profile", None)
+            if active is not None:
+                profiles.end(active, route=request.path, method=request.method, status=500)
+
+    @app.route("/debug/profiles", methods=["GET"])
+    @app.route("/debug/profiles/<int:profile_id>", methods=["GET"])
+    def debug_profiles(profile_id=None):
+        """Recent request profiles (?id or /<id> for one profile's frames and allocation sites)."""
+        # Profiles expose routes, timings and code paths: always admin only, so
+        # sampling without a PROFILE_TOKEN collects profiles nobody can read here
+        if not _token_matches(request.headers.get("X-Profile")):
+            return jsonify({"error": "forbidden"}), 403
+        if profile_id is None and request.args.get("id"):
+            profile_id = int(request.args["id"])
+        if profile_id is not None:
+            profile = profiles.get(profile_id)
+            if profile is None:
+                return jsonify({"error": "profile not found"}), 404
+            return jsonify(profile), 200
+        return jsonify({
+            "enabled": bool(PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0),
+            "sampleRate": PROFILE_SAMPLE_RATE,
+            "routes": PROFILE_ROUTES,
+            "skippedBusy": profiles.skipped_busy,
+            "profiles": profiles.list(),
+        }), 200
+
+    return app
@@ -0,0 +1,202 @@
+"""
+Prefix-stable prompt assembly for DeepSeek context caching.
+
+DeepSeek caches the longest common prefix of recent requests and reports how
+much of each prompt was served from that cache (`prompt_cache_hit_tokens` /
+`prompt_cache_miss_tokens` on the response usage). A prefix only matches if
+every earlier token is identical, so anything that changes per turn must come
+after everything that doesn't.
+
+PromptLayout enforces that ordering:
+    static       -> long system prompts (identical across users and turns)
+    semi_static  -> conversation history (append-only within a session)
+    volatile     -> per-turn snapshots, candidate lists, instructions
+    user         -> the current user message, always last
+
+cached_completion() wraps client.chat.completions.create and records cache
+usage per route so hit rates can be inspected at /api/debug/prompt-cache.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import upstream
+
+logger = logging.getLogger(__name__)
+
+STATIC = "static"
+SEMI_STATIC = "semi_static"
+VOLATILE = "volatile"
+
+_TIER_ORDER = (STATIC, SEMI_STATIC, VOLATILE)
+
+
+class PromptLayout:
+    """
+    Collects prompt messages by stability tier and emits them in
+    static -> semi-static -> volatile -> user order, regardless of the
+    order in which they were added.
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self._tiers: Dict[str, List[Dict[str, str]]] = {tier: [] for tier in _TIER_ORDER}
+        self._user: Optional[Dict[str, str]] = None
+
+    def static(self, content: str, role: str = "system") -> "PromptLayout":
+        """Add content that is identical for every request on this route."""
+        self._tiers[STATIC].append({"role": role, "content": content})
+        return self
+
+    def semi_static(self, content: str, role: str = "system") -> "PromptLayout":
+        """Add content that changes rarely (e.g. per session, not per turn)."""
+        self._tiers[SEMI_STATIC].append({"role": role, "content": content})
+        return self
+
+    def history(self, messages: List[Dict[str, Any]]) -> "PromptLayout":
+        """Add prior conversation turns (append-only, so the prefix grows)."""
+        for m in messages or []:
+            role = m.get("role")
+            content = m.get("content")
+            if role in ("user", "assistant", "system") and content:
+                self._tiers[SEMI_STATIC].append({"role": role, "content": content})
+        return self
+
+    def volatile(self, content: str, role: str = "system") -> "PromptLayout":
+        """Add per-turn content; always placed after the cacheable prefix."""
+        self._tiers[VOLATILE].append({"role": role, "content": content})
+        return self
+
+    def user(self, content: str) -> "PromptLayout":
+        """Set the current user message (always the final message)."""
+        self._user = {"role": "user", "content": content}
+        return self
+
+    def build(self) -> List[Dict[str, str]]:
+        messages = []
+        for tier in _TIER_ORDER:
+            messages.extend(self._tiers[tier])
+        if self._user is not None:
+            messages.append(self._user)
+        return messages
+
+
+# ============================================
+# CACHE USAGE TRACKING
+# ============================================
+_stats_lock = threading.Lock()
+_route_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _usage_field(usage: Any, name: str) -> int:
+    """Read a DeepSeek-specific usage field from an OpenAI SDK usage object."""
+    if usage is None:
+        return 0
+    value = getattr(usage, name, None)
+    if value is None:
+        extra = getattr(usage, "model_extra", None) or {}
+        value = extra.get(name)
+    if value is None and isinstance(usage, dict):
+        value = usage.get(name)
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_cache_usage(route: str, response: Any, latency: Optional[float] = None) -> Dict[str, int]:
+    """Record prompt cache hit/miss tokens for one completion response."""
+    usage = getattr(response, "usage", None)
+    hit = _usage_field(usage, "prompt_cache_hit_tokens")
+    miss = _usage_field(usage, "prompt_cache_miss_tokens")
+    if not hit and not miss:
+        # Provider didn't report cache fields; count the whole prompt as a miss
+        miss = _usage_field(usage, "prompt_tokens")
+
+    with _stats_lock:
+        stats = _route_stats.setdefault(route, {
+            "calls": 0,
+            "hit_tokens": 0,
+            "miss_tokens": 0,
+            "full_misses": 0,
+            "total_latency": 0.0,
+        })
+        stats["calls"] += 1
+        stats["hit_tokens"] += hit
+        stats["miss_tokens"] += miss
+        if hit == 0:
+            stats["full_misses"] += 1
+        if latency is not None:
+            stats["total_latency"] += latency
+
+    logger.debug(f"[PROMPT_CACHE] {route}: hit={hit} miss={miss}")
+    return {"hit_tokens": hit, "miss_tokens": miss}
+
+
+class ModelCallError(Exception):
+    """A failed model call, carrying the HTTP status and body fields the route returns."""
+
+    def __init__(self, status: int, error: str, details: str, truncated: bool = False):
+        super().__init__(details)
+        self.status = status
+        self.error = error
+        self.details = details
+        # The response hit max_tokens, so a smaller request may still succeed
+        self.truncated = truncated
+
+
+def cached_completion(client, route: str, messages: List[Dict[str, str]], **kwargs):
+    """
+    Call client.chat.completions.create and record prefix cache usage.
+
+    Accepts the same keyword arguments as the SDK call; `model` defaults
+    to deepseek-chat.
+    """
+    kwargs.setdefault("model", "deepseek-chat")
+    start = time.time()
+    with upstream("deepseek"):
+        response = client.chat.completions.create(messages=messages, **kwargs)
+    try:
+        record_cache_usage(route, response, time.time() - start)
+    except Exception as e:
+        logger.warning(f"[PROMPT_CACHE] Failed to record usage for {route}: {e}")
+    return response
+
+
+def get_prompt_cache_stats() -> Dict[str, Any]:
+    """Per-route prefix cache hit rates plus an overall total."""
+    with _stats_lock:
+        snapshot = {route: dict(stats) for route, stats in _route_stats.items()}
+
+    routes = {}
+    total_hit = total_miss = total_calls = 0
+    for route, stats in sorted(snapshot.items()):
+        hit, miss, calls = stats["hit_tokens"], stats["miss_tokens"], stats["calls"]
+        total_hit += hit
+        total_miss += miss
+        total_calls += calls
+        routes[route] = {
+            "calls": calls,
+            "hit_tokens": hit,
+            "miss_tokens": miss,
+            "hit_rate": round(hit / (hit + miss), 4) if (hit + miss) else 0.0,
+            "full_misses": stats["full_misses"],
+            "avg_latency": round(stats["total_latency"] / calls, 3) if calls else 0.0,
+        }
+
+    return {
+        "routes": routes,
+        "total": {
+            "calls": total_calls,
+            "hit_tokens": total_hit,
+            "miss_tokens": total_miss,
+            "hit_rate": round(total_hit / (total_hit + total_miss), 4) if (total_hit + total_miss) else 0.0,
+        },
+    }
+
+
+def reset_prompt_cache_stats():
+    with _stats_lock:
+        _route_stats.clear()
@@ -12,6 +12,7 @@ from collections import OrderedDict
 import openai
 
 from ..chat.chat_utils import DEEPSEEK_API_KEY
+from ..prompt_cache import cached_completion
 
 logger = logging.getLogger(__name__)
 
@@ -307,7 +308,8 @@ class SubjectMapper:
         prompt = self._build_mapping_prompt(subjects, query_context)
         
         # Call DeepSeek with JSON mode
-        response = self.client.chat.completions.create(
+        response = cached_completion(
+            self.client, "recommendations.subject_map",
             model="deepseek-chat",
             messages=[
                 {
@@ -12,6 +12,7 @@ from prompts.book_explanation_prompt import (
     BOOK_EXPLANATION_SYSTEM_PROMPT,
     build_explanation_user_prompt
 )
+from utils.prompt_cache import cached_completion
 logger = logging.getLogger(__name__)
 
 
@@ -108,7 +109,8 @@ class BookExplanationGenerator:
         prompt = self._build_explanation_prompt(books, story_elements)
         
         # Call DeepSeek
-        response = self.client.chat.completions.create(
+        response = cached_completion(
+            self.client, "recommendations.explain",
             model="deepseek-chat",
             messages=[
                 {
@@ -211,7 +213,8 @@ class BookExplanationGenerator:
         try:
             prompt = self._build_summary_prompt(books, story_elements)
             
-            response = self.client.chat.completions.create(
+            response = cached_completion(
+                self.client, "recommendations.explain",
                 model="deepseek-chat",
                 messages=[
                     {
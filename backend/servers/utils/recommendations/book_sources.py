@@ -10,12 +10,14 @@ import requests
 import time
 from typing import List, Dict, Any
 from .SubjectMapper import SubjectMapper
+from ..log_pipeline import log_payload
+from ..metrics import instrument_session
 
 logger = logging.getLogger("RECOMMENDATIONS")
 
 GOOGLE_BOOKS_API_KEY = os.getenv('GOOGLE_BOOKS_API_KEY')
-GOOGLE_BOOKS_URL = 'https://www.googleapis.com/books/v1/volumes'
-OPENLIBRARY_URL = 'https://openlibrary.org/search.json'
+GOOGLE_BOOKS_URL = os.getenv('GOOGLE_BOOKS_URL', 'https://www.googleapis.com/books/v1/volumes')
+OPENLIBRARY_URL = os.getenv('OPENLIBRARY_URL', 'https://openlibrary.org/search.json')
 
 
 class BookSourceManager:
@@ -44,6 +46,10 @@ class BookSourceManager:
         self.session.headers.update({
             'User-Agent': 'GuidedCreativePlanning/1.0 (Educational Research)'
         })
+        instrument_session(
+            self.session,
+            lambda r: "google_books" if r.url.startswith(GOOGLE_BOOKS_URL) else "open_library"
+        )
     
     def _load_curated_collections(self, path):
         """Load curated collections from file."""
@@ -264,7 +270,7 @@ class BookSourceManager:
                     
                     if query_books:
                         logger.info(f"[GOOGLE] Query {query_idx + 1} succeeded: {len(query_books)} books")
-                        logger.debug(f"[GOOGLE_BOOKS] Raw API response: {json.dumps(query_books, indent=2)}")
+                        log_payload(logger, "[GOOGLE_BOOKS] Raw API response", query_books, indent=2)
                         books.extend(query_books)
                         
                         if len(books) >= limit:
@@ -393,7 +399,7 @@ class BookSourceManager:
                             f"[OPENLIBRARY] Query {query_idx + 1} succeeded: "
                             f"{len(query_books)} books"
                         )
-                        logger.debug(f"[GOOGLE_BOOKS] Raw API response: {json.dumps(query_books, indent=2)}")
+                        log_payload(logger, "[GOOGLE_BOOKS] Raw API response", query_books, indent=2)
                         books.extend(query_books)
                         
                         if len(books) >= limit:
@@ -8,6 +8,7 @@ import json
 import logging
 from typing import List, Dict, Any
 import openai
+from utils.prompt_cache import cached_completion
 
 logger = logging.getLogger(__name__)
 
@@ -78,7 +79,8 @@ class ThemeExtractor:
             
             # Call DeepSeek API
             logger.info("[THEME] Extracting themes from conversation")
-            response = self.client.chat.completions.create(
+            response = cached_completion(
+                self.client, "recommendations.themes",
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": "You are an expert at analyzing creative writing conversations."},
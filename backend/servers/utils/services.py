@@ -0,0 +1,161 @@
+"""
+Lazy service registry and startup timing for the Flask servers.
+
+Heavy subsystems (Firebase, the recommendation pipeline, ...) are registered
+with a factory instead of being built at import time. A service is created
+on first use (get() or attribute access through a LazyService proxy) or by
+warm_up(), which runs in a background thread shortly after startup so the
+port is bound before any slow initialization starts. status() reports
+readiness per subsystem for /health.
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SERVICE_WARMUP = os.getenv("SERVICE_WARMUP", "1").lower() in ("1", "true", "yes")
+SERVICE_WARMUP_DELAY = float(os.getenv("SERVICE_WARMUP_DELAY", "0.5"))
+
+PENDING, INITIALIZING, READY, FAILED = "pending", "initializing", "ready", "failed"
+
+
+class _Service:
+    def __init__(self, name, factory, required):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.lock = threading.Lock()
+        self.instance = None
+        self.state = PENDING
+        self.error = None
+        self.init_seconds = None
+        self.ready_at = None
+
+
+class ServiceRegistry:
+    def __init__(self, log=None):
+        self.log = log or logger
+        self._services = {}
+        self._warmup_thread = None
+
+    def register(self, name, factory, required=False):
+        """factory() builds the service; required services gate overall readiness."""
+        self._services[name] = _Service(name, factory, required)
+        return LazyService(self, name)
+
+    def get(self, name):
+        service = self._services[name]
+        if service.state == READY:
+            return service.instance
+        with service.lock:
+            if service.state != READY:
+                service.state = INITIALIZING
+                start = time.time()
+                try:
+                    service.instance = service.factory()
+                except Exception as e:
+                    service.state = FAILED
+                    service.error = str(e)
+                    service.init_seconds = time.time() - start
+                    self.log.error(f"[SERVICES] {name} failed to initialize: {e}")
+                    raise
+                service.init_seconds = time.time() - start
+                service.ready_at = time.time()
+                service.error = None
+                service.state = READY
+                self.log.info(f"[SERVICES] {name} ready in {service.init_seconds:.3f}s")
+        return service.instance
+
+    def is_ready(self, name):
+        return self._services[name].state == READY
+
+    def warm_up(self, names=None, delay=SERVICE_WARMUP_DELAY):
+        """Initialize services in the background (in registration order by default)."""
+        if self._warmup_thread is not None:
+            return
+        names = list(names or self._services)
+
+        def run():
+            time.sleep(delay)
+            start = time.time()
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # Logged in get(); first use will retry
+            self.log.info(f"[SERVICES] Warm-up finished in {time.time() - start:.3f}s: {self.summary()}")
+
+        self._warmup_thread = threading.Thread(target=run, name="service-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def summary(self):
+        return " ".join(
+            f"{s.name}={s.state}" + (f"({s.init_seconds:.3f}s)" if s.init_seconds is not None else "")
+            for s in self._services.values()
+        )
+
+    def status(self):
+        services = {}
+        for s in self._services.values():
+            services[s.name] = {
+                "state": s.state,
+                "required": s.required,
+                "init_seconds": round(s.init_seconds, 3) if s.init_seconds is not None else None,
+                "error": s.error,
+            }
+        required = [s for s in self._services.values() if s.required]
+        if any(s.state == FAILED for s in required):
+            overall = "degraded"
+        elif all(s.state == READY for s in self._services.values()):
+            overall = "ready"
+        else:
+            overall = "warming"
+        return overall, services
+
+
+class LazyService:
+    """Proxy that resolves the registered service on first attribute access."""
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __repr__(self):
+        return f"<LazyService {self._name}>"
+
+
+class StartupTimer:
+    """Records named phases of module start-up and logs the breakdown once."""
+
+    def __init__(self, label):
+        self.label = label
+        self._start = time.time()
+        self._last = self._start
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.time()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def total(self):
+        return self._last - self._start
+
+    def log(self, log=None):
+        parts = " ".join(f"{name}={secs:.3f}s" for name, secs in self.phases.items())
+        (log or logger).info(f"[STARTUP] {self.label}: {parts} total={self.total():.3f}s")
+
+    def as_dict(self):
+        return {
+            "phases": {name: round(secs, 3) for name, secs in self.phases.items()},
+            "total": round(self.total(), 3),
+        }
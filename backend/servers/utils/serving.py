@@ -0,0 +1,82 @@
+"""
+Serving-mode introspection for the Flask apps.
+
+track_in_flight(app) counts requests that are currently being handled, so a
+load test can see how many upstream waits a worker actually overlaps (a
+handful under thread workers, hundreds under SERVING_MODE=gevent; see
+gunicorn.conf.py).
+"""
+
+import os
+import sys
+import time
+import threading
+
+from flask import g
+
+SERVING_MODE = os.getenv("SERVING_MODE", "threads").lower()
+# Registers /debug/upstream-wait, which holds a worker on purpose; load tests only
+LOAD_TEST_PROBES = os.getenv("LOAD_TEST_PROBES", "0").lower() in ("1", "true", "yes")
+
+
+def gevent_active():
+    """True when the process has been monkey-patched by gevent."""
+    if "gevent" not in sys.modules:
+        return False
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched("socket")
+    except Exception:
+        return False
+
+
+class InFlightTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.started_at = time.time()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.completed += 1
+
+    def reset_peak(self):
+        with self._lock:
+            self.max_in_flight = self.in_flight
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": SERVING_MODE,
+                "gevent": gevent_active(),
+                "pid": os.getpid(),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "completed": self.completed,
+                "uptime": round(time.time() - self.started_at, 1),
+            }
+
+
+tracker = InFlightTracker()
+
+
+def track_in_flight(app):
+    @app.before_request
+    def _start_request():
+        g._in_flight_tracked = True
+        tracker.start()
+
+    @app.teardown_request
+    def _finish_request(exc=None):
+        if g.pop("_in_flight_tracked", False):
+            tracker.finish()
+
+    return app
@@ -0,0 +1,283 @@
+"""
+Denormalized per-user session index for the chat sidebar.
+
+sessionIndex/{uid}/{sessionId} = {
+    title, titleSource, mode, stage, currentCategory, createdAt, updatedAt,
+    messageCount, visibleMessageCount, lastMessagePreview, lastMessageRole
+}
+
+The index is maintained on session create, save_message, stage changes,
+rename / title generation and delete, so /sessions/list can read one small
+node (ordered by updatedAt, paginated) instead of every message of every
+session. Users whose sessions predate the index are backfilled from
+chatSessions/{uid} once, the first time their list is requested.
+"""
+
+import time
+import logging
+import threading
+
+from firebase_admin import db
+
+logger = logging.getLogger(__name__)
+
+INDEX_ROOT = "sessionIndex"
+STATE_ROOT = "sessionIndexState"
+PREVIEW_LENGTH = 120
+
+# Server-side increment (Realtime Database REST sentinel), so concurrent
+# saves don't need a read-modify-write transaction
+_INCREMENT = {".sv": {"increment": 1}}
+
+_backfilled_users = set()
+_backfill_lock = threading.Lock()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _preview(content):
+    text = " ".join(str(content or "").split())
+    if len(text) > PREVIEW_LENGTH:
+        text = text[:PREVIEW_LENGTH - 3] + "..."
+    return text
+
+
+def index_ref(uid, session_id=None):
+    path = f"{INDEX_ROOT}/{uid}"
+    return db.reference(f"{path}/{session_id}" if session_id else path)
+
+
+# ----------- MAINTENANCE -----------
+
+def create_entry(uid, session_id, mode=None, title=None, created_at=None):
+    """Title stays unset until the session is named; each server applies its own default."""
+    now = created_at or _now_ms()
+    index_ref(uid, session_id).set({
+        "title": title,
+        "mode": mode or "brainstorming",
+        "stage": "Clarify" if (mode or "brainstorming") == "brainstorming" else None,
+        "createdAt": now,
+        "updatedAt": now,
+        "messageCount": 0,
+        "visibleMessageCount": 0,
+        "lastMessagePreview": "",
+    })
+
+
+def message_fields(role, mode, content, timestamp=None, visible=True):
+    """Index fields to write alongside a new message (counts use server increments)."""
+    updates = {
+        "updatedAt": timestamp or _now_ms(),
+        "messageCount": _INCREMENT,
+    }
+    if mode:
+        updates["mode"] = mode
+    if visible:
+        updates["visibleMessageCount"] = _INCREMENT
+        updates["lastMessagePreview"] = _preview(content)
+        updates["lastMessageRole"] = role
+    return updates
+
+
+def record_message(uid, session_id, role, mode, content, timestamp=None, visible=True):
+    """Bump counts/updatedAt (and the preview for visible messages) in one write."""
+    index_ref(uid, session_id).update(message_fields(role, mode, content, timestamp, visible))
+
+
+def update_entry(uid, session_id, **fields):
+    """Patch index fields (title, titleSource, stage, ...)."""
+    fields = {k: v for k, v in fields.items() if v is not None}
+    if not fields:
+        return
+    fields.setdefault("updatedAt", _now_ms())
+    index_ref(uid, session_id).update(fields)
+
+
+def remove_entry(uid, session_id):
+    index_ref(uid, session_id).delete()
+
+
+def safe(fn, *args, **kwargs):
+    """Index writes must never fail the request that triggered them."""
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        logger.warning(f"[SESSION_INDEX] {fn.__name__} failed: {e}")
+
+
+# ----------- BACKFILL -----------
+
+def build_entry(session_data):
+    """Build an index entry from a full chatSessions/{uid}/{sid} node."""
+    metadata = session_data.get("metadata", {}) or {}
+    messages = session_data.get("messages", {}) or {}
+    shared = metadata.get("shared", {}) or {}
+
+    message_count = 0
+    visible_count = 0
+    last_ts = 0
+    last_visible = None
+    for msg in messages.values():
+        if not isinstance(msg, dict):
+            continue
+        message_count += 1
+        ts = msg.get("timestamp", 0) or 0
+        last_ts = max(last_ts, ts)
+        if msg.get("visible", True):
+            visible_count += 1
+            if last_visible is None or ts >= (last_visible.get("timestamp", 0) or 0):
+                last_visible = msg
+
+    mode = metadata.get("mode") or session_data.get("currentMode") or "brainstorming"
+    created_at = metadata.get("createdAt") or shared.get("createdAt") or 0
+    updated_at = last_ts or metadata.get("updatedAt") or shared.get("updatedAt") or created_at
+
+    return {
+        "title": metadata.get("title"),
+        "titleSource": metadata.get("titleSource"),
+        "mode": mode,
+        "stage": (metadata.get("brainstorming", {}) or {}).get("stage"),
+        "currentCategory": (metadata.get("deepthinking", {}) or {}).get("currentCategory"),
+        "createdAt": created_at,
+        "updatedAt": updated_at,
+        "messageCount": message_count,
+        "visibleMessageCount": visible_count,
+        "lastMessagePreview": _preview(last_visible.get("content")) if last_visible else "",
+        "lastMessageRole": last_visible.get("role") if last_visible else None,
+    }
+
+
+def ensure_backfilled(uid):
+    """Build the index from chatSessions/{uid} once per user (full read)."""
+    if uid in _backfilled_users:
+        return
+    with _backfill_lock:
+        if uid in _backfilled_users:
+            return
+        state_ref = db.reference(f"{STATE_ROOT}/{uid}")
+        if state_ref.get():
+            _backfilled_users.add(uid)
+            return
+
+        start = time.time()
+        raw = db.reference(f"chatSessions/{uid}").get() or {}
+        entries = {
+            sid: {k: v for k, v in build_entry(data).items() if v is not None}
+            for sid, data in raw.items()
+            if isinstance(data, dict)
+        }
+        # Merge rather than overwrite: live writes may already have created entries
+        existing = index_ref(uid).get() or {}
+        for sid, entry in entries.items():
+            if sid in existing:
+                entry.update({k: v for k, v in existing[sid].items() if k in ("title", "titleSource")})
+        if entries:
+            index_ref(uid).update(entries)
+        state_ref.set({"backfilledAt": _now_ms(), "sessions": len(entries)})
+        _backfilled_users.add(uid)
+        logger.info(f"[SESSION_INDEX] Backfilled {len(entries)} sessions for {uid} in {time.time() - start:.3f}s")
+
+
+def forget_backfill(uid=None):
+    with _backfill_lock:
+        if uid:
+            _backfilled_users.discard(uid)
+        else:
+            _backfilled_users.clear()
+
+
+# ----------- LISTING -----------
+
+class InvalidCursorError(ValueError):
+    """A `before` cursor that wasn't produced by encode_cursor()."""
+
+
+def encode_cursor(entry):
+    return f"{entry['updatedAt']}_{entry['sessionId']}"
+
+
+def _decode_cursor(cursor):
+    updated_at, _, session_id = str(cursor).partition("_")
+    try:
+        updated_at = int(updated_at)
+    except ValueError:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from None
+    if not session_id:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    return updated_at, session_id
+
+
+def parse_limit(value):
+    """Page size from a request body (None for no limit); raises ValueError unless it's a positive integer."""
+    if value is None or value == "":
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1, got {value!r}")
+    return limit
+
+
+def _fetch(uid, count, cursor_ts):
+    """The `count` newest entries (all if None) with updatedAt <= cursor_ts, ordered by (updatedAt, key)."""
+    query = index_ref(uid).order_by_child("updatedAt")
+    if cursor_ts is not None:
+        query = query.end_at(cursor_ts)
+    if count:
+        query = query.limit_to_last(count)
+    try:
+        return query.get() or {}
+    except Exception as e:
+        # Needs ".indexOn": "updatedAt" on sessionIndex/$uid in the database
+        # rules; without it, read the (compact) node and page in Python
+        logger.warning(f"[SESSION_INDEX] Ordered query failed, reading full index: {e}")
+        raw = {
+            sid: entry for sid, entry in (index_ref(uid).get() or {}).items()
+            if isinstance(entry, dict) and (cursor_ts is None or (entry.get("updatedAt") or 0) <= cursor_ts)
+        }
+        if count:
+            newest = sorted(raw, key=lambda sid: (raw[sid].get("updatedAt") or 0, sid))[-count:]
+            raw = {sid: raw[sid] for sid in newest}
+        return raw
+
+
+def list_entries(uid, limit=None, before=None):
+    """
+    Return (entries newest-first, next_cursor). `before` is a cursor from a
+    previous page; next_cursor is None when there are no older sessions.
+    Raises InvalidCursorError for a malformed cursor.
+    """
+    cursor_ts = cursor_sid = None
+    if before:
+        cursor_ts, cursor_sid = _decode_cursor(before)
+
+    ensure_backfilled(uid)
+
+    # The database can only bound the query by updatedAt, so entries at the
+    # cursor's own timestamp that were already listed come back too. They are
+    # the newest results, so when they crowd out the page, fetch again with
+    # room for them; one extra entry tells whether an older page exists.
+    count = limit + 1 if limit else None
+    while True:
+        raw = _fetch(uid, count, cursor_ts)
+        entries = []
+        for sid, entry in raw.items():
+            if not isinstance(entry, dict):
+                continue
+            entry = dict(entry, sessionId=sid)
+            entry.setdefault("updatedAt", 0)
+            if cursor_ts is not None and (entry["updatedAt"], sid) >= (cursor_ts, cursor_sid):
+                continue
+            entries.append(entry)
+        if not count or len(entries) > limit or len(raw) < count:
+            break
+        count = max(count * 2, len(raw) - len(entries) + limit + 1)
+
+    entries.sort(key=lambda e: (e.get("updatedAt") or 0, e["sessionId"]), reverse=True)
+
+    next_cursor = None
+    if limit and len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1])
+    return entries, next_cursor
@@ -0,0 +1,264 @@
+"""
+Per-process fan-out hub for Server-Sent Event streams backed by Firebase.
+
+One db.reference(path).listen() is kept per key (e.g. backgroundTasks/{uid})
+no matter how many tabs subscribe; each event is copied into every
+subscriber's bounded queue. The listener is closed when the last subscriber
+leaves.
+
+stream() yields SSE frames, sends a keep-alive comment every
+SSE_KEEPALIVE_SECONDS, and ends the response after SSE_IDLE_TIMEOUT seconds
+without events (EventSource reconnects on its own). Firebase only sends the
+current value to the listener once, so the hub keeps the key's full value
+up to date from the events and sends it to each later subscriber first.
+
+At most SSE_MAX_PER_KEY streams are kept per key, so stale tabs can't pin
+worker threads. A new stream beyond that evicts the oldest one (usually a
+dead connection whose keep-alive hasn't failed yet): its response ends with
+a retry of SSE_EVICTED_RETRY_SECONDS, so if that tab is still open it comes
+back later instead of immediately evicting the next stream. A hard error
+would stop EventSource from reconnecting at all.
+"""
+
+import os
+import copy
+import json
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+from firebase_admin import db
+
+logger = logging.getLogger(__name__)
+
+SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+SSE_IDLE_TIMEOUT = int(os.getenv("SSE_IDLE_TIMEOUT", "300"))
+SSE_MAX_PER_KEY = int(os.getenv("SSE_MAX_PER_KEY", "3"))
+SSE_EVICTED_RETRY_SECONDS = int(os.getenv("SSE_EVICTED_RETRY_SECONDS", "30"))
+SSE_QUEUE_SIZE = 100
+
+_CLOSE = object()
+_EVICTED = object()
+
+
+class Subscriber:
+    def __init__(self, key):
+        self.key = key
+        self.queue = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.opened_at = time.time()
+        self.dropped = 0
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Slow client: drop the oldest event rather than block the listener
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                pass
+
+    def close(self):
+        self.put(_CLOSE)
+
+    def evict(self):
+        self.put(_EVICTED)
+
+
+def _apply_event(snapshot, event_type, path, data):
+    """The channel's full value after a put/patch event at path (relative to the channel)."""
+    segments = [s for s in (path or "").split("/") if s]
+    if not segments and event_type == "put":
+        return copy.deepcopy(data)
+    root = snapshot if isinstance(snapshot, dict) else {}
+    node = root
+    for seg in segments[:-1] if event_type == "put" else segments:
+        child = node.get(seg)
+        if not isinstance(child, dict):
+            child = node[seg] = {}
+        node = child
+    if event_type == "put":
+        if data is None:
+            node.pop(segments[-1], None)
+        else:
+            node[segments[-1]] = copy.deepcopy(data)
+    else:
+        for k, v in (data or {}).items():
+            if v is None:
+                node.pop(k, None)
+            else:
+                node[k] = copy.deepcopy(v)
+    return root
+
+
+class _Channel:
+    def __init__(self):
+        self.registration = None
+        self.subscribers = OrderedDict()   # id(subscriber) -> Subscriber
+        self.events = 0
+        # Full current value at the path, replayed to later subscribers
+        self.snapshot = None
+        self.has_snapshot = False
+
+
+class SSEHub:
+    def __init__(self, path_template, keepalive=SSE_KEEPALIVE_SECONDS,
+                 idle_timeout=SSE_IDLE_TIMEOUT, max_per_key=SSE_MAX_PER_KEY):
+        self.path_template = path_template
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._channels = {}
+        self.listeners_started = 0
+        self.listeners_closed = 0
+        self.idle_disconnects = 0
+        self.evicted = 0
+
+    # ----------- SUBSCRIPTIONS -----------
+
+    def subscribe(self, key):
+        """
+        A new subscriber for key; if key already has max_per_key streams the
+        oldest is evicted. A subscriber joining an open channel is sent the
+        current snapshot first, like the initial event of its own listener
+        would be.
+        """
+        subscriber = Subscriber(key)
+        evicted = []
+        with self._lock:
+            channel = self._channels.get(key)
+            while channel is not None and len(channel.subscribers) >= self.max_per_key:
+                evicted.append(channel.subscribers.popitem(last=False)[1])
+                self.evicted += 1
+            starting = channel is None
+            if starting:
+                channel = _Channel()
+                self._channels[key] = channel
+            elif channel.has_snapshot and channel.snapshot:
+                subscriber.put(copy.deepcopy(channel.snapshot))
+            channel.subscribers[id(subscriber)] = subscriber
+        for old in evicted:
+            old.evict()
+        if starting:
+            # listen() opens a network stream: keep it out of the hub lock
+            self._start(key, channel)
+        return subscriber
+
+    def _start(self, key, channel):
+        path = self.path_template.format(key=key)
+        try:
+            registration = db.reference(path).listen(
+                lambda event: self._publish(key, event)
+            )
+        except Exception as e:
+            logger.warning(f"[SSE_HUB] Could not listen on {path}: {e}")
+            with self._lock:
+                if self._channels.get(key) is channel:
+                    del self._channels[key]
+                subscribers = list(channel.subscribers.values())
+            # Ends the streams; EventSource reconnects
+            for subscriber in subscribers:
+                subscriber.close()
+            return
+
+        with self._lock:
+            # Everyone left while the stream was opening
+            published = self._channels.get(key) is channel
+            if published:
+                channel.registration = registration
+                self.listeners_started += 1
+        if published:
+            logger.debug(f"[SSE_HUB] Listening on {path}")
+        else:
+            self._close(key, registration)
+
+    def _close(self, key, registration):
+        try:
+            registration.close()
+        except Exception as e:
+            logger.warning(f"[SSE_HUB] Closing listener for {key} failed: {e}")
+        self.listeners_closed += 1
+        logger.debug(f"[SSE_HUB] Closed listener for {key}")
+
+    def unsubscribe(self, subscriber):
+        registration = None
+        with self._lock:
+            channel = self._channels.get(subscriber.key)
+            if channel is None:
+                return
+            channel.subscribers.pop(id(subscriber), None)
+            if not channel.subscribers:
+                del self._channels[subscriber.key]
+                # Still opening: _start() closes it once listen() returns
+                registration = channel.registration
+        if registration is not None:
+            self._close(subscriber.key, registration)
+
+    def _publish(self, key, event):
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                return
+            channel.snapshot = _apply_event(channel.snapshot, event.event_type, event.path, event.data)
+            channel.has_snapshot = True
+            if not event.data:
+                return
+            channel.events += 1
+            subscribers = list(channel.subscribers.values())
+        for subscriber in subscribers:
+            subscriber.put(event.data)
+
+    # ----------- STREAMING -----------
+
+    def stream(self, subscriber):
+        """Generator of SSE frames for one HTTP response (subscriber from subscribe())."""
+        last_event = time.time()
+        try:
+            yield f"retry: {int(self.keepalive * 1000)}\n\n"
+            while True:
+                try:
+                    data = subscriber.queue.get(timeout=self.keepalive)
+                except queue.Empty:
+                    if time.time() - last_event > self.idle_timeout:
+                        self.idle_disconnects += 1
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if data is _CLOSE:
+                    return
+                if data is _EVICTED:
+                    yield f"retry: {SSE_EVICTED_RETRY_SECONDS * 1000}\n\n"
+                    return
+                last_event = time.time()
+                yield f"data: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            per_key = {key: len(c.subscribers) for key, c in self._channels.items()}
+            events = sum(c.events for c in self._channels.values())
+        return {
+            "listeners": len(per_key),
+            "subscribers": sum(per_key.values()),
+            "per_key": per_key,
+            "events_open_channels": events,
+            "listeners_started": self.listeners_started,
+            "listeners_closed": self.listeners_closed,
+            "idle_disconnects": self.idle_disconnects,
+            "evicted": self.evicted,
+            "keepalive_seconds": self.keepalive,
+            "idle_timeout": self.idle_timeout,
+            "max_per_key": self.max_per_key,
+        }
+
+
+background_task_hub = SSEHub("backgroundTasks/{key}")
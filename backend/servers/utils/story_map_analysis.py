@@ -0,0 +1,812 @@
+"""
+Local pre-analysis for /api/story-map/analyze.
+
+Everything here is deterministic graph work that used to be left to the
+model: duplicate candidates from labels and aliases, connected components,
+isolated nodes and degree statistics. The route runs analyze() first and
+passes format_facts() to DeepSeek, so the model confirms or rejects the
+duplicate sets and reasons about the narrative instead of re-deriving the
+graph structure from raw JSON.
+
+Duplicate scoring follows the rubric in STORY_MAP_ANALYSIS_PROMPT (exact
+match 1.0, containment 0.95, alias 0.9, word overlap 0.85, fuzzy + same
+group 0.8, shared neighbours + similar name 0.75). Pairs are only scored
+when their names share a word or enough trigrams, so large maps don't pay
+for every pair.
+
+Maps with more than STORY_MAP_PARTITION_NODES nodes are split by
+partition() into sections of at most that size, each analyzed in its own
+DeepSeek call with a summary of the links that cross its boundary.
+merge_analyses() folds the per-section results back into one payload in the
+normal response schema, reconciling duplicate sets that span sections.
+
+fingerprint() hashes the graph (and each node and link) so the route can
+return a stored result for an unchanged map, and diff() / neighbourhood()
+limit a re-analysis to the part of the map that changed; apply_update()
+carries the untouched issues over from the previous result.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import defaultdict, deque
+
+from utils.chat.entity_index import normalize_label, trigrams, entity_names
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_MIN_CONFIDENCE = 0.75
+# Trigram Jaccard needed before a pair with no shared word is scored at all
+CANDIDATE_MIN_TRIGRAM = 0.3
+# Words and trigrams shared by more nodes than this ("the", " th") are too
+# common to say anything and would make blocking quadratic
+CANDIDATE_MAX_BUCKET = 50
+MAX_HUBS = 5
+MAX_LISTED = 20
+
+STORY_MAP_PARTITION_NODES = int(os.getenv("STORY_MAP_PARTITION_NODES", "60"))
+MAX_BOUNDARY_LINKS = 30
+# Above this share of changed nodes a full re-analysis is cheaper to reason about
+STORY_MAP_INCREMENTAL_MAX_SHARE = float(os.getenv("STORY_MAP_INCREMENTAL_MAX_SHARE", "0.5"))
+
+RECHECK_PREFIX = "Re-checked after your latest changes:"
+
+NODE_FIELDS = ("id", "label", "group", "aliases", "level", "note")
+LINK_FIELDS = ("source", "target", "type", "context")
+
+# Same deductions the prompt's SCORING RUBRIC asks the model to apply
+SEVERITY_PENALTY = {"high": 15, "medium": 10, "low": 5}
+DUPLICATE_PENALTY = 20
+
+
+# ----------- STRING SIMILARITY -----------
+
+def jaro_winkler(a, b, prefix_weight=0.1):
+    """Jaro-Winkler similarity in [0, 1]."""
+    if a == b:
+        return 1.0 if a else 0.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+
+    window = max(max(len_a, len_b) // 2 - 1, 0)
+    matched_b = [False] * len_b
+    matches_a = []
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(len_b, i + window + 1)):
+            if not matched_b[j] and b[j] == ch:
+                matched_b[j] = True
+                matches_a.append(ch)
+                break
+    if not matches_a:
+        return 0.0
+
+    matches_b = [b[j] for j in range(len_b) if matched_b[j]]
+    transpositions = sum(x != y for x, y in zip(matches_a, matches_b)) / 2
+    m = len(matches_a)
+    jaro = (m / len_a + m / len_b + (m - transpositions) / m) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ----------- GRAPH -----------
+
+def link_endpoint(value):
+    # The force-graph frontend replaces link endpoints with node objects once
+    # the simulation has run, so accept either shape
+    if isinstance(value, dict):
+        return value.get("id")
+    return value
+
+
+def build_adjacency(nodes, links):
+    """
+    Undirected adjacency index {node_id: set(neighbour_ids)}. Links that
+    point at unknown nodes are counted and otherwise ignored.
+    """
+    adjacency = {node.get("id"): set() for node in nodes if node.get("id") is not None}
+    dangling = 0
+    for link in links:
+        source, target = link_endpoint(link.get("source")), link_endpoint(link.get("target"))
+        if source not in adjacency or target not in adjacency:
+            dangling += 1
+            continue
+        if source != target:
+            adjacency[source].add(target)
+            adjacency[target].add(source)
+    return adjacency, dangling
+
+
+def connected_components(adjacency):
+    """Components as lists of node ids, largest first."""
+    seen = set()
+    components = []
+    for start in adjacency:
+        if start in seen:
+            continue
+        seen.add(start)
+        stack, component = [start], []
+        while stack:
+            node = stack.pop()
+            component.append(node)
+            for neighbour in adjacency[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        components.append(component)
+    components.sort(key=len, reverse=True)
+    return components
+
+
+def degree_stats(adjacency):
+    degrees = sorted(len(n) for n in adjacency.values())
+    if not degrees:
+        return {"min": 0, "max": 0, "mean": 0.0, "median": 0}
+    mid = len(degrees) // 2
+    median = degrees[mid] if len(degrees) % 2 else (degrees[mid - 1] + degrees[mid]) / 2
+    return {
+        "min": degrees[0],
+        "max": degrees[-1],
+        "mean": round(sum(degrees) / len(degrees), 2),
+        "median": median,
+    }
+
+
+# ----------- DUPLICATES -----------
+
+class _NodeNames:
+    """Normalized names, words and trigrams for one node."""
+
+    __slots__ = ("id", "group", "label", "aliases", "words", "grams")
+
+    def __init__(self, node):
+        self.id = node.get("id")
+        self.group = (node.get("group") or "").lower()
+        names = [normalize_label(n) for n in entity_names("nodes", node)]
+        self.label = names[0] if names else ""
+        self.aliases = {n for n in names[1:] if n}
+        self.words = set()
+        self.grams = set()
+        for name in [self.label, *self.aliases]:
+            if name:
+                self.words.update(name.split())
+                self.grams |= trigrams(name)
+
+
+def _pair_score(a, b, adjacency):
+    """(confidence, reason) for two nodes, or (0.0, None)."""
+    if not a.label or not b.label:
+        return 0.0, None
+    if a.label == b.label:
+        return 1.0, "same name"
+
+    # "Akio" / "Akio's Sword" share words but are different kinds of thing
+    same_group = a.group == b.group or not a.group or not b.group
+    a_words, b_words = set(a.label.split()), set(b.label.split())
+    if same_group and (a_words <= b_words or b_words <= a_words):
+        return 0.95, "one name contains the other"
+
+    if a.label in b.aliases or b.label in a.aliases or a.aliases & b.aliases:
+        return 0.9, "alias matches a name"
+
+    if same_group and len(a_words & b_words) / min(len(a_words), len(b_words)) > 0.75:
+        return 0.85, "most name words shared"
+
+    # Jaro-Winkler is the expensive part; skip it when neither rule could fire
+    shared_links = _jaccard(adjacency.get(a.id, set()), adjacency.get(b.id, set())) > 0.8
+    if a.group != b.group and not shared_links:
+        return 0.0, None
+
+    similarity = jaro_winkler(a.label, b.label)
+    if similarity > 0.85 and a.group == b.group:
+        return 0.8, f"similar spelling ({similarity:.2f})"
+
+    if similarity > 0.7 and shared_links:
+        return 0.75, "similar name and same connections"
+
+    return 0.0, None
+
+
+def _candidate_pairs(names):
+    """Pairs of indexes sharing a name, a word or enough trigrams to be worth scoring."""
+    by_name = defaultdict(list)
+    by_word = defaultdict(list)
+    by_gram = defaultdict(list)
+    for i, entry in enumerate(names):
+        for name in {entry.label, *entry.aliases}:
+            if name:
+                by_name[name].append(i)
+        for word in entry.words:
+            by_word[word].append(i)
+        for gram in entry.grams:
+            by_gram[gram].append(i)
+
+    pairs = set()
+    for members in by_name.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pairs.add((members[x], members[y]))
+    for members in by_word.values():
+        if len(members) > CANDIDATE_MAX_BUCKET:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pairs.add((members[x], members[y]))
+
+    shared = defaultdict(int)
+    for members in by_gram.values():
+        if len(members) > CANDIDATE_MAX_BUCKET:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                shared[(members[x], members[y])] += 1
+    for (i, j), count in shared.items():
+        if (i, j) in pairs:
+            continue
+        union = len(names[i].grams) + len(names[j].grams) - count
+        if union and count / union >= CANDIDATE_MIN_TRIGRAM:
+            pairs.add((i, j))
+    return pairs
+
+
+def duplicate_candidates(nodes, adjacency=None, min_confidence=DUPLICATE_MIN_CONFIDENCE):
+    """
+    Sets of nodes that probably name the same entity, as
+    [{"entities": [ids], "names": [labels], "confidence", "reasons"}],
+    strongest first. Pairs are merged transitively, and a set's confidence
+    is its weakest linking pair.
+    """
+    adjacency = adjacency or {}
+    names = [_NodeNames(node) for node in nodes if node.get("id") is not None]
+    labels = {node.get("id"): node.get("label") for node in nodes}
+
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    scored = []
+    for i, j in _candidate_pairs(names):
+        confidence, reason = _pair_score(names[i], names[j], adjacency)
+        if confidence >= min_confidence:
+            scored.append((i, j, confidence, reason))
+            parent[find(i)] = find(j)
+
+    groups = defaultdict(lambda: {"members": set(), "confidence": 1.0, "reasons": set()})
+    for i, j, confidence, reason in scored:
+        group = groups[find(i)]
+        group["members"].update((i, j))
+        group["confidence"] = min(group["confidence"], confidence)
+        group["reasons"].add(reason)
+
+    results = []
+    for group in groups.values():
+        ids = [names[i].id for i in sorted(group["members"])]
+        results.append({
+            "entities": ids,
+            "names": [labels.get(i) for i in ids],
+            "confidence": group["confidence"],
+            "reasons": sorted(group["reasons"]),
+        })
+    results.sort(key=lambda g: (-g["confidence"], -len(g["entities"])))
+    return results
+
+
+# ----------- ENTRY POINTS -----------
+
+def analyze(nodes, links):
+    """Run every local check. The result is JSON-serializable."""
+    adjacency, dangling = build_adjacency(nodes, links)
+    components = connected_components(adjacency)
+    labels = {node.get("id"): node.get("label") for node in nodes}
+
+    isolated = [node_id for node_id, neighbours in adjacency.items() if not neighbours]
+    hubs = sorted(adjacency, key=lambda n: len(adjacency[n]), reverse=True)[:MAX_HUBS]
+
+    return {
+        "node_count": len(adjacency),
+        "link_count": len(links),
+        "dangling_links": dangling,
+        "duplicates": duplicate_candidates(nodes, adjacency),
+        "components": components,
+        "isolated": isolated,
+        "degree": degree_stats(adjacency),
+        "hubs": [
+            {"id": n, "label": labels.get(n), "degree": len(adjacency[n])}
+            for n in hubs if adjacency[n]
+        ],
+    }
+
+
+def _named(ids, labels):
+    listed = [f"{labels.get(i)} ({i})" for i in ids[:MAX_LISTED]]
+    if len(ids) > MAX_LISTED:
+        listed.append(f"... {len(ids) - MAX_LISTED} more")
+    return ", ".join(listed)
+
+
+def format_facts(pre, nodes):
+    """Compact text summary of analyze() output for the DeepSeek prompt."""
+    labels = {node.get("id"): node.get("label") for node in nodes}
+    lines = []
+
+    if pre["duplicates"]:
+        lines.append("Duplicate candidates (confirm or reject each set):")
+        for group in pre["duplicates"]:
+            lines.append(
+                f"- {_named(group['entities'], labels)}: confidence {group['confidence']:.2f}, "
+                f"{'; '.join(group['reasons'])}"
+            )
+    else:
+        lines.append("Duplicate candidates: none found by name or alias matching.")
+
+    components = pre["components"]
+    connected = [c for c in components if len(c) > 1]
+    lines.append(
+        f"Components: {len(components)} "
+        f"(largest {len(components[0]) if components else 0} of {pre['node_count']} nodes)"
+    )
+    for component in connected[1:MAX_HUBS + 1]:
+        lines.append(f"- Separate cluster: {_named(component, labels)}")
+    if pre["isolated"]:
+        lines.append(f"Isolated nodes: {_named(pre['isolated'], labels)}")
+
+    degree = pre["degree"]
+    lines.append(
+        f"Degree: min {degree['min']}, median {degree['median']}, "
+        f"mean {degree['mean']}, max {degree['max']}"
+    )
+    if pre["hubs"]:
+        lines.append("Most connected: " + ", ".join(f"{h['label']} ({h['degree']})" for h in pre["hubs"]))
+    if pre["dangling_links"]:
+        lines.append(f"Links to unknown nodes (ignored): {pre['dangling_links']}")
+    return "\n".join(lines)
+
+
+# ----------- PARTITIONING -----------
+
+def _grow_regions(component, adjacency, max_nodes):
+    """Split an oversized component into connected regions of <= max_nodes, hubs first."""
+    remaining = set(component)
+    regions = []
+    while remaining:
+        seed = max(remaining, key=lambda n: (len(adjacency[n]), str(n)))
+        region, frontier = [seed], deque([seed])
+        remaining.discard(seed)
+        while frontier and len(region) < max_nodes:
+            node = frontier.popleft()
+            for neighbour in sorted(adjacency[node] & remaining, key=lambda n: -len(adjacency[n])):
+                if len(region) >= max_nodes:
+                    break
+                remaining.discard(neighbour)
+                region.append(neighbour)
+                frontier.append(neighbour)
+        regions.append(region)
+    return regions
+
+
+def partition(nodes, links, pre=None, max_nodes=STORY_MAP_PARTITION_NODES):
+    """
+    Group node ids into sections of at most max_nodes. Duplicate candidates
+    count as edges so a duplicate set lands in one section where possible;
+    small components are packed together (largest first) and oversized ones
+    are cut into connected regions around their hubs.
+    """
+    pre = pre or analyze(nodes, links)
+    adjacency, _ = build_adjacency(nodes, links)
+    joined = {node_id: set(neighbours) for node_id, neighbours in adjacency.items()}
+    for group in pre["duplicates"]:
+        first = group["entities"][0]
+        for other in group["entities"][1:]:
+            joined[first].add(other)
+            joined[other].add(first)
+
+    chunks = []
+    for component in connected_components(joined):
+        if len(component) <= max_nodes:
+            chunks.append(component)
+        else:
+            chunks.extend(_grow_regions(component, joined, max_nodes))
+
+    sections = []
+    for chunk in sorted(chunks, key=len, reverse=True):
+        for section in sections:
+            if len(section) + len(chunk) <= max_nodes:
+                section.extend(chunk)
+                break
+        else:
+            sections.append(list(chunk))
+    return sections
+
+
+def section_graph(section, nodes, links):
+    """(nodes, links, boundary) for one section; boundary lists links that leave it."""
+    members = set(section)
+    labels = {node.get("id"): node.get("label") for node in nodes}
+    sub_nodes = [node for node in nodes if node.get("id") in members]
+    sub_links, boundary = [], []
+    for link in links:
+        source, target = link_endpoint(link.get("source")), link_endpoint(link.get("target"))
+        inside = (source in members) + (target in members)
+        if inside == 2:
+            sub_links.append(link)
+        elif inside == 1:
+            own, other = (source, target) if source in members else (target, source)
+            boundary.append({
+                "id": own,
+                "label": labels.get(own),
+                "other_id": other,
+                "other_label": labels.get(other),
+                "type": link.get("type"),
+            })
+    return sub_nodes, sub_links, boundary
+
+
+def format_boundary(boundary, heading):
+    """Compact text telling the model what lies outside the nodes it was given."""
+    if not boundary:
+        return f"{heading} It has no links to the rest of the map."
+    lines = [
+        f"{heading} Links to nodes outside it (not shown; don't report them as missing or isolated):"
+    ]
+    for edge in boundary[:MAX_BOUNDARY_LINKS]:
+        lines.append(f"- {edge['label']} ({edge['id']}) -[{edge['type'] or 'link'}]- {edge['other_label']} ({edge['other_id']})")
+    if len(boundary) > MAX_BOUNDARY_LINKS:
+        lines.append(f"- ... {len(boundary) - MAX_BOUNDARY_LINKS} more")
+    return "\n".join(lines)
+
+
+# ----------- MERGING -----------
+
+def _issue_entities(issue):
+    return issue.get("affected_entities") or issue.get("entities") or []
+
+
+def _issue_key(issue):
+    """
+    Identity used to drop repeated issues across sections: category, the
+    issue/pattern identifier (genre_pattern issues use "pattern") and the
+    entities. None for issues without entities or an identifier, which are
+    always kept.
+    """
+    name = issue.get("issue") or issue.get("pattern")
+    entities = tuple(sorted(map(str, _issue_entities(issue))))
+    if not entities and not name:
+        return None
+    return (issue.get("category"), name, entities)
+
+
+def _merge_duplicate_issues(issues):
+    """Union duplicate_detection issues that share any entity."""
+    merged = []
+    owner = {}
+    for issue in issues:
+        entities = list(_issue_entities(issue))
+        hits = []
+        for entity in entities:
+            index = owner.get(entity)
+            if index is not None and index not in hits:
+                hits.append(index)
+        if not hits:
+            target = dict(issue, affected_entities=entities, names=list(issue.get("names") or []))
+            target.setdefault("severity", "high")
+            target.setdefault("action", "merge")
+            merged.append(target)
+            index = len(merged) - 1
+        else:
+            index = hits[0]
+            target = merged[index]
+            for other_index in hits[1:]:
+                _absorb_duplicate(target, merged[other_index])
+                merged[other_index] = None
+            _absorb_duplicate(target, issue)
+        for entity in target["affected_entities"]:
+            owner[entity] = index
+    return [issue for issue in merged if issue is not None]
+
+
+def _absorb_duplicate(target, issue):
+    for entity in _issue_entities(issue):
+        if entity not in target["affected_entities"]:
+            target["affected_entities"].append(entity)
+    for name in issue.get("names") or []:
+        if name not in target["names"]:
+            target["names"].append(name)
+    if (issue.get("confidence") or 0) > (target.get("confidence") or 0):
+        target["confidence"] = issue.get("confidence")
+        target["merge_suggestion"] = issue.get("merge_suggestion") or target.get("merge_suggestion")
+        target["reasoning"] = issue.get("reasoning") or target.get("reasoning")
+
+
+def _cross_section_duplicates(pre, sections):
+    """Issues for pre-computed duplicate sets whose members ended up in different sections."""
+    section_of = {node_id: i for i, section in enumerate(sections) for node_id in section}
+    issues = []
+    for group in pre["duplicates"]:
+        if len({section_of.get(e) for e in group["entities"]}) < 2:
+            continue
+        names = [n for n in group["names"] if n]
+        issues.append({
+            "category": "duplicate_detection",
+            "severity": "high",
+            "issue": "duplicate_entities",
+            "affected_entities": list(group["entities"]),
+            "names": names,
+            "reasoning": f"These nodes look like the same entity ({'; '.join(group['reasons'])}).",
+            "action": "merge",
+            "confidence": group["confidence"],
+            "merge_suggestion": max(names, key=len) if names else None,
+        })
+    return issues
+
+
+def _penalty(issues):
+    """Points the prompt's rubric deducts for these issues."""
+    penalty = 0
+    for issue in issues:
+        if issue.get("category") == "duplicate_detection":
+            penalty += DUPLICATE_PENALTY
+        else:
+            penalty += SEVERITY_PENALTY.get(issue.get("severity"), 0)
+    return penalty
+
+
+def score_issues(issues):
+    """Overall score from the prompt's rubric."""
+    return max(0, 100 - _penalty(issues))
+
+
+def health_for_score(score):
+    if score >= 75:
+        return "good"
+    if score >= 50:
+        return "fair"
+    return "needs_attention"
+
+
+def _unique(items):
+    seen, out = set(), []
+    for item in items:
+        key = item if isinstance(item, str) else repr(item)
+        if key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+
+def merge_analyses(results, pre, sections=None):
+    """
+    Fold per-section analyses into one payload in the single-call schema.
+    Duplicate sets are reconciled across sections (overlapping sets are
+    unioned, and pre-computed sets split by partitioning are added); other
+    issues are de-duplicated by _issue_key(). Score and
+    health are recomputed from the merged issues, and the graph counts come
+    from the whole-map pre-analysis.
+    """
+    duplicates, others, seen = [], [], set()
+    for result in results:
+        for issue in result.get("issues") or []:
+            if issue.get("category") == "duplicate_detection":
+                duplicates.append(issue)
+                continue
+            key = _issue_key(issue)
+            if key is None or key not in seen:
+                seen.add(key)
+                others.append(issue)
+    if sections:
+        duplicates += _cross_section_duplicates(pre, sections)
+    duplicates = _merge_duplicate_issues(duplicates)
+    issues = duplicates + others
+
+    score = score_issues(issues)
+    summaries = [r.get("summary", "").strip() for r in results if r.get("summary")]
+    # The prompt asks for a list, but some replies use an object (detected_genre, ...)
+    genre_lists = [r["genre_insights"] for r in results if isinstance(r.get("genre_insights"), list)]
+    genre_dicts = [r["genre_insights"] for r in results if isinstance(r.get("genre_insights"), dict)]
+    if genre_dicts and not genre_lists:
+        genre_insights = dict(genre_dicts[0])
+    else:
+        genre_insights = _unique(item for insights in genre_lists for item in insights)
+
+    components = pre["components"]
+    merged = {
+        "overall_health": health_for_score(score),
+        "overall_score": score,
+        "summary": " ".join(summaries),
+        "issues": issues,
+        "strengths": _unique(s for r in results for s in (r.get("strengths") or [])),
+        "genre_insights": genre_insights,
+        "node_count": pre["node_count"],
+        "link_count": pre["link_count"],
+        "avg_connections": pre["degree"]["mean"],
+        "isolated_nodes": len(pre["isolated"]),
+        "largest_cluster_size": len(components[0]) if components else 0,
+    }
+    if sections:
+        merged["summary"] = f"This map was analyzed in {len(sections)} sections. " + merged["summary"]
+        merged["partitions"] = len(sections)
+    return merged
+
+
+# ----------- INCREMENTAL RE-ANALYSIS -----------
+
+def _digest(value):
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _link_fields(link):
+    fields = {k: link.get(k) for k in LINK_FIELDS}
+    fields["source"] = link_endpoint(fields["source"])
+    fields["target"] = link_endpoint(fields["target"])
+    return fields
+
+
+def link_key(link):
+    """Stable identity for a link: its id, or its endpoints and type."""
+    if link.get("id") is not None:
+        return str(link["id"])
+    fields = _link_fields(link)
+    return f"{fields['source']}|{fields['target']}|{fields['type']}"
+
+
+def fingerprint(nodes, links, genre=None, context=None):
+    """
+    Content hashes for the fields the analysis reads: one per node and link,
+    plus a canonical hash of the whole graph and the user's genre/context.
+    Order of nodes and links does not matter.
+    """
+    node_hashes = {
+        str(node.get("id")): _digest({k: node.get(k) for k in NODE_FIELDS})
+        for node in nodes if node.get("id") is not None
+    }
+    link_hashes, link_ends = {}, {}
+    for link in links:
+        fields = _link_fields(link)
+        key = link_key(link)
+        link_hashes[key] = _digest(fields)
+        link_ends[key] = [fields["source"], fields["target"]]
+    graph = _digest({
+        "nodes": sorted(node_hashes.items()),
+        "links": sorted(link_hashes.items()),
+        "genre": genre or "",
+        "context": context or "",
+    })
+    return {
+        "graph": graph,
+        "nodes": node_hashes,
+        "links": link_hashes,
+        "linkEnds": link_ends,
+        "genre": genre or "",
+        "context": context or "",
+    }
+
+
+def diff(previous, current):
+    """
+    What changed between two fingerprints: node ids added/removed/changed,
+    and the ids of every node touched by a change (including both ends of
+    added, removed or edited links).
+    """
+    old_nodes, new_nodes = previous["nodes"], current["nodes"]
+    old_links, new_links = previous["links"], current["links"]
+
+    added = [n for n in new_nodes if n not in old_nodes]
+    removed = [n for n in old_nodes if n not in new_nodes]
+    changed = [n for n in new_nodes if n in old_nodes and old_nodes[n] != new_nodes[n]]
+
+    link_changes = [k for k in new_links if old_links.get(k) != new_links[k]]
+    link_changes += [k for k in old_links if k not in new_links]
+    ends = {**previous.get("linkEnds", {}), **current.get("linkEnds", {})}
+    # Links to a deleted node may still be in the payload, but its neighbours lost them
+    gone = set(removed)
+    link_changes += [
+        k for k, (source, target) in previous.get("linkEnds", {}).items()
+        if (str(source) in gone or str(target) in gone) and k not in link_changes
+    ]
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "links_changed": len(link_changes),
+        "settings_changed": previous.get("genre") != current.get("genre") or previous.get("context") != current.get("context"),
+        "touched": set(added) | set(changed),
+        # Both ends of every added, removed or edited link (old and new)
+        "link_ends": [end for k in link_changes for end in ends.get(k, ())],
+    }
+
+
+def neighbourhood(delta, nodes, links, pre):
+    """
+    Node ids whose issues may have changed: touched nodes, the endpoints of
+    changed links, their direct neighbours, and any duplicate candidate set
+    that includes one of them.
+    """
+    adjacency, _ = build_adjacency(nodes, links)
+    # Fingerprints key nodes by str(id); the frontend may send numeric ids
+    by_str = {str(node_id): node_id for node_id in adjacency}
+    seeds = {by_str[str(n)] for n in set(delta["touched"]) | set(delta["link_ends"]) if str(n) in by_str}
+
+    affected = set(seeds)
+    for node_id in seeds:
+        affected |= adjacency[node_id]
+    for group in pre["duplicates"]:
+        if affected & set(group["entities"]):
+            affected.update(group["entities"])
+    return affected
+
+
+def map_wide_issues(issues):
+    """Issues that name no entities (genre patterns, overall consistency)."""
+    return [issue for issue in issues or [] if not _issue_entities(issue)]
+
+
+def format_map_wide(issues):
+    """
+    Prompt text handing the previous map-wide issues to a neighbourhood
+    re-analysis, which apply_update() then treats as re-judged.
+    """
+    issues = map_wide_issues(issues)
+    if not issues:
+        return ""
+    lines = [
+        "Map-wide issues from the last full analysis. Repeat each one that still "
+        "applies in your issues list unchanged; leave out any the edits resolved:"
+    ]
+    for issue in issues[:MAX_LISTED]:
+        lines.append(json.dumps(issue, separators=(",", ":")))
+    return "\n".join(lines)
+
+
+def apply_update(previous, update, affected, removed, pre):
+    """
+    Combine the previous full analysis with a re-analysis of the affected
+    neighbourhood. Previous issues about removed or affected nodes are
+    dropped (the update re-judges the affected ones); the rest carry over.
+    When there was a re-analysis (affected is non-empty) it was given the
+    previous map-wide issues (format_map_wide()), so those come from the
+    update too.
+
+    The score is the previous one moved by the rubric penalty of the issues
+    dropped and added, so a small edit moves it by what actually changed
+    rather than being re-derived from the rubric.
+    """
+    stale = {str(n) for n in affected} | {str(n) for n in removed}
+    previous_issues = previous.get("issues") or []
+    carried = []
+    for issue in previous_issues:
+        entities = set(map(str, _issue_entities(issue)))
+        # Map-wide issues were handed to the re-analysis, if there was one
+        if not stale & entities if entities else not affected:
+            carried.append(issue)
+    merged = merge_analyses([{"issues": carried}, update], pre)
+    if isinstance(previous.get("overall_score"), (int, float)):
+        score = previous["overall_score"] + _penalty(previous_issues) - _penalty(merged["issues"])
+        merged["overall_score"] = max(0, min(100, round(score)))
+        merged["overall_health"] = health_for_score(merged["overall_score"])
+
+    summary = (previous.get("summary") or "").split(RECHECK_PREFIX)[0].strip()
+    if update.get("summary"):
+        summary = f"{summary} {RECHECK_PREFIX} {update['summary'].strip()}".strip()
+    merged["summary"] = summary
+    merged["strengths"] = _unique(list(update.get("strengths") or []) + list(previous.get("strengths") or []))
+    if not merged["genre_insights"]:
+        merged["genre_insights"] = previous.get("genre_insights") or []
+    if previous.get("partitions"):
+        merged["partitions"] = previous["partitions"]
+    return merged
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Auto-title scheduling tests (flushes on a full titling queue).
+
+Run from backend/servers:
+    python -m pytest utils/test_auto_title.py
+"""
+
+import os
+import sys
+import threading
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import auto_title
+from utils.background import BackgroundExecutor
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    # One titling slot, one queued task: easy to fill
+    executor = BackgroundExecutor(workers=1, queues={"titling": (3, 1, "drop_oldest", 1)})
+    monkeypatch.setattr(auto_title, "background", executor)
+    yield executor
+    executor.drain(timeout=5)
+
+
+def test_dropped_flush_does_not_stop_titling(executor, monkeypatch):
+    titled = []
+    titler = auto_title.AutoTitler(client=None)
+    monkeypatch.setattr(titler, "_title", titled.extend)
+
+    started, release = threading.Event(), threading.Event()
+    executor.submit("titling", lambda: started.set() or release.wait(5))
+    assert started.wait(5)
+    titler.request("u", "s1")
+    # Another titling task pushes the queued flush out
+    executor.submit("titling", lambda: None)
+    assert titler.stats()["pending"] == 1
+    release.set()
+
+    titler.request("u", "s2")
+    executor.drain(timeout=5)
+    assert titled == [("u", "s1"), ("u", "s2")]
+
+
+def test_on_drop_runs_for_shed_and_dropped_tasks():
+    executor = BackgroundExecutor(workers=1, queues={"old": (0, 1, "drop_oldest", 1), "new": (1, 0, "shed", 1)})
+    dropped = []
+    started, release = threading.Event(), threading.Event()
+    executor.submit("old", lambda: started.set() or release.wait(5))
+    assert started.wait(5)
+    executor.submit("old", lambda: None, on_drop=lambda: dropped.append("first"))
+    executor.submit("old", lambda: None, on_drop=lambda: dropped.append("second"))
+    assert executor.submit("new", lambda: None, on_drop=lambda: dropped.append("shed")) is False
+    release.set()
+    executor.drain(timeout=5)
+    assert dropped == ["first", "shed"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
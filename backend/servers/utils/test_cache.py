@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite cache tests (entries and counters across worker processes).
+
+Run from backend/servers:
+    python -m pytest utils/test_cache.py
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import cache
+
+NAMES = ["metadata_hits", "metadata_misses"]
+
+fork = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork (gunicorn-style workers)"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return cache._SQLiteStore(str(tmp_path / "cache.sqlite3"))
+
+
+def _in_worker(target, *args):
+    # A forked child, like a gunicorn worker sharing the master's module state
+    process = multiprocessing.get_context("fork").Process(target=target, args=args)
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+
+def _count_hits(store, hits):
+    counters = cache.CacheCounters(NAMES, store=store)
+    counters["metadata_hits"] += hits
+    counters.flush()
+
+
+def _set_entry(store, key, value):
+    cache.SQLiteBackend("metadata", 10, 60, store)[key] = value
+
+
+@fork
+def test_entries_are_shared_between_workers(store):
+    backend = cache.SQLiteBackend("metadata", 10, 60, store)
+    _in_worker(_set_entry, store, "story", {"title": "Harbor"})
+    assert backend.get("story") == {"title": "Harbor"}
+    assert backend.pop("story") == {"title": "Harbor"} and "story" not in backend
+
+
+@fork
+def test_totals_sum_workers_and_drop_exited_ones(store):
+    counters = cache.CacheCounters(NAMES, store=store)
+    counters["metadata_hits"] += 1
+    _in_worker(_count_hits, store, 2)
+    _in_worker(_count_hits, store, 3)
+    assert counters.totals() == ({"metadata_hits": 6, "metadata_misses": 0}, 3)
+
+    # The children exited; once their rows go stale they stop counting and are pruned
+    store.conn().execute("UPDATE cache_worker_counters SET updated_at=updated_at-? WHERE worker!=?",
+                         (counters.stale_after + 1, counters._worker_id()))
+    assert counters.totals() == ({"metadata_hits": 1, "metadata_misses": 0}, 1)
+    assert store.conn().execute("SELECT COUNT(DISTINCT worker) FROM cache_worker_counters").fetchone()[0] == 1
+
+
+def test_reused_pid_gets_its_own_row(store):
+    old = cache.CacheCounters(NAMES, store=store)
+    old["metadata_hits"] += 4
+    old.flush()
+    # Same pid, new process: the restarted worker must not overwrite (or inherit) the old row
+    new = cache.CacheCounters(NAMES, store=store)
+    new["metadata_misses"] += 1
+    assert new.totals() == ({"metadata_hits": 4, "metadata_misses": 1}, 2)
+
+
+def test_stale_rows_are_pruned_on_startup(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    old = cache.CacheCounters(NAMES, store=cache._SQLiteStore(path))
+    old["metadata_hits"] += 4
+    old.flush()
+    old._store.conn().execute("UPDATE cache_worker_counters SET updated_at=?",
+                              (time.time() - cache.CACHE_COUNTER_STALE_SECONDS - 1,))
+
+    restarted = cache._SQLiteStore(path)
+    assert restarted.conn().execute("SELECT COUNT(*) FROM cache_worker_counters").fetchone()[0] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Entity index and staging existence-check tests (no network: the Profile
+Manager loader and HTTP session are replaced with in-memory fakes).
+
+Run from backend/servers:
+    python -m pytest utils/test_entity_index.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils.chat import chat_utils
+from utils.chat.entity_index import EntityIndexRegistry, normalize_label
+
+NODES = {
+    "n1": {"id": "n1", "label": "Alice Johnson", "group": "Character", "aliases": "Ali, The Courier"},
+    "n2": {"id": "n2", "label": "Harbor Town", "group": "Location"},
+}
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append((url, json))
+        return FakeResponse({"status": "staged"})
+
+
+@pytest.fixture
+def staging(monkeypatch):
+    registry = EntityIndexRegistry(lambda user_id, entity_type: NODES if entity_type == "nodes" else {})
+    session = FakeSession()
+    monkeypatch.setattr(chat_utils, "entity_index", registry)
+    monkeypatch.setattr(chat_utils, "profile_http", session)
+    return session
+
+
+def test_normalize_label():
+    assert normalize_label("  Alice   JOHNSON! ") == "alice johnson"
+
+
+def test_lookup_by_label_and_alias():
+    index = EntityIndexRegistry(lambda user_id, entity_type: NODES).for_user("u")
+    assert [n["id"] for n in index.lookup("nodes", "alice johnson")] == ["n1"]
+    assert [n["id"] for n in index.lookup("nodes", "the courier")] == ["n1"]
+    assert index.search("nodes", "Alise Jonson")[0]["id"] == "n1"
+
+
+def test_create_duplicate_is_blocked(staging):
+    result = chat_utils.process_node_request(
+        {"entityType": "node", "entityId": None, "newData": {"label": "alice johnson", "group": "Character"}}, "u"
+    )
+    assert result["status"] == "exists"
+    assert result["existing"]["id"] == "n1"
+    assert staging.posts == []
+
+
+def test_create_new_node_is_staged(staging):
+    result = chat_utils.process_node_request(
+        {"entityType": "node", "entityId": None, "newData": {"label": "Bob Smith", "group": "Character"}}, "u"
+    )
+    assert result == {"status": "staged"}
+    assert staging.posts[0][1]["label"] == "Bob Smith"
+
+
+def test_delete_of_existing_node_is_staged(staging):
+    # Deletions name the node with newData.identifier and a null entityId
+    result = chat_utils.process_node_request(
+        {"entityType": "node", "entityId": None, "newData": {"identifier": "Alice Johnson"}}, "u"
+    )
+    assert result == {"status": "staged"}
+    assert len(staging.posts) == 1
+    assert staging.posts[0][1]["label"] == "Alice Johnson"
+
+
+def test_update_of_existing_node_is_staged(staging):
+    result = chat_utils.process_node_request(
+        {"entityType": "node", "entityId": None, "changeType": "update",
+         "newData": {"label": "Alice Johnson", "note": "Now a smuggler"}}, "u"
+    )
+    assert result == {"status": "staged"}
+    assert len(staging.posts) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
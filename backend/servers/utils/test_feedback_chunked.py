@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Chunked draft feedback splitting tests.
+
+Run from backend/servers:
+    python -m pytest utils/test_feedback_chunked.py
+"""
+
+import os
+import sys
+import random
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils.feedback import chunked
+from utils.feedback.chunked import split_draft
+
+
+def make_draft(paragraphs=60, seed=7):
+    rng = random.Random(seed)
+    words = "the harbor storm mara captain lantern rope tide night ship bell salt".split()
+    return "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(30, 80))).capitalize() + "."
+        for _ in range(paragraphs)
+    )
+
+
+def test_sections_cover_the_draft_within_size_limits():
+    draft = make_draft()
+    sections = split_draft(draft)
+    assert len(sections) > 1
+    assert "\n\n".join(s["text"] for s in sections) == draft
+    assert [s["index"] for s in sections] == list(range(len(sections)))
+    # Only a scene's last section may be short
+    assert all(s["words"] >= chunked.DRAFT_CHUNK_MIN_WORDS for s in sections[:-1])
+    assert all(s["words"] < chunked.DRAFT_CHUNK_MAX_WORDS + 80 for s in sections)
+
+
+def test_local_edit_changes_only_nearby_sections():
+    draft = make_draft()
+    before = split_draft(draft)
+    paragraphs = draft.split("\n\n")
+    middle = len(paragraphs) // 2
+    paragraphs[middle] = paragraphs[middle].replace(".", " and then the bell rang.")
+    after = split_draft("\n\n".join(paragraphs))
+
+    old_hashes = {s["hash"] for s in before}
+    changed = [s for s in after if s["hash"] not in old_hashes]
+    assert 1 <= len(changed) <= 2
+    # Sections before the edit keep their hashes (and cached reviews); so do most after it
+    first = next(i for i, s in enumerate(after) if s["hash"] not in old_hashes)
+    assert first > 0 and [s["hash"] for s in after[:first]] == [s["hash"] for s in before[:first]]
+    assert len(old_hashes & {s["hash"] for s in after}) >= len(before) - 3
+
+
+def test_reflowed_text_keeps_hashes():
+    draft = make_draft(paragraphs=20)
+    reflowed = draft.replace(" the ", "\nthe ")
+    assert [s["hash"] for s in split_draft(draft)] == [s["hash"] for s in split_draft(reflowed)]
+
+
+def test_cache_key_changes_with_story_profile():
+    section = split_draft("Mara left the harbor.")[0]
+    before = chunked.context_summary([{"label": "Mara", "group": "Character"}], [])
+    after = chunked.context_summary([{"label": "Mara", "group": "Character"}, {"label": "Vos", "group": "Character"}], [])
+    assert chunked.cache_key("u", "s", section, before) == chunked.cache_key("u", "s", section, before)
+    assert chunked.cache_key("u", "s", section, before) != chunked.cache_key("u", "s", section, after)
+
+
+def test_headings_start_a_section_and_stay_in_its_text():
+    draft = "Mara left the harbor.\n\n# Part Two: The Storm\n\nRain fell on the town.\n\n## Chapter 3\nThe morning after."
+    texts = [s["text"] for s in split_draft(draft)]
+    assert texts == [
+        "Mara left the harbor.",
+        "# Part Two: The Storm\n\nRain fell on the town.",
+        "## Chapter 3\nThe morning after.",
+    ]
+
+
+@pytest.mark.parametrize("separator", ["***", "* * *", "---", "~~~", "#", "##"])
+def test_bare_separators_split_and_are_dropped(separator):
+    texts = [s["text"] for s in split_draft(f"Before the break.\n\n{separator}\n\nAfter the break.")]
+    assert texts == ["Before the break.", "After the break."]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+In-memory Realtime Database emulator tests.
+
+Run from backend/servers:
+    python -m pytest utils/test_firebase_emulator.py
+"""
+
+import os
+import sys
+import queue
+import threading
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils.firebase_emulator import InMemoryDatabase
+from utils.turn_executor import TurnExecutor
+
+
+def test_increment_sentinel_on_set_and_update():
+    database = InMemoryDatabase()
+    ref = database.reference("sessionIndex/u/s1")
+    ref.update({"messageCount": {".sv": {"increment": 1}}, "mode": "bs"})
+    ref.update({"messageCount": {".sv": {"increment": 1}}})
+    ref.child("nested").set({"count": {".sv": {"increment": 5}}})
+    assert ref.get() == {"messageCount": 2, "mode": "bs", "nested": {"count": 5}}
+
+
+def test_timestamp_sentinel():
+    database = InMemoryDatabase()
+    database.reference("a").set({"at": {".sv": "timestamp"}})
+    assert isinstance(database.reference("a/at").get(), int)
+
+
+def test_listeners_see_resolved_values():
+    database = InMemoryDatabase()
+    patches = queue.Queue()
+    database.reference("counts").listen(lambda event: event.event_type == "patch" and patches.put(event.data))
+    database.reference("counts").update({"n": {".sv": {"increment": 3}}})
+    assert patches.get(timeout=2) == {"n": 3}
+
+
+def test_round_trips_are_counted_per_context():
+    database = InMemoryDatabase({"a": {"b": 1}})
+    ref = database.reference("a")
+    with database.count_round_trips() as outer:
+        ref.get()
+        with database.count_round_trips() as inner:
+            ref.child("b").set(2)
+            ref.update({"c": 3})
+        # Another thread's context isn't copied from this one, so it isn't counted here
+        thread = threading.Thread(target=ref.get)
+        thread.start()
+        thread.join()
+    assert inner.total == 2 and inner.by_op == {"set": 1, "update": 1}
+    assert outer.total == 3 and outer.by_op == {"get": 1, "set": 1, "update": 1}
+    assert database.round_trips.total == 4
+
+
+def test_turn_executor_fanout_counts_towards_the_request():
+    database = InMemoryDatabase({"sessions": {"s1": {"stage": "Clarify"}}})
+    with database.count_round_trips() as counter:
+        turn = TurnExecutor("TEST")
+        turn.submit("stage", database.reference("sessions/s1/stage").get)
+        turn.submit("recent", database.reference("sessions/s1/messages").order_by_key().limit_to_last(5).get)
+        assert turn.result("stage", timeout=5) == "Clarify"
+        turn.result("recent", timeout=5)
+    assert counter.by_op == {"get": 1, "query": 1}
+
+
+def test_expect_round_trips():
+    database = InMemoryDatabase()
+    with database.expect_round_trips(exactly=2):
+        database.reference("x").set(1)
+        database.reference("x").get()
+    with pytest.raises(AssertionError, match="at most 1"):
+        with database.expect_round_trips(at_most=1):
+            database.reference("x").get()
+            database.reference("y").get()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Mentor text analysis store tests (keys and stored records, no network).
+
+Run from backend/servers:
+    python -m pytest utils/test_mentor_text_store.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import mentor_text_store as store
+
+EXCERPT = "“It was the best of times,” she said — ‘it was the worst.’"
+PROMPT = "You analyse mentor texts."
+
+
+def key(excerpt=EXCERPT, genre="Literary", focus="voice", prompt=PROMPT):
+    return store.analysis_key(excerpt, genre, focus, prompt)
+
+
+@pytest.mark.parametrize("variant", [
+    "\"It was the best of times,\" she said - 'it was the worst.'",
+    "it was the BEST of times she said\nit was the worst",
+    "  Ｉt was the best of times, she said, it was the worst...  ",
+])
+def test_key_ignores_quotes_case_wrapping_and_punctuation(variant):
+    assert key(variant) == key()
+
+
+def test_key_depends_on_words_settings_and_prompt():
+    assert key("It was the best of times, he said.") != key()
+    assert key(genre="  literary ") == key()
+    assert key(genre="Fantasy") != key()
+    assert key(focus="pacing") != key()
+    assert key(prompt=PROMPT + " Be brief.") != key()
+
+
+def test_record_round_trip_drops_per_request_fields():
+    result = {"techniques": [], "summary": "ok", "metadata": {"cached": False}, "_validationWarning": "x"}
+    record = store.to_record(result, {"valid": True}, now_ms=1_000)
+    assert store.from_record(record, now_ms=2_000) == ({"techniques": [], "summary": "ok"}, {"valid": True})
+
+
+def test_expired_or_unreadable_records_are_ignored():
+    record = store.to_record({"summary": "ok"}, {"valid": True}, now_ms=0)
+    assert store.from_record(record, now_ms=store.MENTOR_TEXT_STORE_TTL * 1000 + 1) is None
+    assert store.from_record(dict(record, analysis="{not json"), now_ms=1) is None
+    assert store.from_record(None, now_ms=1) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
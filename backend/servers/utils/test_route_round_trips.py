@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Firebase round-trip budgets for ai_server routes, measured against the
+in-memory emulator (no network; DeepSeek is never called by these routes).
+
+Run from backend/servers:
+    python -m pytest utils/test_route_round_trips.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import firebase_emulator
+
+# About 11 round trips per logged interaction (journey push, usage counter,
+# stage transition, tool-switch matrix, session activity)
+UI_BATCH_ROUND_TRIPS_PER_INTERACTION = 12
+
+
+@pytest.fixture(scope="module")
+def server():
+    for name, value in (("FIREBASE_SERVICE_ACCOUNT_KEY", "{}"), ("DEEPSEEK_API_KEY", "test"),
+                        ("LEONARDO_API_KEY", "test"), ("PROFILE_MANAGER_URL", "http://localhost"),
+                        ("SERVICE_WARMUP", "0")):
+        if not os.environ.get(name):
+            os.environ[name] = value
+    # chat_utils reads the key at import; other test modules may have imported it already
+    chat_utils = sys.modules.get("utils.chat.chat_utils")
+    if chat_utils is not None and not chat_utils.DEEPSEEK_API_KEY:
+        chat_utils.DEEPSEEK_API_KEY = os.environ["DEEPSEEK_API_KEY"]
+    database = firebase_emulator.install()
+    ai_server = pytest.importorskip("ai_server")
+    return database, ai_server.app.test_client()
+
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_log_ui_batch_round_trips(server, count):
+    database, client = server
+    interactions = [{"action": "move_node", "metadata": {}, "timestamp": 1}] * count
+    with database.expect_round_trips(at_most=UI_BATCH_ROUND_TRIPS_PER_INTERACTION * count):
+        response = client.post("/api/log-ui-batch", json={
+            "userId": "u", "feature": "storyMap", "interactions": interactions
+        })
+    assert response.status_code == 200
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Session index listing tests (pagination over the in-memory emulator).
+
+Run from backend/servers:
+    python -m pytest utils/test_session_index.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import session_index
+from utils.firebase_emulator import InMemoryDatabase
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = InMemoryDatabase()
+    monkeypatch.setattr(session_index.db, "reference", database.reference)
+    database.reference(f"{session_index.STATE_ROOT}/u").set({"backfilledAt": 1, "sessions": 0})
+    session_index.forget_backfill("u")
+    return database
+
+
+def _add(database, sid, updated_at):
+    database.reference(f"{session_index.INDEX_ROOT}/u/{sid}").set({"updatedAt": updated_at, "mode": "brainstorming"})
+
+
+def _all_pages(limit):
+    seen, cursor = [], None
+    while True:
+        entries, cursor = session_index.list_entries("u", limit=limit, before=cursor)
+        seen.extend(e["sessionId"] for e in entries)
+        if not cursor:
+            return seen
+
+
+def test_pages_through_many_sessions_sharing_a_timestamp(database):
+    # More sessions at one updatedAt than any fixed over-fetch would cover
+    for i in range(30):
+        _add(database, f"s{i:02d}", 1000)
+    for i in range(5):
+        _add(database, f"old{i}", 500 + i)
+
+    seen = _all_pages(limit=4)
+    assert seen == [f"s{i:02d}" for i in reversed(range(30))] + [f"old{i}" for i in reversed(range(5))]
+
+
+def test_next_cursor_only_when_older_sessions_exist(database):
+    for i in range(4):
+        _add(database, f"s{i}", 100 + i)
+
+    entries, cursor = session_index.list_entries("u", limit=4)
+    assert len(entries) == 4 and cursor is None
+
+    entries, cursor = session_index.list_entries("u", limit=3)
+    assert [e["sessionId"] for e in entries] == ["s3", "s2", "s1"]
+    assert cursor == "101_s1"
+    assert [e["sessionId"] for e in session_index.list_entries("u", limit=3, before=cursor)[0]] == ["s0"]
+
+
+@pytest.mark.parametrize("cursor", ["abc_s1", "123", "_s1", "12x_s1"])
+def test_malformed_cursor(database, cursor):
+    with pytest.raises(session_index.InvalidCursorError):
+        session_index.list_entries("u", limit=3, before=cursor)
+
+
+def test_parse_limit():
+    assert session_index.parse_limit(None) is None
+    assert session_index.parse_limit("20") == 20
+    for bad in (0, -1, "x"):
+        with pytest.raises(ValueError):
+            session_index.parse_limit(bad)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
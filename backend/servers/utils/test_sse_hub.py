@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+SSE hub tests (shared listener, snapshot replay, per-key limit) over the
+in-memory emulator.
+
+Run from backend/servers:
+    python -m pytest utils/test_sse_hub.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import sse_hub
+from utils.firebase_emulator import InMemoryDatabase
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    database = InMemoryDatabase()
+    monkeypatch.setattr(sse_hub.db, "reference", database.reference)
+    database.reference("tasks/u").set({"t1": {"status": "running"}})
+    return sse_hub.SSEHub("tasks/{key}", keepalive=1, idle_timeout=1, max_per_key=2)
+
+
+def test_later_subscribers_get_the_current_snapshot(hub):
+    first = hub.subscribe("u")
+    assert first.queue.get(timeout=2) == {"t1": {"status": "running"}}
+    second = hub.subscribe("u")
+    assert second.queue.get(timeout=2) == {"t1": {"status": "running"}}
+    assert hub.stats()["listeners"] == 1
+
+
+def test_new_stream_beyond_the_limit_evicts_the_oldest(hub):
+    oldest, middle = hub.subscribe("u"), hub.subscribe("u")
+    newest = hub.subscribe("u")
+    assert newest is not None
+    stats = hub.stats()
+    assert stats["per_key"] == {"u": 2} and stats["evicted"] == 1
+
+    # The evicted stream ends with a long retry instead of an error, after any queued events
+    stream = list(hub.stream(oldest))
+    assert stream[-1] == f"retry: {sse_hub.SSE_EVICTED_RETRY_SECONDS * 1000}\n\n"
+    assert hub.stats()["per_key"] == {"u": 2}
+
+    hub.unsubscribe(middle)
+    hub.unsubscribe(newest)
+    assert hub.stats()["listeners"] == 0 and hub.stats()["listeners_closed"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Story map pre-analysis, partition merging and incremental update tests
+(pure functions, no network).
+
+Run from backend/servers:
+    python -m pytest utils/test_story_map_analysis.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import story_map_analysis as sma
+
+NODES = [
+    {"id": 1, "label": "Alice Johnson", "group": "Person"},
+    {"id": 2, "label": "Bob Smith", "group": "Person"},
+    {"id": 3, "label": "Harbor Town", "group": "Location"},
+    {"id": 4, "label": "Old Lighthouse", "group": "Location"},
+]
+LINKS = [
+    {"source": 1, "target": 2, "type": "friend"},
+    {"source": 2, "target": 3, "type": "lives in"},
+]
+
+
+def test_duplicate_candidates_by_name_alias_and_spelling():
+    nodes = NODES + [
+        {"id": 5, "label": "Alice", "group": "Person"},
+        {"id": 6, "label": "The Keeper", "group": "Person", "aliases": "Bob Smith"},
+        {"id": 7, "label": "Harbour Town", "group": "Location"},
+    ]
+    groups = sma.duplicate_candidates(nodes)
+    by_entities = {tuple(sorted(g["entities"])): g for g in groups}
+    assert by_entities[(1, 5)]["reasons"] == ["one name contains the other"]
+    assert by_entities[(2, 6)]["reasons"] == ["alias matches a name"]
+    assert by_entities[(3, 7)]["reasons"][0].startswith("similar spelling")
+    assert [g["confidence"] for g in groups] == sorted((g["confidence"] for g in groups), reverse=True)
+
+
+def test_duplicate_candidates_ignore_different_kinds_and_merge_transitively():
+    nodes = [
+        {"id": 1, "label": "Akio", "group": "Person"},
+        {"id": 2, "label": "Akio's Sword", "group": "Object"},
+        {"id": 3, "label": "Mara Vos", "group": "Person"},
+        {"id": 4, "label": "Mara", "group": "Person"},
+        {"id": 5, "label": "Captain Vos", "group": "Person", "aliases": "Mara Vos"},
+    ]
+    groups = sma.duplicate_candidates(nodes)
+    assert [sorted(g["entities"]) for g in groups] == [[3, 4, 5]]
+    assert groups[0]["confidence"] == 0.9
+
+
+def test_diff_and_neighbourhood_cover_changed_links_and_duplicates():
+    nodes = NODES + [{"id": 5, "label": "Alice", "group": "Person"}]
+    before = sma.fingerprint(nodes, LINKS)
+    edited = [dict(n, note="moved") if n["id"] == 4 else n for n in nodes]
+    links = LINKS[:1] + [{"source": 2, "target": 4, "type": "lives in"}]
+    after = sma.fingerprint(edited, links)
+
+    delta = sma.diff(before, after)
+    assert delta["changed"] == ["4"] and delta["added"] == [] and delta["removed"] == []
+    assert delta["links_changed"] == 2
+    assert sorted(delta["link_ends"], key=str) == [2, 2, 3, 4]
+
+    pre = sma.analyze(edited, links)
+    # Touched 2, 3, 4; 1 is 2's neighbour; 5 is a duplicate of 1
+    assert sma.neighbourhood(delta, edited, links, pre) == {1, 2, 3, 4, 5}
+
+
+def test_diff_reports_removed_node_neighbours_and_ignores_order():
+    before = sma.fingerprint(NODES, LINKS)
+    assert sma.diff(before, sma.fingerprint(list(reversed(NODES)), list(reversed(LINKS))))["links_changed"] == 0
+    assert sma.fingerprint(list(reversed(NODES)), LINKS)["graph"] == before["graph"]
+
+    after = sma.fingerprint(NODES[1:], LINKS)
+    delta = sma.diff(before, after)
+    assert delta["removed"] == ["1"]
+    assert 2 in delta["link_ends"]
+
+
+def genre_issue(pattern):
+    return {"category": "genre_pattern", "severity": "medium", "pattern": pattern, "description": pattern}
+
+
+def test_merge_keeps_distinct_genre_patterns():
+    pre = sma.analyze(NODES, LINKS)
+    merged = sma.merge_analyses(
+        [{"issues": [genre_issue("missing_antagonist"), genre_issue("no_mentor")]}], pre
+    )
+    assert [i["pattern"] for i in merged["issues"]] == ["missing_antagonist", "no_mentor"]
+    assert merged["overall_score"] == 80
+
+
+def test_merge_drops_repeats_across_sections():
+    pre = sma.analyze(NODES, LINKS)
+    isolated = {"category": "structural_coherence", "severity": "low", "issue": "isolated_node",
+                "affected_entities": [4]}
+    merged = sma.merge_analyses(
+        [{"issues": [isolated, genre_issue("missing_antagonist")]},
+         {"issues": [dict(isolated), genre_issue("missing_antagonist")]}],
+        pre
+    )
+    assert len(merged["issues"]) == 2
+
+
+def test_merge_keeps_unnamed_issues_without_entities():
+    pre = sma.analyze(NODES, LINKS)
+    vague = {"category": "narrative_consistency", "severity": "low", "description": "a"}
+    merged = sma.merge_analyses([{"issues": [vague, dict(vague, description="b")]}], pre)
+    assert len(merged["issues"]) == 2
+
+
+def test_apply_update_rejudges_map_wide_issues():
+    pre = sma.analyze(NODES, LINKS)
+    previous = sma.merge_analyses([{"issues": [genre_issue("missing_antagonist"), genre_issue("no_mentor")]}], pre)
+    assert "no_mentor" in sma.format_map_wide(previous["issues"])
+
+    # The re-analysis was shown both patterns and repeated only the one that still applies
+    update = {"issues": [genre_issue("missing_antagonist")], "summary": "ok"}
+    merged = sma.apply_update(previous, update, affected={4}, removed=set(), pre=pre)
+    assert [i["pattern"] for i in merged["issues"]] == ["missing_antagonist"]
+
+    # No re-analysis (only removals): map-wide issues carry over
+    merged = sma.apply_update(previous, {"issues": []}, affected=set(), removed={"9"}, pre=pre)
+    assert sorted(i["pattern"] for i in merged["issues"]) == ["missing_antagonist", "no_mentor"]
+
+
+def test_apply_update_moves_previous_score_by_changed_issues():
+    pre = sma.analyze(NODES, LINKS)
+    isolated = {"category": "structural_coherence", "severity": "low", "issue": "isolated_node",
+                "affected_entities": [4]}
+    weak = {"category": "relationship_diversity", "severity": "high", "issue": "one_link_type",
+            "affected_entities": [1, 2]}
+    # The model's own score for the full map, not the rubric's 80
+    previous = dict(sma.merge_analyses([{"issues": [isolated, weak]}], pre), overall_score=71)
+
+    merged = sma.apply_update(previous, {"issues": []}, affected={4}, removed=set(), pre=pre)
+    assert merged["overall_score"] == 76
+    merged = sma.apply_update(previous, {"issues": [dict(isolated, severity="medium")]},
+                              affected={4}, removed=set(), pre=pre)
+    assert merged["overall_score"] == 66 and merged["overall_health"] == "fair"
+
+
+def test_format_boundary_heading():
+    _, _, boundary = sma.section_graph([1, 2], NODES, LINKS)
+    text = sma.format_boundary(boundary, "This is one of 3 sections of a larger map.")
+    assert text.startswith("This is one of 3 sections of a larger map. Links to nodes outside it")
+    assert "Bob Smith (2) -[lives in]- Harbor Town (3)" in text
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
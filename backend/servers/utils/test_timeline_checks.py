@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Rule-based timeline coherence check tests (pure functions, no network).
+
+Run from backend/servers:
+    python -m pytest utils/test_timeline_checks.py
+"""
+
+import os
+import sys
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import timeline_checks as tc
+
+
+def event(i, stage, title=None, **fields):
+    return {"id": f"e{i}", "title": title or f"Event {i}", "stage": stage, "order": i, **fields}
+
+
+def rules(findings):
+    return sorted(f["rule"] for f in findings)
+
+
+def test_single_early_climax_flags_only_that_event():
+    events = [
+        event(0, "introduction"),
+        event(1, "climax"),
+        event(2, "rising action"),
+        event(3, "rising action"),
+        event(4, "climax"),
+        event(5, "resolution"),
+    ]
+    findings = tc.check_ordering(events)
+    assert rules(findings) == ["stage_regression"]
+    assert findings[0]["events"] == ["e1", "e2"]
+
+
+def test_duplicate_positions_and_backwards_dates():
+    events = [
+        event(0, "introduction", date="2024-01-01"),
+        event(1, "rising action", date="2024-02"),
+        event(2, "climax", date="2023-06-15"),
+        event(3, "resolution", date="2024-03-01"),
+    ]
+    events[3]["order"] = 2
+    findings = tc.check_ordering(events)
+    assert rules(findings) == ["date_regression", "duplicate_order"]
+    dated = next(f for f in findings if f["rule"] == "date_regression")
+    assert dated["events"] == ["e2", "e1"]
+
+
+def test_duplicate_titles_but_not_numbered_sequences():
+    events = [
+        event(0, "introduction", "The Storm Arrives"),
+        event(1, "rising action", "The storm arrives!"),
+        event(2, "climax", "Battle 1"),
+        event(3, "climax", "Battle 2"),
+    ]
+    findings = tc.check_duplicates(events)
+    assert [f["events"] for f in findings] == [["e0", "e1"]]
+
+
+def test_late_character_uses_story_map_aliases():
+    nodes = [
+        {"label": "Captain Vos", "group": "Character", "aliases": "the Captain"},
+        {"label": "Mara", "group": "Person"},
+        {"label": "Harbor Town", "group": "Location"},
+    ]
+    events = [
+        event(0, "introduction", description="Mara walks the harbor town."),
+        event(1, "climax", description="The captain arrives."),
+    ]
+    findings = tc.check_characters(events, nodes)
+    assert [(f["rule"], f["events"]) for f in findings] == [("late_character", ["e1"])]
+    assert "Captain Vos" in findings[0]["description"]
+
+
+def test_stage_distribution_findings():
+    events = [event(i, "rising action") for i in range(6)] + [event(6, "Prologue")]
+    findings = tc.check_stages(events)
+    assert rules(findings) == ["missing_stage", "overloaded_stage", "unknown_stage"]
+    missing = next(f for f in findings if f["rule"] == "missing_stage")
+    assert missing["severity"] == "critical"
+
+
+@pytest.mark.parametrize("count", [10, 41, 100])
+def test_windows_cover_every_event(count):
+    ranges = tc.windows(list(range(count)))
+    covered = set()
+    for start, end in ranges:
+        covered.update(range(start, end))
+    assert covered == set(range(count))
+    assert ranges[0][0] == 0 and ranges[-1][1] == count
+
+
+def test_content_hash_ignores_key_order():
+    assert tc.content_hash("u", {"a": 1, "b": 2}) == tc.content_hash("u", {"b": 2, "a": 1})
+    assert tc.content_hash("u", {"a": 1}) != tc.content_hash("v", {"a": 1})
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
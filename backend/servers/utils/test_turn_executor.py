@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+TurnExecutor fan-out tests (pools and the per-request model call limit).
+
+Run from backend/servers:
+    python -m pytest utils/test_turn_executor.py
+"""
+
+import os
+import sys
+import time
+import threading
+
+SERVERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVERS_DIR not in sys.path:
+    sys.path.insert(0, SERVERS_DIR)
+
+import pytest
+
+from utils import turn_executor
+from utils.turn_executor import TurnExecutor
+
+
+class Tracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+
+    def call(self, value):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return value
+
+
+def test_model_calls_are_capped_per_request_and_use_their_own_pool():
+    tracker = Tracker()
+    turn = TurnExecutor("TEST", model_calls=True)
+    for i in range(10):
+        turn.submit(f"task_{i}", tracker.call, i)
+    assert [turn.result(f"task_{i}", timeout=5) for i in range(10)] == list(range(10))
+    assert tracker.peak == turn_executor.MODEL_CALLS_PER_REQUEST
+    assert all(name.startswith("model-fanout") for name in tracker.threads)
+
+
+def test_chat_turn_fetches_stay_on_the_fanout_pool():
+    tracker = Tracker()
+    turn = TurnExecutor("TEST")
+    for i in range(6):
+        turn.submit(f"task_{i}", tracker.call, i)
+    for i in range(6):
+        turn.result(f"task_{i}", timeout=5)
+    assert tracker.peak > turn_executor.MODEL_CALLS_PER_REQUEST
+    assert all(name.startswith("turn-fanout") for name in tracker.threads)
+
+
+def test_limited_tasks_keep_dependencies_and_errors():
+    turn = TurnExecutor("TEST", model_calls=True)
+
+    def fail():
+        raise ValueError("no")
+
+    turn.submit("a", lambda: 1)
+    turn.submit("bad", fail)
+    turn.submit("b", lambda: turn.result("a") + 1, depends_on=("a",))
+    turn.submit("c", lambda: 0, depends_on=("bad",))
+    assert turn.result("b", timeout=5) == 2
+    with pytest.raises(ValueError):
+        turn.result("c", timeout=5)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,469 @@
+"""
+Local coherence checks for /api/timeline/coherence and /api/timeline/reflect.
+
+check() runs the rule-based part of a coherence review before DeepSeek is
+called:
+  - ordering: duplicate positions, events placed in an earlier arc stage
+    than an event before them, dates that run backwards,
+  - duplicate or near-duplicate events (title and description similarity),
+  - characters from the story map whose first mention comes only at the
+    climax or later,
+  - stage distribution: missing, unknown and overloaded stages.
+
+Findings use the issue format of TIMELINE_COHERENCE_PROMPT, so the model is
+given them as facts to confirm and explain, together with one-line event
+summaries instead of the full event JSON. Results are cached by
+content_hash(), and timelines longer than TIMELINE_WINDOW_EVENTS are split
+into overlapping windows (windows()) that the route analyzes concurrently
+and merge_windows() folds back together.
+"""
+
+import os
+import re
+import bisect
+import json
+import hashlib
+import logging
+
+from utils.chat.entity_index import normalize_label, trigrams, entity_names
+from utils.story_map_analysis import jaro_winkler
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("introduction", "rising action", "climax", "falling action", "resolution")
+CLIMAX_INDEX = STAGES.index("climax")
+CHARACTER_GROUPS = ("character", "person", "people")
+
+TIMELINE_WINDOW_EVENTS = int(os.getenv("TIMELINE_WINDOW_EVENTS", "40"))
+TIMELINE_WINDOW_OVERLAP = int(os.getenv("TIMELINE_WINDOW_OVERLAP", "8"))
+TIMELINE_CACHE_TTL = int(os.getenv("TIMELINE_CACHE_TTL", "3600"))
+
+DUPLICATE_TITLE_SIMILARITY = 0.92
+DUPLICATE_DESCRIPTION_JACCARD = 0.8
+# Short descriptions ("Mara fights") overlap by chance
+DUPLICATE_DESCRIPTION_MIN_CHARS = 40
+MAX_FINDINGS_IN_PROMPT = 40
+# More out-of-sequence events than this are reported as one finding
+MAX_SEQUENCE_FINDINGS = 5
+# A stage holding more than this share of a timeline with at least
+# OVERLOAD_MIN_EVENTS events is reported as a pacing issue
+OVERLOAD_SHARE = 0.5
+OVERLOAD_MIN_EVENTS = 6
+SUMMARY_CHARS = 160
+
+_ISO_DATE_RE = re.compile(r"^\s*(-?\d{1,4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?\s*$")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+# ----------- HELPERS -----------
+
+def event_id(event, position):
+    return str(event.get("id") or f"#{position + 1}")
+
+
+def _stage_index(stage):
+    key = normalize_label(stage).replace("_", " ")
+    return STAGES.index(key) if key in STAGES else None
+
+
+def _parse_date(value):
+    """A sortable tuple for ISO-like dates ("2024", "2024-03", "2024-03-05"), else None."""
+    if not value:
+        return None
+    match = _ISO_DATE_RE.match(str(value))
+    if not match:
+        return None
+    return tuple(int(part) if part else 0 for part in match.groups())
+
+
+def _label(event, position):
+    return f"#{position + 1} '{event.get('title') or 'Untitled'}'"
+
+
+def _finding(type_, severity, description, events, suggestion, rule):
+    return {
+        "type": type_,
+        "severity": severity,
+        "description": description,
+        "events": events,
+        "suggestion": suggestion,
+        "source": "rule",
+        "rule": rule,
+    }
+
+
+def _non_decreasing_run(values):
+    """Indexes of one longest non-decreasing subsequence of values."""
+    tails, tail_index, parent = [], [], [None] * len(values)
+    for k, value in enumerate(values):
+        pos = bisect.bisect_right(tails, value)
+        if pos == len(tails):
+            tails.append(value)
+            tail_index.append(k)
+        else:
+            tails[pos] = value
+            tail_index[pos] = k
+        parent[k] = tail_index[pos - 1] if pos else None
+    keep = set()
+    k = tail_index[-1] if tail_index else None
+    while k is not None:
+        keep.add(k)
+        k = parent[k]
+    return keep
+
+
+def _out_of_sequence(indexed):
+    """
+    For (event index, sortable value or None) pairs, the events that break
+    the sequence as (index, neighbour index, "after"/"before"): the in-order
+    event it wrongly follows, or else the one it wrongly precedes.
+    """
+    present = [(i, value) for i, value in indexed if value is not None]
+    in_order = _non_decreasing_run([value for _, value in present])
+    out = []
+    previous = None
+    for k, (i, value) in enumerate(present):
+        if k in in_order:
+            previous = k
+            continue
+        if previous is not None and value < present[previous][1]:
+            out.append((i, present[previous][0], "after"))
+            continue
+        following = next((m for m in range(k + 1, len(present)) if m in in_order), None)
+        if following is not None:
+            out.append((i, present[following][0], "before"))
+    return out
+
+
+# ----------- CHECKS -----------
+
+def check_ordering(events):
+    findings = []
+
+    positions = {}
+    for i, event in enumerate(events):
+        order = event.get("order")
+        if order is not None:
+            positions.setdefault(order, []).append(i)
+    for order, members in positions.items():
+        if len(members) > 1:
+            findings.append(_finding(
+                "Consistency", "minor",
+                f"{len(members)} events share position {order}: " + ", ".join(_label(events[i], i) for i in members),
+                [event_id(events[i], i) for i in members],
+                "Give each event its own position so the sequence is unambiguous",
+                "duplicate_order",
+            ))
+
+    # Events outside the longest non-decreasing run are the misplaced ones;
+    # one early "climax" shouldn't flag every rising-action event after it
+    stages = [(i, _stage_index(e.get("stage"))) for i, e in enumerate(events)]
+    misplaced = _out_of_sequence(stages)
+    if len(misplaced) > MAX_SEQUENCE_FINDINGS:
+        findings.append(_finding(
+            "Structure", "critical",
+            f"{len(misplaced)} events are out of stage order, e.g. "
+            + ", ".join(_label(events[i], i) for i, _, _ in misplaced[:3]),
+            [event_id(events[i], i) for i, _, _ in misplaced],
+            "Check each event's stage against its position in the story",
+            "stage_regression",
+        ))
+        misplaced = []
+    for i, j, where in misplaced:
+        findings.append(_finding(
+            "Structure", "medium",
+            f"{_label(events[i], i)} is in {STAGES[_stage_index(events[i].get('stage'))]} but sits "
+            f"{where} {_label(events[j], j)} in {STAGES[_stage_index(events[j].get('stage'))]}",
+            [event_id(events[i], i), event_id(events[j], j)],
+            "Move the event, change its stage, or mark it as a flashback",
+            "stage_regression",
+        ))
+
+    dates = [(i, _parse_date(e.get("date"))) for i, e in enumerate(events)]
+    misplaced = _out_of_sequence(dates)
+    if len(misplaced) > MAX_SEQUENCE_FINDINGS:
+        findings.append(_finding(
+            "Plot Hole", "medium",
+            f"{len(misplaced)} event dates run backwards against the timeline order, e.g. "
+            + ", ".join(_label(events[i], i) for i, _, _ in misplaced[:3]),
+            [event_id(events[i], i) for i, _, _ in misplaced],
+            "Check the dates, or make jumps back in time explicit",
+            "date_regression",
+        ))
+        misplaced = []
+    for i, j, where in misplaced:
+        findings.append(_finding(
+            "Plot Hole", "medium",
+            f"{_label(events[i], i)} is dated {events[i].get('date')} but sits "
+            f"{where} {_label(events[j], j)} ({events[j].get('date')})",
+            [event_id(events[i], i), event_id(events[j], j)],
+            "Check the dates, or make the jump back in time explicit",
+            "date_regression",
+        ))
+    return findings
+
+
+def check_duplicates(events):
+    findings = []
+    prepared = []
+    for e in events:
+        description = e.get("description") or ""
+        prepared.append((
+            normalize_label(e.get("title")),
+            trigrams(description) if len(description) >= DUPLICATE_DESCRIPTION_MIN_CHARS else set(),
+        ))
+    by_gram = {}
+    for i, (title, _) in enumerate(prepared):
+        for gram in trigrams(title) if title else ():
+            by_gram.setdefault(gram, set()).add(i)
+
+    for i, (title, description) in enumerate(prepared):
+        if not title:
+            continue
+        candidates = set()
+        for gram in trigrams(title):
+            candidates |= by_gram.get(gram, set())
+        for j in sorted(c for c in candidates if c > i):
+            other_title, other_description = prepared[j]
+            if title == other_title:
+                similarity = 1.0
+            elif _NUMBER_RE.findall(title) != _NUMBER_RE.findall(other_title):
+                # "Battle 1" / "Battle 2" are a sequence, not a typo
+                similarity = 0.0
+            else:
+                similarity = jaro_winkler(title, other_title)
+            overlap = (
+                len(description & other_description) / len(description | other_description)
+                if description and other_description else 0.0
+            )
+            if similarity < DUPLICATE_TITLE_SIMILARITY and overlap < DUPLICATE_DESCRIPTION_JACCARD:
+                continue
+            same = "the same title" if title == other_title else "nearly the same title"
+            if similarity < DUPLICATE_TITLE_SIMILARITY:
+                same = "nearly the same description"
+            findings.append(_finding(
+                "Consistency", "medium",
+                f"{_label(events[i], i)} and {_label(events[j], j)} have {same}",
+                [event_id(events[i], i), event_id(events[j], j)],
+                "Merge them if they describe one moment, or make the difference between them clear",
+                "duplicate_event",
+            ))
+    return findings
+
+
+def character_names(nodes):
+    """{normalized name: label} for story-map nodes that are characters."""
+    names = {}
+    for node in nodes or []:
+        if not isinstance(node, dict):
+            continue
+        if (node.get("group") or node.get("type") or "").lower() not in CHARACTER_GROUPS:
+            continue
+        for name in entity_names("nodes", node):
+            key = normalize_label(name)
+            if key:
+                names[key] = node.get("label") or name
+    return names
+
+
+def check_characters(events, nodes):
+    """Characters whose first appearance in the timeline is at the climax or later."""
+    names = character_names(nodes)
+    if not names:
+        return []
+    patterns = {key: re.compile(rf"\b{re.escape(key)}\b") for key in names}
+
+    first_seen = {}
+    for i, event in enumerate(events):
+        text = normalize_label(f"{event.get('title') or ''} {event.get('description') or ''}")
+        for key, pattern in patterns.items():
+            label = names[key]
+            if label not in first_seen and pattern.search(text):
+                first_seen[label] = i
+
+    findings = []
+    for label, i in first_seen.items():
+        stage = _stage_index(events[i].get("stage"))
+        if stage is None or stage < CLIMAX_INDEX:
+            continue
+        findings.append(_finding(
+            "Structure", "medium",
+            f"{label} first appears in {_label(events[i], i)} ({STAGES[stage]}) with no earlier event introducing them",
+            [event_id(events[i], i)],
+            f"Consider setting up {label} in the introduction or rising action so their role feels earned",
+            "late_character",
+        ))
+    return findings
+
+
+def stage_distribution(events):
+    distribution = {}
+    for event in events:
+        stage = event.get("stage", "unknown")
+        distribution[stage] = distribution.get(stage, 0) + 1
+    return distribution
+
+
+def check_stages(events):
+    findings = []
+    counts = {stage: 0 for stage in STAGES}
+    unknown = []
+    for i, event in enumerate(events):
+        stage = _stage_index(event.get("stage"))
+        if stage is None:
+            unknown.append(i)
+        else:
+            counts[STAGES[stage]] += 1
+
+    missing = [stage for stage, count in counts.items() if count == 0]
+    if missing:
+        findings.append(_finding(
+            "Structure", "critical" if "climax" in missing else "medium",
+            f"No events in: {', '.join(missing)}",
+            [],
+            "Add at least one event for each missing stage, or check that events are assigned to the right stage",
+            "missing_stage",
+        ))
+    if unknown:
+        findings.append(_finding(
+            "Consistency", "minor",
+            f"{len(unknown)} event(s) have no recognised stage: " + ", ".join(_label(events[i], i) for i in unknown[:5]),
+            [event_id(events[i], i) for i in unknown],
+            f"Assign each event to one of: {', '.join(STAGES)}",
+            "unknown_stage",
+        ))
+    total = sum(counts.values())
+    if total >= OVERLOAD_MIN_EVENTS:
+        for stage, count in counts.items():
+            if count / total > OVERLOAD_SHARE:
+                findings.append(_finding(
+                    "Pacing", "medium",
+                    f"{stage.capitalize()} holds {count} of {total} events",
+                    [],
+                    "Consider whether some of these beats belong to neighbouring stages",
+                    "overloaded_stage",
+                ))
+    return findings
+
+
+# ----------- ENTRY POINTS -----------
+
+def check(events, nodes=None):
+    """All rule-based findings for a timeline, in issue format."""
+    return (
+        check_ordering(events)
+        + check_duplicates(events)
+        + check_characters(events, nodes)
+        + check_stages(events)
+    )
+
+
+def content_hash(*parts):
+    """Stable hash of JSON-serializable inputs (events, character names, settings)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def summarize_events(events, start=0):
+    """One line per event: id | position | stage | [MAIN |] [date |] title: description."""
+    lines = []
+    for offset, event in enumerate(events):
+        i = start + offset
+        description = " ".join((event.get("description") or "").split())
+        if len(description) > SUMMARY_CHARS:
+            description = description[:SUMMARY_CHARS - 3] + "..."
+        parts = [event_id(event, i), f"#{i + 1}", event.get("stage") or "unknown"]
+        if event.get("isMainEvent"):
+            parts.append("MAIN")
+        if event.get("date"):
+            parts.append(str(event["date"]))
+        parts.append(f"{event.get('title') or 'Untitled'}: {description}")
+        lines.append(" | ".join(parts))
+    return "\n".join(lines)
+
+
+def format_findings(findings):
+    if not findings:
+        return "None."
+    lines = [
+        f"- [{f['type']}, {f['severity']}] {f['description']}"
+        + (f" (events: {', '.join(f['events'])})" if f["events"] else "")
+        for f in findings[:MAX_FINDINGS_IN_PROMPT]
+    ]
+    if len(findings) > MAX_FINDINGS_IN_PROMPT:
+        lines.append(f"- ... {len(findings) - MAX_FINDINGS_IN_PROMPT} more of the same kinds")
+    return "\n".join(lines)
+
+
+def windows(events, size=TIMELINE_WINDOW_EVENTS, overlap=TIMELINE_WINDOW_OVERLAP):
+    """(start, end) index ranges covering the timeline, each sharing `overlap` events with the previous."""
+    if len(events) <= size:
+        return [(0, len(events))]
+    step = max(1, size - overlap)
+    ranges = []
+    start = 0
+    while True:
+        end = min(start + size, len(events))
+        ranges.append((start, end))
+        if end == len(events):
+            return ranges
+        start += step
+
+
+def _issue_key(issue):
+    return (issue.get("type"), tuple(sorted(map(str, issue.get("events") or []))))
+
+
+def merge_issues(model_issues, findings):
+    """
+    Model issues plus any rule finding the model didn't cover (same type and
+    events), so deterministic findings are never lost. Model issues that
+    repeat across overlapping windows are dropped.
+    """
+    merged, seen = [], set()
+    for issue in model_issues:
+        key = _issue_key(issue)
+        if key[1] and key in seen:
+            continue
+        seen.add(key)
+        merged.append(issue)
+    for finding in findings:
+        if _issue_key(finding) not in seen:
+            seen.add(_issue_key(finding))
+            merged.append(finding)
+    return merged
+
+
+def merge_windows(results, ranges):
+    """Fold per-window model results into one response (scores weighted by window size)."""
+    sizes = [end - start for start, end in ranges]
+    scored = [(r.get("overallScore"), n) for r, n in zip(results, sizes) if isinstance(r.get("overallScore"), (int, float))]
+    score = round(sum(s * n for s, n in scored) / sum(n for _, n in scored), 1) if scored else None
+
+    def unique(items):
+        out = []
+        for item in items:
+            if item not in out:
+                out.append(item)
+        return out
+
+    return {
+        "overallScore": score,
+        "summary": " ".join(
+            f"Events {start + 1}-{end}: {r['summary'].strip()}"
+            for r, (start, end) in zip(results, ranges) if r.get("summary")
+        ),
+        "issues": [issue for r in results for issue in r.get("issues") or []],
+        "strengths": unique(s for r in results for s in r.get("strengths") or []),
+        "pacing": {
+            "assessment": " ".join(
+                r["pacing"]["assessment"] for r in results
+                if isinstance(r.get("pacing"), dict) and r["pacing"].get("assessment")
+            ),
+            "suggestions": unique(
+                s for r in results if isinstance(r.get("pacing"), dict)
+                for s in r["pacing"].get("suggestions") or []
+            ),
+        },
+        "windows": len(ranges),
+    }
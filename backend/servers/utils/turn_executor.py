@@ -0,0 +1,192 @@
+"""
+Per-request executor for chat turns.
+
+A chat turn does several independent I/O steps (Session API reads, Firebase
+writes, analytics logging). TurnExecutor lets a route:
+  - submit() independent fetches so they run concurrently, optionally after
+    named dependencies complete,
+  - defer() bookkeeping that the reply doesn't depend on, so it runs after the
+    response is returned (in submission order, on the background executor's
+    bookkeeping queue),
+  - time sequential phases with phase(),
+and logs a per-phase timing breakdown for the turn.
+
+Routes that fan out model calls (story map sections, timeline windows, draft
+sections) pass model_calls=True: their tasks run on a separate pool, and at
+most MODEL_CALLS_PER_REQUEST of one request's tasks run at a time, so long
+DeepSeek calls never hold the fan-out workers that chat turns' short
+Session API and Firebase fetches use.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils.background import background
+from utils.metrics import current_route, observe_phase
+
+logger = logging.getLogger(__name__)
+
+# Shared pools so a turn doesn't pay thread start-up costs
+_fanout_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TURN_FANOUT_WORKERS", "16")),
+    thread_name_prefix="turn-fanout"
+)
+_model_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MODEL_FANOUT_WORKERS", "8")),
+    thread_name_prefix="model-fanout"
+)
+MODEL_CALLS_PER_REQUEST = int(os.getenv("MODEL_CALLS_PER_REQUEST", "3"))
+
+
+class TurnExecutor:
+    def __init__(self, label: str, log: logging.Logger = None, model_calls: bool = False):
+        self.label = label
+        self._pool = _model_pool if model_calls else _fanout_pool
+        self._max_running = MODEL_CALLS_PER_REQUEST if model_calls else None
+        self._running = 0
+        self._waiting = deque()
+        self.log = log or logger
+        self._start = time.time()
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._timings = {}
+        self._deferred = []
+        self._route = current_route()
+
+    # ----------- CONCURRENT FETCHES -----------
+
+    def submit(self, name, fn, *args, depends_on=(), **kwargs) -> Future:
+        """
+        Run fn(*args, **kwargs) on the executor's pool once every task named
+        in depends_on has finished. If a dependency failed, this task fails with
+        the same exception without running.
+        """
+        deps = [self._futures[d] for d in depends_on]
+        future = Future()
+        self._futures[name] = future
+        # Run in the request's context so per-request state (metrics route,
+        # payload logging, round-trip counters) follows the fetch
+        context = contextvars.copy_context()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            for dep in deps:
+                if dep.exception() is not None:
+                    future.set_exception(dep.exception())
+                    return
+            start = time.time()
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                self.record(name, time.time() - start)
+
+        if not deps:
+            self._dispatch(run)
+            return future
+
+        remaining = [len(deps)]
+
+        def on_dep_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._dispatch(run)
+
+        for dep in deps:
+            dep.add_done_callback(on_dep_done)
+        return future
+
+    def _dispatch(self, run):
+        """Start run on the pool, or queue it while the per-request limit is reached."""
+        if self._max_running is None:
+            self._pool.submit(run)
+            return
+        with self._lock:
+            if self._running >= self._max_running:
+                self._waiting.append(run)
+                return
+            self._running += 1
+        self._pool.submit(self._run_limited, run)
+
+    def _run_limited(self, run):
+        # Keep this slot for the request's next queued task, if any
+        while run is not None:
+            try:
+                run()
+            finally:
+                with self._lock:
+                    if self._waiting:
+                        run = self._waiting.popleft()
+                    else:
+                        run = None
+                        self._running -= 1
+
+    def result(self, name, timeout=None):
+        """Block until the named task finishes; re-raises its exception."""
+        return self._futures[name].result(timeout=timeout)
+
+    # ----------- SEQUENTIAL PHASES -----------
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    # ----------- POST-REPLY BOOKKEEPING -----------
+
+    def defer(self, name, fn, *args, **kwargs):
+        """Queue fn to run after the reply is sent. Deferred tasks run in order."""
+        self._deferred.append((name, fn, args, kwargs))
+
+    def run_deferred(self):
+        """Hand the deferred chain to the background executor (call just before returning)."""
+        if not self._deferred:
+            return
+        tasks, self._deferred = self._deferred, []
+
+        def chain():
+            chain_start = time.time()
+            timings = []
+            for name, fn, args, kwargs in tasks:
+                start = time.time()
+                try:
+                    fn(*args, **kwargs)
+                except Exception as e:
+                    self.log.warning(f"[{self.label}] Deferred {name} failed: {e}")
+                timings.append(f"{name}={time.time() - start:.3f}s")
+            chain_time = time.time() - chain_start
+            self.log.info(
+                f"[{self.label}] Deferred: {' '.join(timings)} "
+                f"total={chain_time:.3f}s"
+            )
+            observe_phase("persist", chain_time, route=self._route)
+
+        background.submit("bookkeeping", chain, task_name=f"{self.label}_deferred")
+
+    # ----------- TIMING -----------
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._timings[name] = seconds
+        observe_phase(name, seconds, route=self._route)
+
+    def timings(self):
+        with self._lock:
+            return dict(self._timings)
+
+    def log_timings(self):
+        parts = " ".join(f"{name}={secs:.3f}s" for name, secs in self.timings().items())
+        self.log.info(f"[{self.label}] Phases: {parts} total={time.time() - self._start:.3f}s")